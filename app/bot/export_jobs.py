@@ -0,0 +1,203 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.types import Message
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import exports
+from app.core.config import settings
+from app.db import versions
+from app.db.session import ReadSessionLocal
+from app.services.expense_service import ExpenseService
+
+# Minimum gap between edits of the "building" status message.
+PROGRESS_INTERVAL_S = 1.0
+
+
+@dataclass
+class ExportJob:
+    user_id: int
+    file_format: str
+    year: int | None
+    month: int | None
+    period_label: str
+    version: int = 0
+    # Chats waiting on this file: (request message, status message, reply_markup).
+    waiters: list[tuple[Message, Message | None, object]] = field(default_factory=list)
+
+    @property
+    def key(self) -> tuple:
+        return (self.user_id, self.year, self.month, self.file_format, self.version)
+
+
+class ExportQueue:
+    """
+    Builds /export files off the request path. submit() replies at once with
+    a status message and queues the job; `workers` tasks stream the rows from
+    a read session into a spooled file (formatting in a thread), edit the
+    status with progress and send the document when it is done.
+
+    Finished files are remembered by Telegram file_id, keyed on (user, period,
+    format, data version), so asking again for unchanged data re-sends the
+    uploaded file instead of rebuilding it. Requests for a file that is
+    already being built join that build instead of starting another.
+
+    When the queue is not running (scripts, tests), submit() builds inline.
+    """
+
+    def __init__(self, session_factory: async_sessionmaker[AsyncSession] = ReadSessionLocal,
+                 workers: int = 2, cache_size: int = 128):
+        self.session_factory = session_factory
+        self.workers = workers
+        self.cache_size = cache_size
+        self._cache: OrderedDict[tuple, str] = OrderedDict()
+        self._building: dict[tuple, ExportJob] = {}
+        self._queue: asyncio.Queue[ExportJob] | None = None
+        self._tasks: list[asyncio.Task] = []
+
+    @property
+    def running(self) -> bool:
+        return any(not t.done() for t in self._tasks)
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [
+            asyncio.create_task(self._run(), name=f"export-worker-{i}") for i in range(self.workers)
+        ]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        for task in self._tasks:
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        self._tasks = []
+        self._building.clear()
+
+    def cached(self, key: tuple) -> str | None:
+        file_id = self._cache.get(key)
+        if file_id:
+            self._cache.move_to_end(key)
+        return file_id
+
+    def remember(self, key: tuple, file_id: str):
+        self._cache[key] = file_id
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    async def submit(self, target: Message, db: AsyncSession, job: ExportJob, reply_markup=None):
+        job.version = await versions.current(db, job.user_id)
+        file_id = self.cached(job.key)
+        if file_id:
+            try:
+                await target.answer_document(file_id, caption=self._caption(job), reply_markup=reply_markup)
+                return
+            except TelegramBadRequest:
+                logger.warning("Cached export file_id rejected, rebuilding")
+                self._cache.pop(job.key, None)
+
+        building = self._building.get(job.key)
+        if building:
+            status = await target.answer("⏳ That export is already being built, it will arrive shortly.")
+            building.waiters.append((target, status, reply_markup))
+            return
+
+        status = await target.answer("⏳ Building your export…") if self.running else None
+        job.waiters.append((target, status, reply_markup))
+        self._building[job.key] = job
+        if not self.running:
+            await self._build(job)
+            return
+        await self._queue.put(job)
+
+    async def _run(self):
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._build(job)
+            except Exception:
+                logger.exception("Export job failed")
+                await self._notify(job, "⚠️ The export failed, please try again.")
+
+    async def _build(self, job: ExportJob):
+        try:
+            async with self.session_factory() as db:
+                svc = ExpenseService(db)
+                total = await svc.count_export_rows(job.user_id, job.year, job.month)
+                if not total:
+                    await self._notify(job, "No expenses found for the selected period.")
+                    return
+                with exports.spooled_file() as out:
+                    await exports.write_export(
+                        job.file_format,
+                        svc.iter_export_rows(job.user_id, year=job.year, month=job.month),
+                        out,
+                        offload=True,
+                        progress=self._progress(job, total),
+                    )
+                    await self._deliver(job, out)
+        finally:
+            self._release(job)
+
+    def _progress(self, job: ExportJob, total: int):
+        last = time.monotonic()
+
+        async def report(count: int):
+            nonlocal last
+            if count >= total or time.monotonic() - last < PROGRESS_INTERVAL_S:
+                return
+            last = time.monotonic()
+            for _, status, _ in job.waiters:
+                if status:
+                    with contextlib.suppress(TelegramBadRequest):
+                        await status.edit_text(f"⏳ Building your export… {count * 100 // total}%")
+
+        return report
+
+    async def _deliver(self, job: ExportJob, out):
+        stamp = datetime.now().strftime("%Y%m%d_%H%M")
+        filename = f"expenses_{job.period_label}_{stamp}.{job.file_format}"
+        document = exports.SpooledInputFile(out, filename=filename)
+        file_id = None
+        # Waiters may still join while earlier ones are being sent.
+        for target, status, reply_markup in job.waiters:
+            sent = await target.answer_document(
+                file_id or document, caption=self._caption(job, filename), reply_markup=reply_markup
+            )
+            if not file_id and sent.document:
+                file_id = sent.document.file_id
+                self.remember(job.key, file_id)
+            await self._clear(status)
+        self._release(job)
+
+    def _release(self, job: ExportJob):
+        if self._building.get(job.key) is job:
+            del self._building[job.key]
+
+    async def _notify(self, job: ExportJob, text: str):
+        self._release(job)
+        for target, status, reply_markup in job.waiters:
+            await self._clear(status)
+            await target.answer(text, reply_markup=reply_markup)
+
+    @staticmethod
+    async def _clear(status: Message | None):
+        if status:
+            with contextlib.suppress(TelegramBadRequest):
+                await status.delete()
+
+    @staticmethod
+    def _caption(job: ExportJob, filename: str | None = None) -> str:
+        return f"📦 Export ready: {filename or f'expenses_{job.period_label}.{job.file_format}'}"
+
+
+export_queue = ExportQueue(workers=settings.EXPORT_WORKERS, cache_size=settings.EXPORT_CACHE_SIZE)
@@ -8,9 +8,9 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from app.services.budget_service import BudgetService
-from app.services.expense_service import ExpenseService
 from app.bot.keyboards import main_menu_kb
-from app.utils.text import short_ref, progress_bar
+from app.db.writer import write_queue
+from app.utils.text import progress_bar
 
 router = Router(name="budgets")
 
@@ -134,7 +134,7 @@ async def budget_limit(message: Message, state: FSMContext):
 
 
 @router.message(BudgetFlow.period)
-async def budget_period(message: Message, db: AsyncSession, state: FSMContext):
+async def budget_period(message: Message, state: FSMContext):
     text = (message.text or "").strip().lower()
     if text == "❌ cancel":
         await state.clear()
@@ -147,52 +147,51 @@ async def budget_period(message: Message, db: AsyncSession, state: FSMContext):
     data = await state.get_data()
     await state.clear()
 
-    svc = BudgetService(db)
-    b = await svc.add_budget(
-        message.from_user.id,
+    user_id = message.from_user.id
+    b = await write_queue.submit(lambda session: BudgetService(session).add_budget(
+        user_id,
         data["scope_type"],
         data["scope_value"],
         data["limit_cents"],
         text,
-    )
+    ))
     scope_disp = data["scope_value"] or "Overall"
     await message.answer(
-        f"✅ Budget set: {scope_disp} ${data['limit_cents']/100:.2f}/{text} · Ref: `{short_ref(b.id)}`",
+        f"✅ Budget set: {scope_disp} ${data['limit_cents']/100:.2f}/{text} · Ref: `{b.ref}`",
         parse_mode="Markdown",
         reply_markup=main_menu_kb(),
     )
 
 
 @router.message(BudgetFlow.delete_ref)
-async def budget_delete_ref(message: Message, db: AsyncSession, state: FSMContext):
+async def budget_delete_ref(message: Message, state: FSMContext):
     text = (message.text or "").strip()
     if text == "❌ Cancel":
         await state.clear()
         await message.answer("Cancelled.", reply_markup=main_menu_kb())
         return
-    svc = BudgetService(db)
-    b = await svc.delete_budget(text, message.from_user.id)
+    user_id = message.from_user.id
+    b = await write_queue.submit(lambda session: BudgetService(session).delete_budget(text, user_id))
     await state.clear()
     await message.answer("✅ Deleted." if b else "❌ Not found or ambiguous ref.", reply_markup=main_menu_kb())
 
-@router.message(Command("budget_list"))
+@router.message(Command("budget_list"), flags={"db": "read"})
 async def budget_list(message: Message, db: AsyncSession):
     svc = BudgetService(db)
-    es = ExpenseService(db)
     now = datetime.now()
-    budgets = await svc.list_budgets(message.from_user.id)
-    if not budgets:
+    evaluated = await svc.evaluate_budgets(message.from_user.id, now.year, now.month)
+    if not evaluated:
         await message.answer("No budgets set.")
         return
     lines = ["📊 Active budgets:"]
     inline_rows: list[list[InlineKeyboardButton]] = []
-    for b in budgets:
+    for progress in evaluated:
+        b = progress["budget"]
         scope = b.scope_value if b.scope_type == "category" else "Overall"
-        progress = await svc.get_budget_progress(message.from_user.id, b, es, now.year, now.month)
         bar = progress_bar(progress["pct"])
-        ref = short_ref(b.id)
+        ref = b.ref
         lines.append(
-            f"- {scope}: ${progress['spent_cents']/100:.2f}/${progress['effective_limit_cents']/100:.2f} [{bar}] {progress['pct']:.0f}% per {b.period} (ref: {short_ref(b.id)})"
+            f"- {scope}: ${progress['spent_cents']/100:.2f}/${progress['effective_limit_cents']/100:.2f} [{bar}] {progress['pct']:.0f}% per {b.period} (ref: {b.ref})"
         )
         inline_rows.append([
             InlineKeyboardButton(text=f"🗑 Delete {ref}", callback_data=f"budget:delete:{ref}")
@@ -201,10 +200,10 @@ async def budget_list(message: Message, db: AsyncSession):
 
 
 @router.callback_query(F.data.regexp(r"^budget:delete:[A-Za-z0-9]+$"))
-async def budget_delete_quick(callback: CallbackQuery, db: AsyncSession):
+async def budget_delete_quick(callback: CallbackQuery):
     ref = callback.data.split(":", 2)[2]
-    svc = BudgetService(db)
-    deleted = await svc.delete_budget(ref, callback.from_user.id)
+    user_id = callback.from_user.id
+    deleted = await write_queue.submit(lambda session: BudgetService(session).delete_budget(ref, user_id))
     if deleted:
         with contextlib.suppress(Exception):
             await callback.message.edit_reply_markup(reply_markup=None)
@@ -213,7 +212,7 @@ async def budget_delete_quick(callback: CallbackQuery, db: AsyncSession):
         await callback.answer("Budget not found", show_alert=True)
 
 @router.message(Command("budget_add"))
-async def budget_add(message: Message, db: AsyncSession):
+async def budget_add(message: Message):
     parts = message.text.split()
     if len(parts) != 4:
         await message.answer("Usage: /budget_add <scope> <limit> <period>")
@@ -235,17 +234,19 @@ async def budget_add(message: Message, db: AsyncSession):
         await message.answer("Period must be month, month_rollover, or year.")
         return
 
-    svc = BudgetService(db)
-    b = await svc.add_budget(message.from_user.id, scope_type, scope_value, limit_cents, period.lower())
+    user_id = message.from_user.id
+    b = await write_queue.submit(
+        lambda session: BudgetService(session).add_budget(user_id, scope_type, scope_value, limit_cents, period.lower())
+    )
     scope_disp = scope_value or "Overall"
-    await message.answer(f"✅ Budget set: {scope_disp} ${limit_cents/100:.2f}/{period} · Ref: `{short_ref(b.id)}`", parse_mode="Markdown")
+    await message.answer(f"✅ Budget set: {scope_disp} ${limit_cents/100:.2f}/{period} · Ref: `{b.ref}`", parse_mode="Markdown")
 
 @router.message(Command("budget_delete"))
-async def budget_delete(message: Message, db: AsyncSession):
+async def budget_delete(message: Message):
     parts = message.text.split()
     if len(parts) != 2:
         await message.answer("Usage: /budget_delete <ref>")
         return
-    svc = BudgetService(db)
-    b = await svc.delete_budget(parts[1], message.from_user.id)
+    user_id = message.from_user.id
+    b = await write_queue.submit(lambda session: BudgetService(session).delete_budget(parts[1], user_id))
     await message.answer("✅ Deleted." if b else "❌ Not found or ambiguous ref.")
@@ -4,10 +4,11 @@ from aiogram.filters import Command
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.category_service import CategoryService
 from app.services.expense_service import ExpenseService
+from app.db.writer import write_queue
 
 router = Router(name="categories")
 
-@router.message(Command("categories"))
+@router.message(Command("categories"), flags={"db": "read"})
 async def list_categories(message: Message, db: AsyncSession):
     cs = CategoryService(db)
     cats = await cs.list_all()
@@ -18,7 +19,7 @@ async def list_categories(message: Message, db: AsyncSession):
     await message.answer(f"📚 *Categories*:\n{names}", parse_mode="Markdown")
 
 @router.message(Command("setcategory"))
-async def set_category(message: Message, db: AsyncSession):
+async def set_category(message: Message):
     """
     Usage: /setcategory <expense_id> <category>
     """
@@ -28,12 +29,18 @@ async def set_category(message: Message, db: AsyncSession):
         return
 
     _, expense_id, cat_name = parts
-    cs = CategoryService(db)
-    cat = await cs.get_or_create(cat_name)
-    es = ExpenseService(db)
-    updated = await es.update_category(expense_id=expense_id, user_id=message.from_user.id, category_name=cat.name)
-    if not updated:
+    user_id = message.from_user.id
+
+    async def apply(session: AsyncSession):
+        cat = await CategoryService(session).get_or_create(cat_name)
+        updated = await ExpenseService(session).update_category(
+            expense_id=expense_id, user_id=user_id, category_name=cat.name
+        )
+        return cat.name if updated else None
+
+    category = await write_queue.submit(apply)
+    if not category:
         await message.answer("Expense not found or not yours.")
         return
 
-    await message.answer(f"✅ Category set to *{cat.name}* for `{expense_id}`", parse_mode="Markdown")
+    await message.answer(f"✅ Category set to *{category}* for `{expense_id}`", parse_mode="Markdown")
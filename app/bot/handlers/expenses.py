@@ -12,8 +12,9 @@ from app.services.expense_service import ExpenseService
 from app.services.category_service import CategoryService
 from app.services.recurring_service import RecurringService
 from app.bot.keyboards import main_menu_kb
+from app.db.writer import write_queue
 from app.utils.parser import parse_item_and_amount, extract_hashtags, extract_note, parse_recurring_from_tags
-from app.utils.text import short_ref, normalize_merchant
+from app.utils.text import normalize_merchant
 
 router = Router(name="expenses")
 
@@ -97,47 +98,55 @@ async def _save_expense(
         normalized_note = (normalized_note + " | " if normalized_note else "") + f"pm:{payment_method.strip()}"
     normalized_note = (normalized_note + " | " if normalized_note else "") + f"merchant:{merchant}"
 
-    svc = ExpenseService(db)
-    exp = await svc.add_expense_text(
-        user_id=message.from_user.id,
-        item_name=item,
-        amount_cents=cents,
-        category=category_name,
-        tags=tags_csv,
-        notes=normalized_note,
-    )
+    user_id = message.from_user.id
+    rec_cfg = parse_recurring_from_tags(hashtags_for_recurring)
+
+    async def record(session: AsyncSession):
+        category = None
+        if category_name:
+            category = (await CategoryService(session).get_or_create(category_name)).name
+        exp = await ExpenseService(session).add_expense_text(
+            user_id=user_id,
+            item_name=item,
+            amount_cents=cents,
+            category=category,
+            tags=tags_csv,
+            notes=normalized_note,
+        )
+        if rec_cfg:
+            await RecurringService(session).create(
+                user_id=user_id,
+                item_name=exp.item_name,
+                amount_cents=exp.amount_cents,
+                currency=exp.currency,
+                category=exp.category,
+                tags=exp.tags,
+                notes=exp.notes,
+                frequency=rec_cfg["frequency"],
+                day_of_month=rec_cfg["day_of_month"],
+                day_of_week=rec_cfg["day_of_week"],
+                repeat_count=rec_cfg["repeat_count"],
+            )
+        return exp
+
+    # category, expense and recurring rule land in one group-committed transaction
+    exp = await write_queue.submit(record)
 
     bsvc = BudgetService(db)
-    alerts = await bsvc.check_alerts(message.from_user.id, svc)
+    alerts = await bsvc.check_alerts(user_id)
     for alert in alerts:
         await message.answer(alert)
 
     dollars = cents / 100
-    msg = f"✅ Added: *{item}* — ${dollars:.2f} · Ref: `{short_ref(exp.id)}`"
-    if category_name:
-        msg += f" · 🏷 {category_name}"
+    msg = f"✅ Added: *{item}* — ${dollars:.2f} · Ref: `{exp.ref}`"
+    if exp.category:
+        msg += f" · 🏷 {exp.category}"
     if tags_csv:
         msg += f" · #{tags_csv.replace(',', ' #')}"
     if payment_method:
         msg += f" · 💳 {payment_method}"
     msg += f" · 🏪 {merchant}"
-
-    rec_cfg = parse_recurring_from_tags(hashtags_for_recurring)
     if rec_cfg:
-        rsvc = RecurringService(db)
-        await rsvc.create(
-            user_id=message.from_user.id,
-            item_name=exp.item_name,
-            amount_cents=exp.amount_cents,
-            currency=exp.currency,
-            category=exp.category,
-            tags=exp.tags,
-            notes=exp.notes,
-            frequency=rec_cfg["frequency"],
-            day_of_month=rec_cfg["day_of_month"],
-            day_of_week=rec_cfg["day_of_week"],
-            repeat_count=rec_cfg["repeat_count"],
-        )
         msg += "\n📆 Recurring rule created automatically."
 
     await message.answer(msg, parse_mode="Markdown", reply_markup=main_menu_kb())
@@ -188,19 +197,11 @@ async def add_cmd(message: Message, db: AsyncSession, state: FSMContext):
     note = extract_note(payload)
     cat_token, tags_csv = _split_category_and_tags(hashtags)
 
-    category_name = None
-    if cat_token:
-        cs = CategoryService(db)
-        cat = await cs.get_or_create(cat_token)
-        category_name = cat.name
+    category_name = cat_token
     if not category_name:
         from app.services.rule_service import RuleService
         rsvc = RuleService(db)
-        suggested = await rsvc.suggest_category(message.from_user.id, item)
-        if suggested:
-            cs = CategoryService(db)
-            cat = await cs.get_or_create(suggested)
-            category_name = cat.name
+        category_name = await rsvc.suggest_category(message.from_user.id, item)
     await _save_expense(message, db, item, cents, category_name, tags_csv, note, hashtags, payment_method)
 
 
@@ -285,18 +286,12 @@ async def add_flow_note(message: Message, db: AsyncSession, state: FSMContext):
     data = await state.get_data()
     await state.clear()
 
-    category_name = None
-    if data.get("category"):
-        cs = CategoryService(db)
-        cat = await cs.get_or_create(data["category"])
-        category_name = cat.name
-
     await _save_expense(
         message,
         db,
         data.get("item", "Unknown"),
         data.get("cents", 0),
-        category_name,
+        data.get("category"),
         data.get("tags"),
         note,
         [],
@@ -304,24 +299,24 @@ async def add_flow_note(message: Message, db: AsyncSession, state: FSMContext):
     )
 
 
-@router.message(Command("undo"))
+@router.message(Command("undo"), flags={"db": "read"})
 async def undo_last(message: Message, db: AsyncSession):
-    svc = ExpenseService(db)
-    last = await svc.get_last_expense(message.from_user.id)
+    user_id = message.from_user.id
+    last = await ExpenseService(db).get_last_expense(user_id)
     if not last:
         await message.answer("No expense to undo.")
         return
-    removed = await svc.delete_expense_by_ref(message.from_user.id, last.id)
+    removed = await write_queue.submit(lambda session: ExpenseService(session).delete_expense_by_ref(user_id, last.id))
     if not removed:
         await message.answer("Could not undo last expense.")
         return
     await message.answer(
-        f"↩️ Undone: *{removed.item_name}* ${removed.amount_cents/100:.2f} · Ref: `{short_ref(removed.id)}`",
+        f"↩️ Undone: *{removed.item_name}* ${removed.amount_cents/100:.2f} · Ref: `{removed.ref}`",
         parse_mode="Markdown",
     )
 
 
-@router.message(Command("edit_last"))
+@router.message(Command("edit_last"), flags={"db": "read"})
 async def edit_last(message: Message, db: AsyncSession, state: FSMContext):
     svc = ExpenseService(db)
     last = await svc.get_last_expense(message.from_user.id)
@@ -332,7 +327,7 @@ async def edit_last(message: Message, db: AsyncSession, state: FSMContext):
     await state.set_state(EditLastFlow.field)
     await state.update_data(expense_id=last.id)
     await message.answer(
-        f"Editing last expense: *{last.item_name}* ${last.amount_cents/100:.2f} · Ref: `{short_ref(last.id)}`\nChoose field:",
+        f"Editing last expense: *{last.item_name}* ${last.amount_cents/100:.2f} · Ref: `{last.ref}`\nChoose field:",
         parse_mode="Markdown",
         reply_markup=_edit_field_kb(),
     )
@@ -363,7 +358,7 @@ async def edit_last_choose_field(message: Message, state: FSMContext):
 
 
 @router.message(EditLastFlow.value, F.text)
-async def edit_last_apply(message: Message, db: AsyncSession, state: FSMContext):
+async def edit_last_apply(message: Message, state: FSMContext):
     text = (message.text or "").strip()
     if text == "❌ Cancel":
         await state.clear()
@@ -373,39 +368,42 @@ async def edit_last_apply(message: Message, db: AsyncSession, state: FSMContext)
     data = await state.get_data()
     expense_id = data.get("expense_id")
     field = data.get("field")
-    svc = ExpenseService(db)
-    updated = None
-
-    if field == "item":
-        updated = await svc.update_item(expense_id=expense_id, user_id=message.from_user.id, item_name=text)
-    elif field == "amount":
+    user_id = message.from_user.id
+    cents = None
+    if field == "amount":
         try:
             amount = Decimal(text.replace(",", "."))
             cents = int((amount * 100).quantize(Decimal("1")))
         except (InvalidOperation, ValueError):
             await message.answer("Invalid amount. Try like 12.50")
             return
-        updated = await svc.update_amount(expense_id=expense_id, user_id=message.from_user.id, amount_cents=cents)
-    elif field == "category":
-        if text == "🧹 Clear":
-            updated = await svc.update_category(expense_id=expense_id, user_id=message.from_user.id, category_name=None)
-        else:
-            cs = CategoryService(db)
-            cat = await cs.get_or_create(text)
-            updated = await svc.update_category(expense_id=expense_id, user_id=message.from_user.id, category_name=cat.name)
-    elif field == "tags":
-        tags_val = "" if text == "🧹 Clear" else text
-        updated = await svc.update_tags(expense_id=expense_id, user_id=message.from_user.id, tags=tags_val)
-    elif field == "note":
-        note_val = "" if text == "🧹 Clear" else text
-        updated = await svc.update_note(expense_id=expense_id, user_id=message.from_user.id, note=note_val)
 
+    async def apply(session: AsyncSession):
+        svc = ExpenseService(session)
+        if field == "item":
+            return await svc.update_item(expense_id=expense_id, user_id=user_id, item_name=text)
+        if field == "amount":
+            return await svc.update_amount(expense_id=expense_id, user_id=user_id, amount_cents=cents)
+        if field == "category":
+            if text == "🧹 Clear":
+                return await svc.update_category(expense_id=expense_id, user_id=user_id, category_name=None)
+            cat = await CategoryService(session).get_or_create(text)
+            return await svc.update_category(expense_id=expense_id, user_id=user_id, category_name=cat.name)
+        if field == "tags":
+            tags_val = "" if text == "🧹 Clear" else text
+            return await svc.update_tags(expense_id=expense_id, user_id=user_id, tags=tags_val)
+        if field == "note":
+            note_val = "" if text == "🧹 Clear" else text
+            return await svc.update_note(expense_id=expense_id, user_id=user_id, note=note_val)
+        return None
+
+    updated = await write_queue.submit(apply)
     await state.clear()
     if not updated:
         await message.answer("Could not update the last expense.", reply_markup=main_menu_kb())
         return
     await message.answer(
-        f"✅ Updated last expense · Ref: `{short_ref(updated.id)}`",
+        f"✅ Updated last expense · Ref: `{updated.ref}`",
         parse_mode="Markdown",
         reply_markup=main_menu_kb(),
     )
@@ -425,19 +423,11 @@ async def add_free_text(message: Message, db: AsyncSession):
     note = extract_note(message.text or "")
     cat_token, tags_csv = _split_category_and_tags(hashtags)
 
-    category_name = None
-    if cat_token:
-        cs = CategoryService(db)
-        cat = await cs.get_or_create(cat_token)
-        category_name = cat.name
+    category_name = cat_token
     if not category_name:
         from app.services.rule_service import RuleService
         rsvc = RuleService(db)
-        suggested = await rsvc.suggest_category(message.from_user.id, item)
-        if suggested:
-            cs = CategoryService(db)
-            cat = await cs.get_or_create(suggested)
-            category_name = cat.name
+        category_name = await rsvc.suggest_category(message.from_user.id, item)
 
     await _save_expense(message, db, item, cents, category_name, tags_csv, note, hashtags, payment_method)
 
@@ -469,8 +459,7 @@ async def split_expense(message: Message, db: AsyncSession):
         await message.answer("No split entries found.")
         return
 
-    cs = CategoryService(db)
-    created_refs = []
+    parts_to_add: list[tuple[str, int]] = []
     for entry in entries:
         if ":" not in entry:
             await message.answer(f"Invalid split entry: {entry}")
@@ -482,29 +471,38 @@ async def split_expense(message: Message, db: AsyncSession):
             await message.answer(f"Invalid amount in entry: {entry}")
             return
 
-        cat = await cs.get_or_create(cat_name.strip())
-        merchant = normalize_merchant(item)
-        note = f"split:{item} | merchant:{merchant}"
-        if payment_method:
-            note += f" | pm:{payment_method}"
+        parts_to_add.append((cat_name.strip(), cents))
 
-        svc = ExpenseService(db)
-        exp = await svc.add_expense_text(
-            user_id=message.from_user.id,
-            item_name=item,
-            amount_cents=cents,
-            category=cat.name,
-            tags="split",
-            notes=note,
-        )
-        created_refs.append(short_ref(exp.id))
+    merchant = normalize_merchant(item)
+    note = f"split:{item} | merchant:{merchant}"
+    if payment_method:
+        note += f" | pm:{payment_method}"
+    user_id = message.from_user.id
+
+    async def record(session: AsyncSession):
+        svc = ExpenseService(session)
+        cs = CategoryService(session)
+        return [
+            await svc.add_expense_text(
+                user_id=user_id,
+                item_name=item,
+                amount_cents=cents,
+                category=(await cs.get_or_create(category)).name,
+                tags="split",
+                notes=note,
+            )
+            for category, cents in parts_to_add
+        ]
+
+    created = await write_queue.submit(record)
+    created_refs = [exp.ref for exp in created]
 
     await message.answer(
         f"✅ Split expense created ({len(created_refs)} entries). Refs: {', '.join(created_refs)}",
     )
 
 @router.message(Command("settags"))
-async def set_tags(message: Message, db: AsyncSession):
+async def set_tags(message: Message):
     """
     Usage: /settags <ref> tag1,tag2,tag3
     """
@@ -514,17 +512,19 @@ async def set_tags(message: Message, db: AsyncSession):
         return
 
     _, expense_id, tags = parts
-    svc = ExpenseService(db)
-    updated = await svc.update_tags(expense_id=expense_id, user_id=message.from_user.id, tags=tags)
+    user_id = message.from_user.id
+    updated = await write_queue.submit(
+        lambda session: ExpenseService(session).update_tags(expense_id=expense_id, user_id=user_id, tags=tags)
+    )
     if not updated:
         await message.answer("❌ Expense not found or not yours.")
         return
 
-    await message.answer(f"✅ Tags updated for `{short_ref(updated.id)}` → {tags}", parse_mode="Markdown")
+    await message.answer(f"✅ Tags updated for `{updated.ref}` → {tags}", parse_mode="Markdown")
 
 
 @router.message(Command("setnote"))
-async def set_note(message: Message, db: AsyncSession):
+async def set_note(message: Message):
     """
     Usage: /setnote <ref> some note text
     """
@@ -534,10 +534,12 @@ async def set_note(message: Message, db: AsyncSession):
         return
 
     _, expense_id, note = parts
-    svc = ExpenseService(db)
-    updated = await svc.update_note(expense_id=expense_id, user_id=message.from_user.id, note=note)
+    user_id = message.from_user.id
+    updated = await write_queue.submit(
+        lambda session: ExpenseService(session).update_note(expense_id=expense_id, user_id=user_id, note=note)
+    )
     if not updated:
         await message.answer("❌ Expense not found or not yours.")
         return
 
-    await message.answer(f"✅ Note updated for `{short_ref(updated.id)}` → {note}", parse_mode="Markdown")
\ No newline at end of file
+    await message.answer(f"✅ Note updated for `{updated.ref}` → {note}", parse_mode="Markdown")
\ No newline at end of file
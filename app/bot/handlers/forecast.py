@@ -6,7 +6,7 @@ from app.services.forecast_service import ForecastService
 
 router = Router(name="forecast")
 
-@router.message(Command("forecast"))
+@router.message(Command("forecast"), flags={"db": "read"})
 async def forecast_expenses(message: Message, db: AsyncSession):
     """
     Usage:
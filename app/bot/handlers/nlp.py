@@ -8,7 +8,7 @@ from app.services.expense_service import ExpenseService
 
 router = Router(name="nlp")
 
-@router.message(Command("ask"))
+@router.message(Command("ask"), flags={"db": "read"})
 async def ask_query(message: Message, db: AsyncSession):
     """
     Usage:
@@ -1,77 +1,152 @@
+from typing import NamedTuple
+
 from aiogram import Router, F
 from aiogram.types import Message
 from app.services.budget_service import BudgetService
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.expense_service import ExpenseService
 from app.services.category_service import CategoryService
+from app.services.receipt_service import ReceiptService
 from app.utils.parser import parse_item_and_amount, extract_hashtags
-from app.core.storage import generate_receipt_path, optimize_and_save
-import tempfile
-import os
-from pathlib import Path
+from app.bot.media_groups import media_groups
+from app.bot.receipt_pipeline import ReceiptJob, receipt_pipeline
+from app.db.writer import write_queue
 
 router = Router(name="receipts")
 
-@router.message(F.photo)
-async def add_expense_with_receipt(message: Message, db: AsyncSession):
-    """
-    User sends a photo with caption like:
-      "Pizza 12.50 #food #lunch"
-    → bot adds expense + stores optimized receipt
-    """
-    if not message.caption:
-        await message.answer("Please add a caption with item and amount, e.g.: 'Pizza 12.50 #food'")
-        return
+CAPTION_HELP = "Please add a caption with item and amount, e.g.: 'Pizza 12.50 #food'"
+CAPTION_FORMAT = "Couldn't parse caption. Use: '<item> <amount> [#category] [#tags]'"
+
+
+class CaptionExpense(NamedTuple):
+    item: str
+    cents: int
+    cat_token: str | None
+    tags_csv: str | None
 
-    parsed = parse_item_and_amount(message.caption)
-    if not parsed:
-        await message.answer("Couldn't parse caption. Use: '<item> <amount> [#category] [#tags]'")
-        return
 
+def _parse_caption(caption: str) -> CaptionExpense | None:
+    parsed = parse_item_and_amount(caption)
+    if not parsed:
+        return None
     item, cents = parsed
-    hashtags = extract_hashtags(message.caption)
+    hashtags = extract_hashtags(caption)
     cat_token = hashtags[0] if hashtags else None
     tags_csv = ",".join(hashtags[1:]) if len(hashtags) > 1 else None
+    return CaptionExpense(item, cents, cat_token, tags_csv)
+
 
-    category_name = None
-    if cat_token:
-        cs = CategoryService(db)
-        cat = await cs.get_or_create(cat_token)
-        category_name = cat.name
-
-    svc = ExpenseService(db)
-    exp = await svc.add_expense_text(
-        user_id=message.from_user.id,
-        item_name=item,
-        amount_cents=cents,
-        category=category_name,
-        tags=tags_csv
+async def _record(session: AsyncSession, user_id: int, draft: CaptionExpense):
+    category = None
+    if draft.cat_token:
+        category = (await CategoryService(session).get_or_create(draft.cat_token)).name
+    return await ExpenseService(session).add_expense_text(
+        user_id=user_id,
+        item_name=draft.item,
+        amount_cents=draft.cents,
+        category=category,
+        tags=draft.tags_csv
     )
+
+
+def _added_line(exp, draft: CaptionExpense) -> str:
+    suffix = f" · 🏷 {exp.category}" if exp.category else ""
+    tags_suffix = f" · #{draft.tags_csv.replace(',', ' #')}" if draft.tags_csv else ""
+    return f"*{draft.item}* — ${draft.cents / 100:.2f}{suffix}{tags_suffix}"
+
+
+async def _send_alerts(message: Message, db: AsyncSession):
     bsvc = BudgetService(db)
-    alerts = await bsvc.check_alerts(message.from_user.id, svc)
+    alerts = await bsvc.check_alerts(message.from_user.id)
     for alert in alerts:
         await message.answer(alert)
 
-    # --- Receipt handling ---
-    photo = message.photo[-1]  # highest resolution
-    file = await message.bot.get_file(photo.file_id)
 
-    # Download temp file first
-    tmp_file = tempfile.NamedTemporaryFile(delete=False, suffix=".jpg")
-    await message.bot.download_file(file.file_path, destination=tmp_file.name)
+@router.message(F.photo, F.media_group_id)
+async def add_expenses_from_album(message: Message, db: AsyncSession):
+    """
+    An album of receipt photos. Each captioned photo starts an expense; the
+    uncaptioned photos after it become extra receipts of that expense (any
+    before the first caption go to the first one). All photos are stored
+    concurrently, then every expense is written in one transaction.
+    """
+    album = await media_groups.collect(message)
+    if album is None:
+        return  # another photo of the album; its first message handles it
+
+    groups: list[tuple[CaptionExpense, list[Message]]] = []
+    leading: list[Message] = []
+    for m in album:
+        if not m.caption:
+            (groups[-1][1] if groups else leading).append(m)
+            continue
+        draft = _parse_caption(m.caption)
+        if not draft:
+            await message.answer(CAPTION_FORMAT)
+            return
+        groups.append((draft, [m]))
+    if not groups:
+        await message.answer(CAPTION_HELP)
+        return
+    groups[0][1][:0] = leading
+
+    user_id = message.from_user.id
+    await message.answer(f"📥 Saving {len(album)} receipts…")
+    try:
+        photos = [(m.photo[-1].file_id, m.photo[-1].file_unique_id) for m in album]
+        ids = [m.message_id for m in album]
+        stored = dict(zip(ids, await receipt_pipeline.store_all(message.bot, photos)))
+
+        async def record(session: AsyncSession):
+            created = []
+            for draft, msgs in groups:
+                exp = await _record(session, user_id, draft)
+                await ReceiptService(session).attach(exp.id, user_id, [stored[m.message_id] for m in msgs])
+                created.append((exp, draft, len(msgs)))
+            return created
+
+        try:
+            created = await write_queue.submit(record)
+        except FileNotFoundError:
+            # A reused blob was swept before the write: store the album afresh.
+            stored = dict(zip(ids, await receipt_pipeline.store_all(message.bot, photos, reuse=False)))
+            created = await write_queue.submit(record)
+    except Exception:
+        await message.answer("⚠️ Couldn't save the album receipts, nothing was added.")
+        raise
 
-    # Optimize + save to final path
-    final_path = generate_receipt_path(message.from_user.id, exp.id, ".jpg")
-    optimize_and_save(Path(tmp_file.name), final_path)
-    os.unlink(tmp_file.name)  # clean temp
+    await _send_alerts(message, db)
+    lines = [f"✅ Added {len(created)} expense{'s' if len(created) != 1 else ''}:"]
+    for exp, draft, count in created:
+        lines.append(f"- {_added_line(exp, draft)} · 📎 {count} `{exp.ref}`")
+    await message.answer("\n".join(lines), parse_mode="Markdown")
 
-    # Attach to expense
-    await svc.attach_receipt(exp.id, message.from_user.id, str(final_path))
 
-    dollars = cents / 100
-    suffix = f" · 🏷 {category_name}" if category_name else ""
-    tags_suffix = f" · #{tags_csv.replace(',', ' #')}" if tags_csv else ""
+@router.message(F.photo)
+async def add_expense_with_receipt(message: Message, db: AsyncSession):
+    """
+    User sends a photo with caption like:
+      "Pizza 12.50 #food #lunch"
+    → bot adds expense + stores optimized receipt
+    """
+    if not message.caption:
+        await message.answer(CAPTION_HELP)
+        return
+
+    draft = _parse_caption(message.caption)
+    if not draft:
+        await message.answer(CAPTION_FORMAT)
+        return
+
+    user_id = message.from_user.id
+    exp = await write_queue.submit(lambda session: _record(session, user_id, draft))
+
+    await _send_alerts(message, db)
     await message.answer(
-        f"✅ Added: *{item}* — ${dollars:.2f}{suffix}{tags_suffix}\n📎 Receipt saved\n`{exp.id}`",
+        f"✅ Added: {_added_line(exp, draft)}\n📎 Saving receipt…\n`{exp.id}`",
         parse_mode="Markdown"
     )
+
+    # Download, resize and attach happen in the background; a follow-up confirms.
+    photo = message.photo[-1]  # highest resolution
+    await receipt_pipeline.submit(ReceiptJob(message, user_id, exp.id, exp.ref, photo.file_id, photo.file_unique_id))
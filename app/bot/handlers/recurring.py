@@ -5,7 +5,7 @@ from aiogram.filters import Command
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.recurring_service import RecurringService
 from app.bot.keyboards import main_menu_kb
-from app.utils.text import short_ref
+from app.db.writer import write_queue
 
 router = Router(name="recurring")
 
@@ -26,7 +26,7 @@ async def recurring_help(message: Message):
     , reply_markup=_back_to_menu_inline_kb())
 
 
-@router.message(Command("recurring_list"))
+@router.message(Command("recurring_list"), flags={"db": "read"})
 async def recurring_list(message: Message, db: AsyncSession):
     svc = RecurringService(db)
     recs = await svc.list_all(message.from_user.id)
@@ -45,7 +45,7 @@ async def recurring_list(message: Message, db: AsyncSession):
         else:
             freq = "daily"
         repeat = f" ×{r.remaining}" if r.remaining else (" ∞" if r.repeat_count is None else "")
-        ref = short_ref(r.id)
+        ref = r.ref
         lines.append(
             f"- {r.item_name} ${r.amount_cents/100:.2f} "
             f"[{status}] — {freq}{repeat} (ref: {ref})"
@@ -63,12 +63,15 @@ async def recurring_list(message: Message, db: AsyncSession):
 
 
 @router.callback_query(F.data.regexp(r"^recurring:(pause|resume|cancel):[A-Za-z0-9]+$"))
-async def recurring_quick_action(callback: CallbackQuery, db: AsyncSession):
+async def recurring_quick_action(callback: CallbackQuery):
     _, action, ref = callback.data.split(":", 2)
-    svc = RecurringService(db)
+    user_id = callback.from_user.id
+
+    def update_state(**state):
+        return write_queue.submit(lambda session: RecurringService(session).update_state(ref, user_id, **state))
 
     if action == "pause":
-        rec = await svc.update_state(ref, callback.from_user.id, paused=True)
+        rec = await update_state(paused=True)
         if rec:
             with contextlib.suppress(Exception):
                 await callback.message.edit_reply_markup(reply_markup=None)
@@ -78,7 +81,7 @@ async def recurring_quick_action(callback: CallbackQuery, db: AsyncSession):
         return
 
     if action == "resume":
-        rec = await svc.update_state(ref, callback.from_user.id, paused=False)
+        rec = await update_state(paused=False)
         if rec:
             with contextlib.suppress(Exception):
                 await callback.message.edit_reply_markup(reply_markup=None)
@@ -87,7 +90,7 @@ async def recurring_quick_action(callback: CallbackQuery, db: AsyncSession):
             await callback.answer("Not found", show_alert=True)
         return
 
-    rec = await svc.update_state(ref, callback.from_user.id, active=False)
+    rec = await update_state(active=False)
     if rec:
         with contextlib.suppress(Exception):
             await callback.message.edit_reply_markup(reply_markup=None)
@@ -97,33 +100,39 @@ async def recurring_quick_action(callback: CallbackQuery, db: AsyncSession):
 
 
 @router.message(Command("recurring_cancel"))
-async def recurring_cancel(message: Message, db: AsyncSession):
+async def recurring_cancel(message: Message):
     parts = message.text.split()
     if len(parts) != 2:
         await message.answer("Usage: /recurring_cancel <ref>")
         return
-    svc = RecurringService(db)
-    rec = await svc.update_state(parts[1], message.from_user.id, active=False)
+    user_id = message.from_user.id
+    rec = await write_queue.submit(
+        lambda session: RecurringService(session).update_state(parts[1], user_id, active=False)
+    )
     await message.answer("❌ Cancelled." if rec else "Not found.", reply_markup=main_menu_kb())
 
 
 @router.message(Command("recurring_pause"))
-async def recurring_pause(message: Message, db: AsyncSession):
+async def recurring_pause(message: Message):
     parts = message.text.split()
     if len(parts) != 2:
         await message.answer("Usage: /recurring_pause <ref>")
         return
-    svc = RecurringService(db)
-    rec = await svc.update_state(parts[1], message.from_user.id, paused=True)
+    user_id = message.from_user.id
+    rec = await write_queue.submit(
+        lambda session: RecurringService(session).update_state(parts[1], user_id, paused=True)
+    )
     await message.answer("⏸ Paused." if rec else "Not found.", reply_markup=main_menu_kb())
 
 
 @router.message(Command("recurring_resume"))
-async def recurring_resume(message: Message, db: AsyncSession):
+async def recurring_resume(message: Message):
     parts = message.text.split()
     if len(parts) != 2:
         await message.answer("Usage: /recurring_resume <ref>")
         return
-    svc = RecurringService(db)
-    rec = await svc.update_state(parts[1], message.from_user.id, paused=False)
+    user_id = message.from_user.id
+    rec = await write_queue.submit(
+        lambda session: RecurringService(session).update_state(parts[1], user_id, paused=False)
+    )
     await message.answer("▶️ Resumed." if rec else "Not found.", reply_markup=main_menu_kb())
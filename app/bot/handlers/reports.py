@@ -1,12 +1,17 @@
 from aiogram import Router
-from aiogram.types import Message, BufferedInputFile, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.types import BufferedInputFile, FSInputFile, InputMediaPhoto, Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
+from aiogram.exceptions import TelegramBadRequest
 from aiogram.filters import Command
 from aiogram import F
-from app.core.charts import bar_chart_by_month, pie_chart_by_category
+from app.bot.export_jobs import ExportJob, export_queue
+from app.core import exports
+from app.core.chart_cache import chart_cache
+from app.core.chart_renderer import chart_renderer
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from io import BytesIO
-from app.services.expense_service import ExpenseService
+from app.db.writer import write_queue
+from app.services.expense_service import ExpensePage, ExpenseService
+from app.services.receipt_service import ReceiptService
 from app.bot.keyboards import main_menu_kb
 
 router = Router(name="reports")
@@ -42,6 +47,10 @@ def _export_kb() -> InlineKeyboardMarkup:
                 InlineKeyboardButton(text="CSV (This Year)", callback_data="export:csv:year"),
                 InlineKeyboardButton(text="XLSX (This Year)", callback_data="export:xlsx:year"),
             ],
+            [
+                InlineKeyboardButton(text="Parquet (This Month)", callback_data="export:parquet:month"),
+                InlineKeyboardButton(text="Parquet (This Year)", callback_data="export:parquet:year"),
+            ],
         ]
     )
 
@@ -84,6 +93,39 @@ def _back_to_menu_inline_kb() -> InlineKeyboardMarkup:
     )
 
 
+def _page_kb(page: ExpensePage, prefix: str, suffix: str = "") -> InlineKeyboardMarkup:
+    """
+    Newer/older buttons for a keyset page, as "<prefix>:<p|n>:<ref><suffix>".
+    Buttons whose callback data would exceed Telegram's 64 bytes are left out.
+    """
+    nav: list[InlineKeyboardButton] = []
+    for text, direction, cursor in (("◀️ Newer", "p", page.prev_cursor), ("Older ▶️", "n", page.next_cursor)):
+        data = f"{prefix}:{direction}:{cursor}{suffix}"
+        if cursor and len(data.encode()) <= 64:
+            nav.append(InlineKeyboardButton(text=text, callback_data=data))
+    rows = [nav] if nav else []
+    rows.append([InlineKeyboardButton(text="⬅️ Back to Menu", callback_data="nav:menu")])
+    return InlineKeyboardMarkup(inline_keyboard=rows)
+
+
+def _expense_lines(items) -> list[str]:
+    lines = []
+    for exp in items:
+        dollars = exp.amount_cents / 100
+        cat = f" · 🏷 {exp.category}" if exp.category else ""
+        tags = f" · #{exp.tags.replace(',', ' #')}" if exp.tags else ""
+        note = f"\n    📝 {exp.notes}" if exp.notes else ""
+        lines.append(f"- {exp.item_name}: ${dollars:.2f}{cat}{tags} ({exp.local_date}){note}")
+    return lines
+
+
+async def _show_page(target: Message, text: str, kb: InlineKeyboardMarkup, edit: bool):
+    if edit:
+        await target.edit_text(text, parse_mode="Markdown", reply_markup=kb)
+    else:
+        await target.answer(text, parse_mode="Markdown", reply_markup=kb)
+
+
 def _month_details_kb() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
@@ -150,21 +192,32 @@ async def _send_year_report(target: Message, db: AsyncSession, user_id: int, yea
     await target.answer("\n".join(lines), parse_mode="Markdown", reply_markup=_back_to_menu_inline_kb())
 
 
-async def _send_search_results(target: Message, db: AsyncSession, user_id: int, keyword: str):
+async def _send_search_results(target: Message, db: AsyncSession, user_id: int, keyword: str,
+                               cursor: str | None = None, older: bool = True, edit: bool = False):
     svc = ExpenseService(db)
-    results = await svc.search_expenses(user_id, keyword)
-    if not results:
+    page = await svc.search_page(user_id, keyword, cursor, older)
+    if not page.items:
         await target.answer(f"No expenses found for: {keyword}", reply_markup=_back_to_menu_inline_kb())
         return
 
-    lines = [f"🔍 Results for *{keyword}* (latest {len(results)})"]
-    for exp in results:
-        dollars = exp.amount_cents / 100
-        cat = f" · 🏷 {exp.category}" if exp.category else ""
-        tags = f" · #{exp.tags.replace(',', ' #')}" if exp.tags else ""
-        note = f"\n    📝 {exp.notes}" if exp.notes else ""
-        lines.append(f"- {exp.item_name}: ${dollars:.2f}{cat}{tags} ({exp.local_date}){note}")
-    await target.answer("\n".join(lines), parse_mode="Markdown", reply_markup=_back_to_menu_inline_kb())
+    label = "latest" if not page.prev_cursor else "older"
+    lines = [f"🔍 Results for *{keyword}* ({label} {len(page.items)})"]
+    lines.extend(_expense_lines(page.items))
+    await _show_page(target, "\n".join(lines), _page_kb(page, "sp", f":{keyword}"), edit)
+
+
+async def _send_history(target: Message, db: AsyncSession, user_id: int,
+                        cursor: str | None = None, older: bool = True, edit: bool = False):
+    svc = ExpenseService(db)
+    page = await svc.history_page(user_id, cursor, older)
+    if not page.items:
+        await target.answer("No expenses yet.", reply_markup=_back_to_menu_inline_kb())
+        return
+
+    label = "latest" if not page.prev_cursor else "older"
+    lines = [f"🧾 History ({label} {len(page.items)})"]
+    lines.extend(_expense_lines(page.items))
+    await _show_page(target, "\n".join(lines), _page_kb(page, "hist"), edit)
 
 
 async def _send_month_details(target: Message, db: AsyncSession, user_id: int, year: int, month: int, group_by: str):
@@ -195,33 +248,21 @@ async def _send_year_details(target: Message, db: AsyncSession, user_id: int, ye
     await target.answer("\n".join(lines), parse_mode="Markdown", reply_markup=_back_to_menu_inline_kb())
 
 
+async def _send_export(target: Message, db: AsyncSession, user_id: int, file_format: str,
+                       year: int | None, month: int | None, period_label: str, reply_markup=None):
+    # Built by the export workers; the reply here is just the status message.
+    job = ExportJob(user_id, file_format, year, month, period_label)
+    await export_queue.submit(target, db, job, reply_markup=reply_markup)
+
+
 async def _send_quick_export(target: Message, db: AsyncSession, user_id: int, file_format: str, period: str):
     now = datetime.now()
     year = now.year
     month = now.month if period == "month" else None
-
-    svc = ExpenseService(db)
-    df = await svc.export_expenses(user_id, year=year, month=month)
-    if df is None:
-        await target.answer("No expenses found for the selected period.", reply_markup=_back_to_menu_inline_kb())
-        return
-
-    stamp = datetime.now().strftime("%Y%m%d_%H%M")
     period_label = f"{year}_{month:02d}" if month else f"{year}"
+    await _send_export(target, db, user_id, file_format, year, month, period_label, _back_to_menu_inline_kb())
 
-    if file_format == "xlsx":
-        buffer = BytesIO()
-        df.to_excel(buffer, index=False)
-        data = buffer.getvalue()
-        filename = f"expenses_{period_label}_{stamp}.xlsx"
-    else:
-        data = df.to_csv(index=False).encode("utf-8")
-        filename = f"expenses_{period_label}_{stamp}.csv"
-
-    document = BufferedInputFile(data, filename=filename)
-    await target.answer_document(document, caption=f"📦 Export ready: {filename}", reply_markup=_back_to_menu_inline_kb())
-
-@router.message(Command("month"))
+@router.message(Command("month"), flags={"db": "read"})
 async def month_report(message: Message, db: AsyncSession):
     """
     Usage:
@@ -248,7 +289,7 @@ async def month_report(message: Message, db: AsyncSession):
         await message.answer("Quick report periods:", reply_markup=_report_period_kb())
 
 
-@router.message(Command("year"))
+@router.message(Command("year"), flags={"db": "read"})
 async def year_report(message: Message, db: AsyncSession):
     """
     Usage:
@@ -274,7 +315,7 @@ async def year_report(message: Message, db: AsyncSession):
         await message.answer("Quick report periods:", reply_markup=_report_period_kb())
 
 
-@router.callback_query(F.data.regexp(r"^report:(month|year):(current|last)$"))
+@router.callback_query(F.data.regexp(r"^report:(month|year):(current|last)$"), flags={"db": "read"})
 async def report_period_quick(callback: CallbackQuery, db: AsyncSession):
     _, mode, when = callback.data.split(":")
     now = datetime.now()
@@ -291,7 +332,7 @@ async def report_period_quick(callback: CallbackQuery, db: AsyncSession):
 
     await callback.answer()
 
-@router.message(Command("monthdetails"))
+@router.message(Command("monthdetails"), flags={"db": "read"})
 async def month_details(message: Message, db: AsyncSession):
     """
     Usage:
@@ -321,7 +362,7 @@ async def month_details(message: Message, db: AsyncSession):
         await message.answer("Quick month details:", reply_markup=_month_details_kb())
 
 
-@router.message(Command("yeardetails"))
+@router.message(Command("yeardetails"), flags={"db": "read"})
 async def year_details(message: Message, db: AsyncSession):
     """
     Usage:
@@ -351,7 +392,7 @@ async def year_details(message: Message, db: AsyncSession):
         await message.answer("Quick year details:", reply_markup=_year_details_kb())
 
 
-@router.callback_query(F.data.regexp(r"^details:(month|year):(item|category):(current|last)$"))
+@router.callback_query(F.data.regexp(r"^details:(month|year):(item|category):(current|last)$"), flags={"db": "read"})
 async def details_quick(callback: CallbackQuery, db: AsyncSession):
     _, period, group_by, when = callback.data.split(":")
     now = datetime.now()
@@ -369,7 +410,7 @@ async def details_quick(callback: CallbackQuery, db: AsyncSession):
     await callback.answer()
 
 
-@router.message(Command("search"))
+@router.message(Command("search"), flags={"db": "read"})
 async def search_expenses_cmd(message: Message, db: AsyncSession):
     """
     Usage:
@@ -385,19 +426,48 @@ async def search_expenses_cmd(message: Message, db: AsyncSession):
     await _send_search_results(message, db, message.from_user.id, keyword)
 
 
-@router.callback_query(F.data.regexp(r"^search:kw:[a-z0-9_\-]+$"))
+@router.callback_query(F.data.regexp(r"^search:kw:[a-z0-9_\-]+$"), flags={"db": "read"})
 async def search_quick(callback: CallbackQuery, db: AsyncSession):
     keyword = callback.data.split(":", 2)[2]
     await _send_search_results(callback.message, db, callback.from_user.id, keyword)
     await callback.answer()
 
 
+@router.callback_query(F.data.regexp(r"^sp:[np]:[0-9a-f\-]+:.+$"), flags={"db": "read"})
+async def search_page_nav(callback: CallbackQuery, db: AsyncSession):
+    _, direction, cursor, keyword = callback.data.split(":", 3)
+    await _send_search_results(
+        callback.message, db, callback.from_user.id, keyword,
+        cursor=cursor, older=direction == "n", edit=True,
+    )
+    await callback.answer()
+
+
+@router.message(Command("history"), flags={"db": "read"})
+async def history_cmd(message: Message, db: AsyncSession):
+    """
+    Usage:
+      /history   (newest first, with Older/Newer buttons)
+    """
+    await _send_history(message, db, message.from_user.id)
+
+
+@router.callback_query(F.data.regexp(r"^hist:[np]:[0-9a-f\-]+$"), flags={"db": "read"})
+async def history_page_nav(callback: CallbackQuery, db: AsyncSession):
+    _, direction, cursor = callback.data.split(":", 2)
+    await _send_history(
+        callback.message, db, callback.from_user.id,
+        cursor=cursor, older=direction == "n", edit=True,
+    )
+    await callback.answer()
+
+
 @router.callback_query(F.data == "nav:menu")
 async def nav_to_menu(callback: CallbackQuery):
     await callback.message.answer("📋 Main menu", reply_markup=main_menu_kb())
     await callback.answer()
 
-@router.message(Command("receipt"))
+@router.message(Command("receipt"), flags={"db": "read"})
 async def get_receipt(message: Message, db: AsyncSession):
     """
     Usage:
@@ -421,13 +491,49 @@ async def get_receipt(message: Message, db: AsyncSession):
         await message.answer("No receipt attached to this expense.")
         return
 
+    caption = f"Receipt for {exp.item_name} (${exp.amount_cents/100:.2f})"
+    receipts = await ReceiptService(db).list_for_expense(exp)
+    if len(receipts) > 1:
+        receipts = receipts[:10]
+
+        def album(from_disk: bool) -> list[InputMediaPhoto]:
+            return [
+                InputMediaPhoto(media=FSInputFile(path) if from_disk or not file_id else file_id,
+                                caption=caption if i == 0 else None)
+                for i, (path, file_id) in enumerate(receipts)
+            ]
+
+        try:
+            await message.answer_media_group(album(from_disk=False))
+            return
+        except TelegramBadRequest:
+            pass  # a cached id was rejected: upload them all from disk and remember the new ids
+        try:
+            sent = await message.answer_media_group(album(from_disk=True))
+        except Exception:
+            await message.answer("⚠️ Could not load the receipt files. Maybe deleted from disk.")
+            return
+        file_ids = [m.photo[-1].file_id if m.photo else None for m in sent]
+        await write_queue.submit(lambda session: ReceiptService(session).set_file_ids(exp.id, file_ids))
+        return
+
+    if exp.receipt_file_id:
+        try:
+            await message.answer_photo(exp.receipt_file_id, caption=caption)
+            return
+        except TelegramBadRequest:
+            pass  # id no longer valid: upload from disk and remember the new one
+
     try:
-        with open(exp.receipt_path, "rb") as f:
-            await message.answer_photo(f, caption=f"Receipt for {exp.item_name} (${exp.amount_cents/100:.2f})")
+        sent = await message.answer_photo(FSInputFile(exp.receipt_path), caption=caption)
     except Exception:
         await message.answer("⚠️ Could not load the receipt file. Maybe deleted from disk.")
+        return
+    if sent.photo:
+        file_id = sent.photo[-1].file_id
+        await write_queue.submit(lambda session: ExpenseService(session).set_receipt_file_id(exp.id, file_id))
 
-@router.message(Command("compare"))
+@router.message(Command("compare"), flags={"db": "read"})
 async def compare_expenses(message: Message, db: AsyncSession):
     """
     Usage:
@@ -498,7 +604,7 @@ async def compare_expenses(message: Message, db: AsyncSession):
     await message.answer("\n".join(lines), parse_mode="Markdown")
 
 
-@router.callback_query(F.data.in_({"compare:month", "compare:year"}))
+@router.callback_query(F.data.in_({"compare:month", "compare:year"}), flags={"db": "read"})
 async def compare_quick(callback: CallbackQuery, db: AsyncSession):
     mode = callback.data.split(":", 1)[1]
     svc = ExpenseService(db)
@@ -532,81 +638,81 @@ async def compare_quick(callback: CallbackQuery, db: AsyncSession):
     await callback.message.answer("\n".join(lines), parse_mode="Markdown", reply_markup=_back_to_menu_inline_kb())
     await callback.answer()
 
-@router.message(Command("chart"))
-async def chart_expenses(message: Message, db: AsyncSession):
+_CHART_EMPTY = {
+    "month": "No data for this month.",
+    "year": "No data for this year.",
+    "yeartrend": "No data for this year.",
+}
+
+
+async def _chart_spec(db: AsyncSession, user_id: int, mode: str) -> tuple[str, dict, str] | None:
     """
-    Usage:
-      /chart month            → pie chart by category (this month)
-      /chart year             → pie chart by category (this year)
-      /chart yeartrend        → bar chart by month (this year)
+    (kind, series, title) for the chart `mode` (a _CHART_EMPTY key); None
+    when there is nothing to plot.
     """
-    parts = (message.text or "").split()
     now = datetime.now()
     svc = ExpenseService(db)
-
-    if len(parts) == 2 and parts[1].lower() == "month":
-        data = await svc.monthly_summary(message.from_user.id, now.year, now.month)
+    if mode == "month":
+        data = await svc.monthly_summary(user_id, now.year, now.month)
         if data["total_cents"] == 0:
-            await message.answer("No data for this month.")
-            return
-        buf = pie_chart_by_category(data["breakdown"], f"{now.year}-{now.month:02d} Expenses by Category")
-        await message.answer_photo(buf)
-
-    elif len(parts) == 2 and parts[1].lower() == "year":
-        data = await svc.yearly_summary(message.from_user.id, now.year)
+            return None
+        return "pie", data["breakdown"], f"{now.year}-{now.month:02d} Expenses by Category"
+    data = await svc.yearly_summary(user_id, now.year)
+    if mode == "year":
         if data["total_cents"] == 0:
-            await message.answer("No data for this year.")
-            return
-        buf = pie_chart_by_category(data["breakdown"], f"{now.year} Expenses by Category")
-        await message.answer_photo(buf)
+            return None
+        return "pie", data["breakdown"], f"{now.year} Expenses by Category"
+    if not data["per_month"]:
+        return None
+    return "bar", data["per_month"], f"{now.year} Monthly Spending Trend"
+
+
+async def _send_chart(target: Message, db: AsyncSession, user_id: int, mode: str, reply_markup=None):
+    spec = await _chart_spec(db, user_id, mode)
+    if spec is None:
+        await target.answer(_CHART_EMPTY[mode])
+        return
 
-    elif len(parts) == 2 and parts[1].lower() == "yeartrend":
-        data = await svc.yearly_summary(message.from_user.id, now.year)
-        if not data["per_month"]:
-            await message.answer("No data for this year.")
+    # Same series and title -> same picture: reuse the upload, else the PNG.
+    key = chart_cache.key(*spec)
+    cached = chart_cache.get(key)
+    if cached and cached.file_id:
+        try:
+            await target.answer_photo(cached.file_id, reply_markup=reply_markup)
             return
-        buf = bar_chart_by_month(data["per_month"], f"{now.year} Monthly Spending Trend")
-        await message.answer_photo(buf)
+        except TelegramBadRequest:
+            cached.file_id = None
+    if cached is None:
+        cached = chart_cache.put(key, await chart_renderer.render(*spec))
+    sent = await target.answer_photo(BufferedInputFile(cached.png, filename=f"chart_{mode}.png"), reply_markup=reply_markup)
+    if sent.photo:
+        cached.file_id = sent.photo[-1].file_id
 
-    else:
+
+@router.message(Command("chart"), flags={"db": "read"})
+async def chart_expenses(message: Message, db: AsyncSession):
+    """
+    Usage:
+      /chart month            → pie chart by category (this month)
+      /chart year             → pie chart by category (this year)
+      /chart yeartrend        → bar chart by month (this year)
+    """
+    parts = (message.text or "").split()
+    mode = parts[1].lower() if len(parts) == 2 else None
+    if mode not in _CHART_EMPTY:
         await message.answer("Pick chart type:", reply_markup=_chart_kb())
+        return
+    await _send_chart(message, db, message.from_user.id, mode)
 
 
-@router.callback_query(F.data.in_({"chart:month", "chart:year", "chart:yeartrend"}))
+@router.callback_query(F.data.in_({"chart:month", "chart:year", "chart:yeartrend"}), flags={"db": "read"})
 async def chart_quick(callback: CallbackQuery, db: AsyncSession):
     mode = callback.data.split(":", 1)[1]
-    now = datetime.now()
-    svc = ExpenseService(db)
-
-    if mode == "month":
-        data = await svc.monthly_summary(callback.from_user.id, now.year, now.month)
-        if data["total_cents"] == 0:
-            await callback.message.answer("No data for this month.")
-            await callback.answer()
-            return
-        buf = pie_chart_by_category(data["breakdown"], f"{now.year}-{now.month:02d} Expenses by Category")
-        await callback.message.answer_photo(buf, reply_markup=main_menu_kb())
-    elif mode == "year":
-        data = await svc.yearly_summary(callback.from_user.id, now.year)
-        if data["total_cents"] == 0:
-            await callback.message.answer("No data for this year.")
-            await callback.answer()
-            return
-        buf = pie_chart_by_category(data["breakdown"], f"{now.year} Expenses by Category")
-        await callback.message.answer_photo(buf, reply_markup=main_menu_kb())
-    else:
-        data = await svc.yearly_summary(callback.from_user.id, now.year)
-        if not data["per_month"]:
-            await callback.message.answer("No data for this year.")
-            await callback.answer()
-            return
-        buf = bar_chart_by_month(data["per_month"], f"{now.year} Monthly Spending Trend")
-        await callback.message.answer_photo(buf, reply_markup=main_menu_kb())
-
+    await _send_chart(callback.message, db, callback.from_user.id, mode, reply_markup=main_menu_kb())
     await callback.answer()
 
 
-@router.message(Command("export"))
+@router.message(Command("export"), flags={"db": "read"})
 async def export_expenses_cmd(message: Message, db: AsyncSession):
     """
     Usage:
@@ -614,6 +720,7 @@ async def export_expenses_cmd(message: Message, db: AsyncSession):
       /export csv
       /export xlsx 2026
       /export csv 2026 2
+      /export parquet
     """
     parts = (message.text or "").split()
     if len(parts) == 1:
@@ -626,7 +733,7 @@ async def export_expenses_cmd(message: Message, db: AsyncSession):
 
     if len(parts) >= 2:
         maybe_format = parts[1].lower()
-        if maybe_format in {"csv", "xlsx"}:
+        if maybe_format in exports.WRITERS:
             file_format = maybe_format
             args = parts[2:]
         else:
@@ -638,7 +745,7 @@ async def export_expenses_cmd(message: Message, db: AsyncSession):
         try:
             year = int(args[0])
         except ValueError:
-            await message.answer("Usage: /export [csv|xlsx] [year] [month]")
+            await message.answer("Usage: /export [csv|xlsx|parquet] [year] [month]")
             return
 
     if len(args) >= 2:
@@ -651,32 +758,14 @@ async def export_expenses_cmd(message: Message, db: AsyncSession):
             return
 
     if len(args) > 2:
-        await message.answer("Usage: /export [csv|xlsx] [year] [month]")
+        await message.answer("Usage: /export [csv|xlsx|parquet] [year] [month]")
         return
 
-    svc = ExpenseService(db)
-    df = await svc.export_expenses(message.from_user.id, year=year, month=month)
-    if df is None:
-        await message.answer("No expenses found for the selected period.")
-        return
-
-    stamp = datetime.now().strftime("%Y%m%d_%H%M")
     period_label = "all" if not year else (f"{year}" if not month else f"{year}_{month:02d}")
-
-    if file_format == "xlsx":
-        buffer = BytesIO()
-        df.to_excel(buffer, index=False)
-        data = buffer.getvalue()
-        filename = f"expenses_{period_label}_{stamp}.xlsx"
-    else:
-        data = df.to_csv(index=False).encode("utf-8")
-        filename = f"expenses_{period_label}_{stamp}.csv"
-
-    document = BufferedInputFile(data, filename=filename)
-    await message.answer_document(document, caption=f"📦 Export ready: {filename}")
+    await _send_export(message, db, message.from_user.id, file_format, year, month, period_label)
 
 
-@router.callback_query(F.data.regexp(r"^export:(csv|xlsx):(month|year)$"))
+@router.callback_query(F.data.regexp(r"^export:(csv|xlsx|parquet):(month|year)$"), flags={"db": "read"})
 async def export_quick(callback: CallbackQuery, db: AsyncSession):
     _, file_format, period = callback.data.split(":")
     await _send_quick_export(callback.message, db, callback.from_user.id, file_format, period)
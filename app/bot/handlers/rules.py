@@ -8,7 +8,7 @@ from aiogram.types import ReplyKeyboardMarkup, KeyboardButton
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.services.rule_service import RuleService
 from app.bot.keyboards import main_menu_kb
-from app.utils.text import short_ref
+from app.db.writer import write_queue
 
 router = Router(name="rules")
 
@@ -73,32 +73,32 @@ async def rules_keyword(message: Message, state: FSMContext):
 
 
 @router.message(RuleFlow.category)
-async def rules_category(message: Message, db: AsyncSession, state: FSMContext):
+async def rules_category(message: Message, state: FSMContext):
     text = (message.text or "").strip()
     if text == "❌ Cancel":
         await state.clear()
         await message.answer("Cancelled.", reply_markup=main_menu_kb())
         return
     data = await state.get_data()
-    svc = RuleService(db)
-    r = await svc.add_rule(message.from_user.id, data.get("keyword", ""), text)
+    user_id = message.from_user.id
+    r = await write_queue.submit(lambda session: RuleService(session).add_rule(user_id, data.get("keyword", ""), text))
     await state.clear()
     await message.answer(
-        f"✅ Rule added: {r.keyword} → {r.category} (ref: `{short_ref(r.id)}`)",
+        f"✅ Rule added: {r.keyword} → {r.category} (ref: `{r.ref}`)",
         parse_mode="Markdown",
         reply_markup=main_menu_kb(),
     )
 
 
 @router.message(RuleFlow.delete_ref)
-async def rules_delete_ref(message: Message, db: AsyncSession, state: FSMContext):
+async def rules_delete_ref(message: Message, state: FSMContext):
     text = (message.text or "").strip()
     if text == "❌ Cancel":
         await state.clear()
         await message.answer("Cancelled.", reply_markup=main_menu_kb())
         return
-    svc = RuleService(db)
-    r = await svc.delete_rule(message.from_user.id, text)
+    user_id = message.from_user.id
+    r = await write_queue.submit(lambda session: RuleService(session).delete_rule(user_id, text))
     await state.clear()
     await message.answer("✅ Deleted." if r else "❌ Not found or ambiguous ref.", reply_markup=main_menu_kb())
 
@@ -112,7 +112,7 @@ async def rules_list(message: Message, db: AsyncSession):
     lines = ["📌 Your category rules:"]
     inline_rows: list[list[InlineKeyboardButton]] = []
     for r in rules:
-        ref = short_ref(r.id)
+        ref = r.ref
         lines.append(f"- {r.keyword} → {r.category} (ref: {ref})")
         inline_rows.append([
             InlineKeyboardButton(text=f"🗑 Delete {ref}", callback_data=f"rule:delete:{ref}")
@@ -121,10 +121,10 @@ async def rules_list(message: Message, db: AsyncSession):
 
 
 @router.callback_query(F.data.regexp(r"^rule:delete:[A-Za-z0-9]+$"))
-async def rules_delete_quick(callback: CallbackQuery, db: AsyncSession):
+async def rules_delete_quick(callback: CallbackQuery):
     ref = callback.data.split(":", 2)[2]
-    svc = RuleService(db)
-    deleted = await svc.delete_rule(callback.from_user.id, ref)
+    user_id = callback.from_user.id
+    deleted = await write_queue.submit(lambda session: RuleService(session).delete_rule(user_id, ref))
     if deleted:
         with contextlib.suppress(Exception):
             await callback.message.edit_reply_markup(reply_markup=None)
@@ -133,22 +133,22 @@ async def rules_delete_quick(callback: CallbackQuery, db: AsyncSession):
         await callback.answer("Rule not found", show_alert=True)
 
 @router.message(Command("rules_add"))
-async def rules_add(message: Message, db: AsyncSession):
+async def rules_add(message: Message):
     parts = message.text.split(maxsplit=2)
     if len(parts) < 3:
         await message.answer("Usage: /rules_add <keyword> <category>")
         return
     _, keyword, category = parts
-    svc = RuleService(db)
-    r = await svc.add_rule(message.from_user.id, keyword, category)
-    await message.answer(f"✅ Rule added: {r.keyword} → {r.category} (ref: `{short_ref(r.id)}`)", parse_mode="Markdown")
+    user_id = message.from_user.id
+    r = await write_queue.submit(lambda session: RuleService(session).add_rule(user_id, keyword, category))
+    await message.answer(f"✅ Rule added: {r.keyword} → {r.category} (ref: `{r.ref}`)", parse_mode="Markdown")
 
 @router.message(Command("rules_delete"))
-async def rules_delete(message: Message, db: AsyncSession):
+async def rules_delete(message: Message):
     parts = message.text.split()
     if len(parts) != 2:
         await message.answer("Usage: /rules_delete <ref>")
         return
-    svc = RuleService(db)
-    r = await svc.delete_rule(message.from_user.id, parts[1])
+    user_id = message.from_user.id
+    r = await write_queue.submit(lambda session: RuleService(session).delete_rule(user_id, parts[1]))
     await message.answer("✅ Deleted." if r else "❌ Not found or ambiguous ref.")
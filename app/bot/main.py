@@ -1,12 +1,20 @@
 import asyncio
 import contextlib
 from aiogram import Bot, Dispatcher
+from aiogram.dispatcher.flags import get_flag
 from aiogram.types import BotCommand
 from sqlalchemy import select
 from app.core.config import settings
 from app.core.logging import setup_logging
-from app.db.session import SessionLocal, engine
+from app.db.session import ReadSessionLocal, engine, session_factory
 from app.db.base import Base
+from app.db.migrations import run_migrations
+from app.db.unit_of_work import UNIT_OF_WORK
+from app.db.writer import write_queue
+from app.bot.export_jobs import export_queue
+from app.core.chart_renderer import chart_renderer
+from app.bot.receipt_pipeline import receipt_pipeline
+from app.services.receipt_sweeper import receipt_sweeper
 from app.db.models import Expense, Budget, RecurringExpense
 from app.bot.handlers.expenses import router as expenses_router
 from app.bot.handlers.categories import router as categories_router
@@ -29,9 +37,25 @@ logger = setup_logging()
 _sent_weekly_digest: set[tuple[int, int, int]] = set()
 
 async def db_session_middleware(handler, event, data):
-    async with SessionLocal() as session:
+    # Handlers flagged {"db": "read"} get a session from the read-only pool,
+    # everything else a write session run as one unit of work: services only
+    # flush, and the whole update commits once here (or rolls back on error).
+    # That commit comes after the handler's Telegram replies, so handlers
+    # write through write_queue instead of holding SQLite's write lock here.
+    mode = get_flag(data, "db")
+    async with session_factory(mode)() as session:
         data["db"] = session  # inject AsyncSession into handlers
-        return await handler(event, data)
+        if mode == "read":
+            return await handler(event, data)
+        session.info[UNIT_OF_WORK] = True
+        try:
+            result = await handler(event, data)
+        except Exception:
+            await session.rollback()
+            raise
+        if session.in_transaction():
+            await session.commit()
+        return result
 
 async def on_startup(bot: Bot):
     await bot.set_my_commands([
@@ -48,6 +72,7 @@ async def on_startup(bot: Bot):
         BotCommand(command="monthdetails", description="Month details by item/category"),
         BotCommand(command="yeardetails", description="Year details by item/category"),
         BotCommand(command="search", description="Search expenses"),
+        BotCommand(command="history", description="Browse your expenses, newest first"),
         BotCommand(command="receipt", description="Get receipt by expense_id"),
         BotCommand(command="export", description="Export expenses as CSV/Excel"),
         BotCommand(command="recurring", description="Recurring help"),
@@ -82,18 +107,24 @@ async def _all_user_ids(session) -> list[int]:
 async def _background_worker(bot: Bot):
     while True:
         try:
-            async with SessionLocal() as session:
-                rsvc = RecurringService(session)
-                created = await rsvc.generate_due_today()
-                for exp in created:
-                    try:
-                        await bot.send_message(
-                            exp.user_id,
-                            f"🔁 Recurring expense added: {exp.item_name} ${exp.amount_cents/100:.2f}",
-                        )
-                    except Exception:
-                        logger.exception("Failed to notify user for recurring expense")
+            await receipt_sweeper.tick()
+        except Exception:
+            logger.exception("Receipt sweep failed")
 
+        try:
+            created = await write_queue.submit(
+                lambda session: RecurringService(session).generate_due_today()
+            )
+            for exp in created:
+                try:
+                    await bot.send_message(
+                        exp.user_id,
+                        f"🔁 Recurring expense added: {exp.item_name} ${exp.amount_cents/100:.2f}",
+                    )
+                except Exception:
+                    logger.exception("Failed to notify user for recurring expense")
+
+            async with ReadSessionLocal() as session:
                 today = local_date_for_now()
                 iso = today.isocalendar()
                 if today.weekday() == 0:
@@ -135,10 +166,13 @@ async def _background_worker(bot: Bot):
 async def main():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
 
     bot = Bot(settings.TELEGRAM_BOT_TOKEN)
     dp = Dispatcher()
-    dp.update.middleware(db_session_middleware)
+    # Inner middleware so the matched handler's flags are visible.
+    dp.message.middleware(db_session_middleware)
+    dp.callback_query.middleware(db_session_middleware)
 
     dp.include_router(start_router)
     dp.include_router(expenses_router)
@@ -153,6 +187,10 @@ async def main():
 
 
     await on_startup(bot)
+    await write_queue.start()
+    await export_queue.start()
+    await chart_renderer.start()
+    await receipt_pipeline.start()
     worker_task = asyncio.create_task(_background_worker(bot))
     logger.info("🚀 Bot starting (long polling)...")
     try:
@@ -161,6 +199,10 @@ async def main():
         worker_task.cancel()
         with contextlib.suppress(asyncio.CancelledError):
             await worker_task
+        await receipt_pipeline.stop()
+        await chart_renderer.stop()
+        await export_queue.stop()
+        await write_queue.stop()
 
 if __name__ == "__main__":
     asyncio.run(main())
@@ -0,0 +1,38 @@
+import asyncio
+
+from aiogram.types import Message
+
+from app.core.config import settings
+
+
+class MediaGroupCollector:
+    """
+    Telegram delivers an album as separate updates sharing a media_group_id.
+    collect() gathers them: the first message of a group waits until no new
+    one has arrived for `window_ms` and gets the whole album (in message
+    order); every later message gets None and its handler can return.
+    """
+
+    def __init__(self, window_ms: int = 800):
+        self.window = window_ms / 1000
+        self._groups: dict[tuple[int, str], list[Message]] = {}
+
+    async def collect(self, message: Message) -> list[Message] | None:
+        key = (message.chat.id, message.media_group_id)
+        group = self._groups.get(key)
+        if group is not None:
+            group.append(message)
+            return None
+
+        group = self._groups[key] = [message]
+        try:
+            seen = 0
+            while seen != len(group):
+                seen = len(group)
+                await asyncio.sleep(self.window)
+        finally:
+            del self._groups[key]
+        return sorted(group, key=lambda m: m.message_id)
+
+
+media_groups = MediaGroupCollector(window_ms=settings.ALBUM_WINDOW_MS)
@@ -0,0 +1,131 @@
+import asyncio
+import contextlib
+import os
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+from aiogram import Bot
+from aiogram.types import Message
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core.config import settings
+from app.core.storage import save_blob
+from app.db.session import ReadSessionLocal
+from app.db.writer import GroupCommitWriter, write_queue
+from app.services.receipt_service import ReceiptService, StoredReceipt
+
+
+@dataclass
+class ReceiptJob:
+    message: Message  # the photo message; the follow-up replies to its chat
+    user_id: int
+    expense_id: str
+    expense_ref: str
+    file_id: str
+    file_unique_id: str
+
+
+class ReceiptPipeline:
+    """
+    Attaches receipt photos after the expense has already been acknowledged.
+    Each job downloads the photo into memory, decodes/resizes/encodes it in
+    a bounded thread pool (`workers`) into deduplicated storage, attaches
+    it through the writer and sends a follow-up message. Photos already
+    stored (by file_unique_id) skip the download and encode. At most `max_inflight` photos are
+    held in memory at once; further jobs wait their turn.
+
+    When the pipeline is not running (scripts, tests), submit() processes
+    the job inline.
+    """
+
+    def __init__(self, read_factory: async_sessionmaker[AsyncSession] = ReadSessionLocal,
+                 writer: GroupCommitWriter = write_queue, workers: int = 2, max_inflight: int = 8):
+        self.read_factory = read_factory
+        self.writer = writer
+        self.workers = workers
+        self.max_inflight = max_inflight
+        self._executor: ThreadPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+        self._tasks: set[asyncio.Task] = set()
+
+    @property
+    def running(self) -> bool:
+        return self._executor is not None
+
+    async def start(self):
+        if self.running:
+            return
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="receipt")
+        self._slots = asyncio.Semaphore(self.max_inflight)
+
+    async def stop(self):
+        """
+        Let queued receipts finish, then shut the pool down.
+        """
+        if not self._executor:
+            return
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        executor, self._executor = self._executor, None
+        executor.shutdown(wait=False)
+
+    async def submit(self, job: ReceiptJob):
+        if not self.running:
+            await self._process(job)
+            return
+        task = asyncio.create_task(self._process(job), name=f"receipt-{job.expense_ref}")
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _process(self, job: ReceiptJob):
+        try:
+            receipt = await self.store(job.message.bot, job.file_id, job.file_unique_id)
+
+            async def attach(session: AsyncSession):
+                return await ReceiptService(session).attach(job.expense_id, job.user_id, [receipt])
+
+            try:
+                exp = await self.writer.submit(attach)
+            except FileNotFoundError:
+                # The reused blob was swept before the attach: store the photo afresh.
+                receipt = await self.store(job.message.bot, job.file_id, job.file_unique_id, reuse=False)
+                exp = await self.writer.submit(attach)
+            if not exp:
+                raise LookupError(f"expense {job.expense_id} is gone")
+        except Exception:
+            # Anything written stays for the receipt sweeper; the blob may be shared.
+            logger.exception(f"Saving receipt for {job.expense_id} failed")
+            await job.message.answer(f"⚠️ Couldn't save the receipt for `{job.expense_ref}`.", parse_mode="Markdown")
+            return
+        await job.message.answer(f"📎 Receipt saved for `{job.expense_ref}`", parse_mode="Markdown")
+
+    async def store(self, bot: Bot, file_id: str, file_unique_id: str, reuse: bool = True) -> StoredReceipt:
+        """
+        Put one photo in receipt storage. A photo Telegram has sent before is
+        already stored: no download, no re-encode (unless `reuse` is off).
+        """
+        blob = None
+        if reuse:
+            async with self.read_factory() as db:
+                blob = await ReceiptService(db).find_by_unique_id(file_unique_id)
+        if blob:
+            try:
+                os.utime(blob.path)  # fresh again: keeps the sweeper's grace period off it
+                return StoredReceipt(blob.sha256, blob.path, blob.size_bytes, file_unique_id, file_id)
+            except FileNotFoundError:
+                pass  # swept meanwhile; store it again
+        async with self._slots or contextlib.nullcontext():
+            data = await bot.download(file_id)
+            loop = asyncio.get_running_loop()
+            sha256, path = await loop.run_in_executor(self._executor, save_blob, data.getvalue())
+        return StoredReceipt(sha256, str(path), path.stat().st_size, file_unique_id, file_id)
+
+    async def store_all(self, bot: Bot, photos: list[tuple[str, str]], reuse: bool = True) -> list[StoredReceipt]:
+        """
+        store() for several (file_id, file_unique_id) photos concurrently, in order.
+        """
+        return list(await asyncio.gather(*(self.store(bot, *photo, reuse=reuse) for photo in photos)))
+
+
+receipt_pipeline = ReceiptPipeline(workers=settings.RECEIPT_WORKERS)
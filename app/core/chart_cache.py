@@ -0,0 +1,50 @@
+import hashlib
+import json
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from app.core.config import settings
+
+
+@dataclass
+class CachedChart:
+    png: bytes
+    file_id: str | None = None  # set once Telegram has the upload
+
+
+class ChartCache:
+    """
+    Rendered charts keyed on a hash of what is drawn (chart kind, title and
+    the plotted series), so unchanged data is never rendered twice. After
+    the first upload the Telegram file_id is kept too, and repeats are sent
+    by id with no upload at all. Least recently used entries are dropped
+    past `max_entries`.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, CachedChart] = OrderedDict()
+
+    @staticmethod
+    def key(kind: str, data: dict, title: str) -> str:
+        payload = json.dumps([kind, title, sorted(data.items())], separators=(",", ":"))
+        return hashlib.sha256(payload.encode()).hexdigest()
+
+    def get(self, key: str) -> CachedChart | None:
+        entry = self._entries.get(key)
+        if entry:
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key: str, png: bytes) -> CachedChart:
+        entry = self._entries[key] = CachedChart(png)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+chart_cache = ChartCache(max_entries=settings.CHART_CACHE_SIZE)
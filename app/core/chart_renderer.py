@@ -0,0 +1,64 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from loguru import logger
+
+from app.core import charts
+from app.core.config import settings
+
+
+class ChartRenderer:
+    """
+    Renders charts in a pool of worker processes so drawing never blocks
+    the event loop and charts for different users draw on different cores.
+    Workers are spawned and warmed up (the backend imported; for matplotlib
+    also Agg selected and fonts loaded) in start(), not on the first chart.
+    `backend` is "matplotlib" or "pillow" (see app/core/charts.py).
+
+    When the pool is not running (scripts, tests), render() draws inline.
+    """
+
+    def __init__(self, workers: int = 2, backend: str = "matplotlib"):
+        if backend not in charts.BACKENDS:
+            raise ValueError(f"Unknown chart backend: {backend}")
+        self.workers = workers
+        self.backend = backend
+        self._pool: ProcessPoolExecutor | None = None
+
+    @property
+    def running(self) -> bool:
+        return self._pool is not None
+
+    async def start(self):
+        if self.running:
+            return
+        self._pool = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=charts.warm_up,
+            initargs=(self.backend,),
+        )
+        loop = asyncio.get_running_loop()
+        # The executor only spawns processes as jobs arrive; one no-op per worker brings them all up.
+        await asyncio.gather(*(loop.run_in_executor(self._pool, int) for _ in range(self.workers)))
+        logger.info(f"Chart renderer ready ({self.workers} {self.backend} workers)")
+
+    async def stop(self):
+        if not self._pool:
+            return
+        pool, self._pool = self._pool, None
+        await asyncio.to_thread(pool.shutdown, cancel_futures=True)
+
+    async def render(self, kind: str, data: dict, title: str) -> bytes:
+        """
+        PNG bytes for a "pie" (category breakdown) or "bar" (per-month) chart.
+        """
+        if not self.running:
+            return charts.render_png(kind, data, title, self.backend)
+        return await asyncio.get_running_loop().run_in_executor(
+            self._pool, charts.render_png, kind, data, title, self.backend
+        )
+
+
+chart_renderer = ChartRenderer(workers=settings.CHART_WORKERS, backend=settings.CHART_BACKEND)
@@ -1,6 +1,16 @@
-import matplotlib.pyplot as plt
 from io import BytesIO
 
+
+def _pyplot():
+    """
+    matplotlib is imported on the first chart, not at bot startup.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    return plt
+
+
 def pie_chart_by_category(breakdown: dict, title: str) -> BytesIO:
     labels = list(breakdown.keys())
     values = [v/100 for v in breakdown.values()]  # convert cents → dollars
@@ -8,6 +18,8 @@ def pie_chart_by_category(breakdown: dict, title: str) -> BytesIO:
         values = [0]
         labels = ["No Data"]
 
+    plt = _pyplot()
+
     fig, ax = plt.subplots(figsize=(6,6))
     ax.pie(values, labels=labels, autopct="%1.1f%%", startangle=90)
     ax.set_title(title)
@@ -22,6 +34,8 @@ def bar_chart_by_month(month_totals: dict, title: str) -> BytesIO:
     months = [f"{m:02d}" for m in sorted(month_totals.keys())]
     values = [month_totals[m]/100 for m in sorted(month_totals.keys())]
 
+    plt = _pyplot()
+
     fig, ax = plt.subplots(figsize=(8,5))
     ax.bar(months, values, color="skyblue")
     ax.set_title(title)
@@ -33,3 +47,29 @@ def bar_chart_by_month(month_totals: dict, title: str) -> BytesIO:
     buf.seek(0)
     plt.close(fig)
     return buf
+
+
+CHARTS = {"pie": pie_chart_by_category, "bar": bar_chart_by_month}
+BACKENDS = ("matplotlib", "pillow")
+
+
+def _charts(backend: str) -> dict:
+    if backend == "pillow":
+        from app.core import charts_pillow
+        return charts_pillow.CHARTS
+    return CHARTS
+
+
+def render_png(kind: str, data: dict, title: str, backend: str = "matplotlib") -> bytes:
+    """
+    Picklable entry point for the chart worker processes.
+    """
+    return _charts(backend)[kind](data, title).getvalue()
+
+
+def warm_up(backend: str = "matplotlib"):
+    """
+    Pay for the backend's imports (and matplotlib's font cache) once per
+    worker process, before the first real chart.
+    """
+    render_png("bar", {1: 100}, "", backend)
@@ -0,0 +1,97 @@
+"""
+Pillow-drawn versions of the report charts (CHART_BACKEND=pillow): the same
+pie-by-category and bar-by-month layouts as app/core/charts.py, drawn
+directly with ImageDraw. No figure or layout engine to set up, and the
+flat colours let the PNG be stored as a small palette image.
+"""
+from functools import lru_cache
+from io import BytesIO
+
+# matplotlib's default colour cycle, so both backends look alike.
+COLORS = [
+    (31, 119, 180), (255, 127, 14), (44, 160, 44), (214, 39, 40), (148, 103, 189),
+    (140, 86, 75), (227, 119, 194), (127, 127, 127), (188, 189, 34), (23, 190, 207),
+]
+BAR_COLOR = (135, 206, 235)  # skyblue
+TEXT = (0, 0, 0)
+GRID = (220, 220, 220)
+BACKGROUND = (255, 255, 255)
+
+
+@lru_cache(maxsize=None)
+def _font(size: int):
+    from PIL import ImageFont
+    return ImageFont.load_default(size=size)
+
+
+def _canvas(width: int, height: int, title: str):
+    from PIL import Image, ImageDraw
+
+    img = Image.new("RGB", (width, height), BACKGROUND)
+    draw = ImageDraw.Draw(img)
+    draw.text((width / 2, 24), title, fill=TEXT, font=_font(18), anchor="mt")
+    return img, draw
+
+
+def _png(img) -> BytesIO:
+    from PIL import Image
+
+    buf = BytesIO()
+    img.quantize(colors=64, method=Image.Quantize.FASTOCTREE).save(buf, format="PNG")
+    buf.seek(0)
+    return buf
+
+
+def pie_chart_by_category(breakdown: dict, title: str) -> BytesIO:
+    img, draw = _canvas(600, 600, title)
+    font = _font(13)
+    total = sum(breakdown.values())
+    if not total:
+        draw.text((300, 300), "No Data", fill=TEXT, font=font, anchor="mm")
+        return _png(img)
+
+    box = (110, 90, 490, 470)
+    legend_y = 490
+    start = -90.0  # first slice from 12 o'clock, like startangle=90
+    for i, (label, cents) in enumerate(breakdown.items()):
+        sweep = 360 * cents / total
+        color = COLORS[i % len(COLORS)]
+        draw.pieslice(box, start, start + sweep, fill=color, outline=BACKGROUND)
+        start += sweep
+
+        # Two legend columns under the pie.
+        x = 40 + (i % 2) * 280
+        y = legend_y + (i // 2) * 20
+        draw.rectangle((x, y + 2, x + 12, y + 14), fill=color)
+        draw.text((x + 20, y), f"{label or 'Uncategorized'}  {100 * cents / total:.1f}%", fill=TEXT, font=font)
+    return _png(img)
+
+
+def bar_chart_by_month(month_totals: dict, title: str) -> BytesIO:
+    img, draw = _canvas(800, 500, title)
+    font = _font(12)
+    months = sorted(month_totals)
+    values = [month_totals[m] / 100 for m in months]
+    left, top, right, bottom = 80, 60, 770, 440
+    peak = max(values, default=0) or 1
+
+    for step in range(5):
+        y = bottom - (bottom - top) * step / 4
+        draw.line((left, y, right, y), fill=GRID)
+        draw.text((left - 8, y), f"{peak * step / 4:,.0f}", fill=TEXT, font=font, anchor="rm")
+    draw.line((left, top, left, bottom), fill=TEXT)
+    draw.line((left, bottom, right, bottom), fill=TEXT)
+
+    slot = (right - left) / max(len(months), 1)
+    for i, (month, value) in enumerate(zip(months, values)):
+        x0 = left + i * slot + slot * 0.1
+        x1 = left + (i + 1) * slot - slot * 0.1
+        draw.rectangle((x0, bottom - (bottom - top) * value / peak, x1, bottom), fill=BAR_COLOR)
+        draw.text(((x0 + x1) / 2, bottom + 6), f"{month:02d}", fill=TEXT, font=font, anchor="mt")
+
+    draw.text(((left + right) / 2, bottom + 28), "Month", fill=TEXT, font=font, anchor="mt")
+    draw.text((left, top - 8), "Amount ($)", fill=TEXT, font=font, anchor="lb")
+    return _png(img)
+
+
+CHARTS = {"pie": pie_chart_by_category, "bar": bar_chart_by_month}
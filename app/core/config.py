@@ -7,6 +7,44 @@ class Settings(BaseSettings):
     DEFAULT_CURRENCY: str = "CAD"
     LOCAL_TIMEZONE: str = "America/Edmonton"
 
+    # SQLite connection profile: "production" applies the pragmas below on
+    # every new connection, "default" leaves SQLite's stock settings alone.
+    SQLITE_PROFILE: str = "production"
+    SQLITE_JOURNAL_MODE: str = "WAL"
+    SQLITE_SYNCHRONOUS: str = "NORMAL"
+    SQLITE_BUSY_TIMEOUT_MS: int = 5000
+    SQLITE_CACHE_SIZE_KB: int = 32768
+    SQLITE_MMAP_SIZE_MB: int = 256
+    SQLITE_TEMP_STORE: str = "MEMORY"
+
+    # Group-commit writer: how long to gather queued writes, and the batch cap.
+    WRITER_WINDOW_MS: int = 5
+    WRITER_MAX_BATCH: int = 64
+
+    # Read-only connections for reports/exports, kept apart from the writer.
+    DB_READ_POOL_SIZE: int = 4
+
+    # Background /export builds: worker tasks, and how many finished files to remember.
+    EXPORT_WORKERS: int = 2
+    EXPORT_CACHE_SIZE: int = 128
+
+    # Chart rendering: "matplotlib" or "pillow" (faster, smaller PNGs, plainer
+    # look), worker processes, and how many rendered charts to keep.
+    CHART_BACKEND: str = "matplotlib"
+    CHART_WORKERS: int = 2
+    CHART_CACHE_SIZE: int = 256
+
+    # Threads for receipt image resizing/encoding, and how long to wait for
+    # the rest of a photo album after its last photo arrived.
+    RECEIPT_WORKERS: int = 2
+    ALBUM_WINDOW_MS: int = 800
+
+    # Receipt sweeper: files checked per background tick, minimum age before a
+    # file can be reclaimed, and how long orphans sit in quarantine (0 deletes).
+    RECEIPT_SWEEP_BATCH: int = 500
+    RECEIPT_SWEEP_GRACE_MINUTES: int = 60
+    RECEIPT_QUARANTINE_DAYS: int = 7
+
     model_config = SettingsConfigDict(env_file=".env", env_file_encoding="utf-8")
 
 settings = Settings()
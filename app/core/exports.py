@@ -0,0 +1,215 @@
+import asyncio
+import csv
+import io
+from tempfile import SpooledTemporaryFile
+from typing import AsyncIterator, Awaitable, Callable
+
+from aiogram.types.input_file import DEFAULT_CHUNK_SIZE, InputFile
+
+# Spill exports to disk past this size; smaller ones never touch the filesystem.
+SPOOL_MAX_BYTES = 1024 * 1024
+
+CSV_HEADER = ["ID", "Date", "Item", "Amount", "Category", "Tags", "Notes", "Receipt"]
+
+
+def csv_row(row) -> list[str]:
+    """
+    One ExpenseService.iter_export_rows() row in the CSV layout.
+    """
+    return [
+        row.id,
+        row.local_date.isoformat(),
+        row.item_name,
+        f"{row.amount_cents/100:.2f} {row.currency}",
+        row.category or "",
+        row.tags or "",
+        row.notes or "",
+        row.receipt_path or "",
+    ]
+
+
+class CsvSink:
+    """
+    UTF-8 CSV into the binary file `out`, one chunk of rows at a time.
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.buf = io.StringIO()
+        self.writer = csv.writer(self.buf, lineterminator="\n")
+        self.writer.writerow(CSV_HEADER)
+
+    def write(self, rows: list):
+        self.writer.writerows(csv_row(r) for r in rows)
+        self.out.write(self.buf.getvalue().encode("utf-8"))
+        self.buf.seek(0)
+        self.buf.truncate()
+
+    def close(self):
+        self.out.write(self.buf.getvalue().encode("utf-8"))
+
+
+XLSX_HEADER = ["ID", "Date", "Item", "Amount", "Currency", "Category", "Tags", "Notes", "Receipt"]
+XLSX_WIDTHS = {"A": 38, "B": 12, "C": 30, "D": 12, "E": 9, "F": 16, "G": 20, "H": 40, "I": 30}
+
+
+class XlsxSink:
+    """
+    XLSX via openpyxl's write-only mode, so rows are streamed to the sheet
+    instead of held as a cell grid. Date is a real date cell and Amount a
+    number, with the currency in its own column.
+    """
+
+    def __init__(self, out):
+        from openpyxl import Workbook
+        from openpyxl.cell import WriteOnlyCell
+
+        self.cell_type = WriteOnlyCell
+        self.out = out
+        self.wb = Workbook(write_only=True)
+        self.ws = self.wb.create_sheet("Expenses")
+        for col, width in XLSX_WIDTHS.items():
+            self.ws.column_dimensions[col].width = width
+        self.ws.append(XLSX_HEADER)
+
+    def _cell(self, value, number_format: str):
+        c = self.cell_type(self.ws, value=value)
+        c.number_format = number_format
+        return c
+
+    def write(self, rows: list):
+        for r in rows:
+            self.ws.append([
+                r.id,
+                self._cell(r.local_date, "yyyy-mm-dd"),
+                r.item_name,
+                self._cell(r.amount_cents / 100, "#,##0.00"),
+                r.currency,
+                r.category or "",
+                r.tags or "",
+                r.notes or "",
+                r.receipt_path or "",
+            ])
+
+    def close(self):
+        self.wb.save(self.out)
+
+
+PARQUET_ROW_GROUP_ROWS = 50_000
+
+
+def parquet_schema():
+    import pyarrow as pa
+
+    text = pa.string()
+    short_text = pa.dictionary(pa.int32(), pa.string())  # few distinct values
+    return pa.schema([
+        ("id", text),
+        ("date", pa.date32()),
+        ("item", text),
+        ("amount_cents", pa.int64()),
+        ("currency", short_text),
+        ("category", short_text),
+        ("tags", text),
+        ("notes", text),
+        ("receipt", text),
+    ])
+
+
+class ParquetSink:
+    """
+    Parquet with typed columns: a real date, integer cents, dictionary-encoded
+    currency and category, and nulls kept as nulls. Rows are buffered into
+    row groups of PARQUET_ROW_GROUP_ROWS, so memory is bounded by one row group.
+    """
+
+    def __init__(self, out):
+        import pyarrow.parquet as pq
+
+        self.schema = parquet_schema()
+        self.columns: list[list] = [[] for _ in self.schema.names]
+        self.writer = pq.ParquetWriter(out, self.schema, compression="zstd")
+        self.rows = 0
+
+    def _flush(self):
+        import pyarrow as pa
+
+        self.writer.write_table(pa.Table.from_arrays(
+            [pa.array(values, type=field.type) for values, field in zip(self.columns, self.schema)],
+            schema=self.schema,
+        ))
+        for values in self.columns:
+            values.clear()
+
+    def write(self, rows: list):
+        for r in rows:
+            for values, value in zip(self.columns, r):
+                values.append(value)
+        self.rows += len(rows)
+        if len(self.columns[0]) >= PARQUET_ROW_GROUP_ROWS:
+            self._flush()
+
+    def close(self):
+        if self.columns[0] or not self.rows:
+            self._flush()
+        self.writer.close()
+
+
+SINKS = {"csv": CsvSink, "xlsx": XlsxSink, "parquet": ParquetSink}
+
+
+async def write_export(file_format: str, chunks: AsyncIterator[list], out, offload: bool = False,
+                       progress: Callable[[int], Awaitable[None]] | None = None) -> int:
+    """
+    Stream chunks of export rows into `out` in `file_format` and return the
+    number of rows written. With `offload`, each chunk is formatted and
+    written in a worker thread, so the event loop only waits on DB reads.
+    `progress` is awaited with the running row count after every chunk.
+    """
+    async def call(fn, *args):
+        return await asyncio.to_thread(fn, *args) if offload else fn(*args)
+
+    sink = await call(SINKS[file_format], out)
+    count = 0
+    async for chunk in chunks:
+        await call(sink.write, chunk)
+        count += len(chunk)
+        if progress:
+            await progress(count)
+    await call(sink.close)
+    return count
+
+
+async def write_csv(chunks: AsyncIterator[list], out) -> int:
+    return await write_export("csv", chunks, out)
+
+
+async def write_xlsx(chunks: AsyncIterator[list], out) -> int:
+    return await write_export("xlsx", chunks, out)
+
+
+async def write_parquet(chunks: AsyncIterator[list], out) -> int:
+    return await write_export("parquet", chunks, out)
+
+
+WRITERS = {"csv": write_csv, "xlsx": write_xlsx, "parquet": write_parquet}
+
+
+def spooled_file() -> SpooledTemporaryFile:
+    return SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES, mode="w+b")
+
+
+class SpooledInputFile(InputFile):
+    """
+    Upload an export straight from its (possibly on-disk) temp file, in
+    chunks, instead of copying it into one bytes object first.
+    """
+
+    def __init__(self, file, filename: str, chunk_size: int = DEFAULT_CHUNK_SIZE):
+        super().__init__(filename=filename, chunk_size=chunk_size)
+        self.file = file
+
+    async def read(self, bot) -> AsyncIterator[bytes]:
+        self.file.seek(0)
+        while chunk := self.file.read(self.chunk_size):
+            yield chunk
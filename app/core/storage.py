@@ -1,7 +1,10 @@
+import hashlib
 import os
+import uuid
 from pathlib import Path
 from datetime import datetime
-from PIL import Image
+from io import BytesIO
+from typing import BinaryIO
 
 BASE_DIR = Path("data/receipts")
 
@@ -16,16 +19,57 @@ def generate_receipt_path(user_id: int, expense_id: str, file_ext: str = ".jpg")
     filename = f"{user_id}_{expense_id}{file_ext}"
     return folder / filename
 
-def optimize_and_save(image_path: Path, output_path: Path, max_width: int = 1280, quality: int = 80):
+def blob_path(sha256: str, file_ext: str = ".jpg") -> Path:
     """
-    Resize/compress image while keeping good readability.
+    Content-addressed location for a deduplicated receipt:
+    data/receipts/blobs/ab/abcdef....jpg
     """
-    img = Image.open(image_path)
+    return BASE_DIR / "blobs" / sha256[:2] / f"{sha256}{file_ext}"
+
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+def optimize_and_save(image: Path | BinaryIO, output_path: Path, max_width: int = 1280, quality: int = 80):
+    """
+    Resize/compress image while keeping good readability. `image` is a path
+    or an open file (e.g. a BytesIO straight from the download). Written to
+    a uniquely named .tmp sibling first and renamed, so a crash never leaves
+    a half-written receipt under its real name and concurrent saves of the
+    same blob don't collide.
+    """
+    from PIL import Image
+
+    img = Image.open(image)
     # Resize if wider than max_width (keep aspect ratio)
     if img.width > max_width:
         ratio = max_width / float(img.width)
         new_height = int(float(img.height) * ratio)
         img = img.resize((max_width, new_height), Image.LANCZOS)
+    if img.mode not in ("RGB", "L"):
+        img = img.convert("RGB")
     # Save optimized JPEG
-    img.save(output_path, "JPEG", optimize=True, quality=quality)
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_name(f"{output_path.name}.{uuid.uuid4().hex[:8]}.tmp")
+    try:
+        img.save(tmp_path, "JPEG", optimize=True, quality=quality)
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
     return output_path
+
+
+def save_blob(data: bytes) -> tuple[str, Path]:
+    """
+    Store a downloaded photo under its content hash, optimizing it only if
+    that blob isn't on disk yet. Returns (sha256, path).
+    """
+    sha256 = content_hash(data)
+    path = blob_path(sha256)
+    try:
+        os.utime(path)  # reused: fresh again, so the receipt sweeper's grace period covers it
+    except FileNotFoundError:
+        optimize_and_save(BytesIO(data), path)
+    return sha256, path
@@ -0,0 +1,137 @@
+from sqlalchemy import exists, inspect, select, update
+from sqlalchemy.engine import Connection
+
+from app.db.base import Base
+from app.db.models import Budget, Category, CategoryRule, Expense, ExpenseRollup, RecurringExpense
+from app.db.refs import REF_MODELS, REF_SIZE
+from app.db import search
+from app.db.rollups import rebuild_statements
+from app.utils.ids import id_for_timestamp, is_time_ordered
+
+
+def _add_missing_columns(conn: Connection):
+    """
+    Add nullable columns introduced after a table was first created.
+    """
+    insp = inspect(conn)
+    existing_tables = set(insp.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {c["name"] for c in insp.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in present:
+                continue
+            col_type = column.type.compile(dialect=conn.dialect)
+            conn.exec_driver_sql(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {col_type}")
+
+
+def _backfill_refs(conn: Connection):
+    """
+    Older rows were addressed by id prefix. Persist that prefix as their ref so
+    refs users already know keep working, lengthening it where two rows of the
+    same user share a prefix.
+    """
+    for model in REF_MODELS:
+        taken: dict[int, set[str]] = {}
+        for user_id, ref in conn.execute(select(model.user_id, model.ref).where(model.ref.is_not(None))):
+            taken.setdefault(user_id, set()).add(ref)
+
+        rows = conn.execute(
+            select(model.id, model.user_id).where(model.ref.is_(None)).order_by(model.created_at_utc)
+        ).all()
+        for row_id, user_id in rows:
+            used = taken.setdefault(user_id, set())
+            compact = row_id.replace("-", "").lower()
+            size = REF_SIZE
+            ref = compact[:size]
+            while ref in used and size < len(compact):
+                size += 2
+                ref = compact[:size]
+            used.add(ref)
+            conn.execute(update(model).where(model.id == row_id).values(ref=ref))
+
+
+def _create_missing_indexes(conn: Connection):
+    """
+    create_all() skips tables that already exist, so indexes added to a model
+    later never reach older databases. Create any that are missing.
+    """
+    insp = inspect(conn)
+    existing_tables = set(insp.get_table_names())
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        present = {ix["name"] for ix in insp.get_indexes(table.name)}
+        for index in table.indexes:
+            if index.name not in present:
+                index.create(conn)
+
+
+def _backfill_rollups(conn: Connection):
+    """
+    expense_rollups is new in databases that already hold expenses; seed it once.
+    """
+    has_rollups = conn.execute(select(exists().select_from(ExpenseRollup))).scalar()
+    has_expenses = conn.execute(select(exists().select_from(Expense))).scalar()
+    if has_expenses and not has_rollups:
+        for stmt in rebuild_statements():
+            conn.execute(stmt)
+
+
+def _create_search_index(conn: Connection):
+    """
+    Add the FTS5 search index to SQLite databases created before it existed,
+    or replace one keyed on the implicit rowid, and index the rows already
+    there.
+    """
+    if conn.dialect.name != "sqlite" or search.has_index(conn):
+        return
+    search.uninstall(conn)
+    search.assign_keys(conn)
+    search.install(conn)
+    search.rebuild_index(conn)
+
+
+MIGRATIONS = [
+    _add_missing_columns,
+    _backfill_refs,
+    _create_missing_indexes,
+    _backfill_rollups,
+    _create_search_index,
+]
+
+
+def run_migrations(conn: Connection):
+    """
+    Idempotent schema upgrades for databases created by older versions.
+    Run after Base.metadata.create_all via conn.run_sync(run_migrations).
+    """
+    for step in MIGRATIONS:
+        step(conn)
+
+
+def rekey_time_ordered_ids(conn: Connection) -> dict[str, int]:
+    """
+    Opt-in: replace random uuid4 primary keys with UUIDv7 ids derived from each
+    row's created_at_utc, so id order matches creation order for old rows too.
+    Expense.recurring_id follows its recurring template. Short refs are not
+    touched, but full ids shown earlier (e.g. on receipts) stop resolving.
+    Run via scripts/migrate_ids.py inside one transaction.
+    """
+    counts: dict[str, int] = {}
+    for model in (RecurringExpense, Expense, Budget, CategoryRule, Category):
+        rows = conn.execute(select(model.id, model.created_at_utc)).all()
+        mapping = {
+            old_id: id_for_timestamp(created)
+            for old_id, created in rows
+            if not is_time_ordered(old_id) and created is not None
+        }
+        for old_id, new_id in mapping.items():
+            conn.execute(update(model).where(model.id == old_id).values(id=new_id))
+            if model is RecurringExpense:
+                conn.execute(
+                    update(Expense).where(Expense.recurring_id == old_id).values(recurring_id=new_id)
+                )
+        counts[model.__tablename__] = len(mapping)
+    return counts
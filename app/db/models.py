@@ -1,16 +1,27 @@
-from sqlalchemy import String, Integer, DateTime, Date, BigInteger, Text, UniqueConstraint
+from sqlalchemy import String, Integer, DateTime, Date, BigInteger, Text, UniqueConstraint, Index
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime, timezone, date
-import uuid
 from app.db.base import Base
+from app.utils.ids import new_id
 
 class Expense(Base):
     __tablename__ = "expenses"
+    __table_args__ = (
+        Index("ix_expenses_user_local_date", "user_id", "local_date"),
+        Index("ix_expenses_user_created_id", "user_id", "created_at_utc", "id"),
+        Index("uq_expenses_user_ref", "user_id", "ref", unique=True),
+        Index("uq_expenses_search_key", "search_key", unique=True),
+    )
 
     id: Mapped[str] = mapped_column(
-        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+        String(36), primary_key=True, default=new_id
     )
+    # Stable integer key of the row in the search index, assigned in insertion
+    # order by a trigger (see app/db/search.py). Unlike the implicit rowid of
+    # a table with a string primary key, VACUUM never renumbers it.
+    search_key: Mapped[int | None] = mapped_column(Integer, nullable=True)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    ref: Mapped[str | None] = mapped_column(String(12), nullable=True)  # short ref, see app/db/refs.py
     item_name: Mapped[str] = mapped_column(String(200))
     amount_cents: Mapped[int] = mapped_column(Integer)
     currency: Mapped[str] = mapped_column(String(10), default="CAD")
@@ -18,6 +29,8 @@ class Expense(Base):
     tags: Mapped[str | None] = mapped_column(String(200), nullable=True)
     notes: Mapped[str | None] = mapped_column(Text, nullable=True)
     receipt_path: Mapped[str | None] = mapped_column(String(300), nullable=True)
+    # Telegram file_id of the receipt photo, so /receipt can resend without an upload.
+    receipt_file_id: Mapped[str | None] = mapped_column(String(200), nullable=True)
     created_at_utc: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
     )
@@ -25,13 +38,71 @@ class Expense(Base):
     recurring_id: Mapped[str | None] = mapped_column(String(36), nullable=True, index=True)
 
 
+class ExpenseRollup(Base):
+    """
+    Per-user daily totals by category, maintained on every Expense flush
+    (see app/db/rollups.py). Uncategorized spend is stored under "".
+    """
+    __tablename__ = "expense_rollups"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    local_date: Mapped[date] = mapped_column(Date, primary_key=True)
+    category: Mapped[str] = mapped_column(String(50), primary_key=True, default="")
+    total_cents: Mapped[int] = mapped_column(Integer, default=0)
+    expense_count: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class DataVersion(Base):
+    """
+    Per-user counter bumped whenever one of the user's expenses changes
+    (see app/db/versions.py). Keys caches of derived files such as exports.
+    """
+    __tablename__ = "data_versions"
+
+    user_id: Mapped[int] = mapped_column(BigInteger, primary_key=True)
+    version: Mapped[int] = mapped_column(Integer, default=0)
+
+
+class ReceiptBlob(Base):
+    """
+    One stored receipt image, shared by every expense whose receipt_path
+    points at it. Keyed by the SHA-256 of the downloaded photo; ref_count
+    is the number of expenses using it (see app/services/receipt_service.py).
+    """
+    __tablename__ = "receipt_blobs"
+
+    sha256: Mapped[str] = mapped_column(String(64), primary_key=True)
+    file_unique_id: Mapped[str | None] = mapped_column(String(64), index=True, nullable=True)
+    path: Mapped[str] = mapped_column(String(300), unique=True)
+    size_bytes: Mapped[int] = mapped_column(Integer)
+    ref_count: Mapped[int] = mapped_column(Integer, default=0)
+    created_at_utc: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
+    )
+
+
+class ExpenseReceipt(Base):
+    """
+    Receipts after the first for expenses created from a photo album; the
+    first one stays in Expense.receipt_path / receipt_file_id.
+    """
+    __tablename__ = "expense_receipts"
+
+    expense_id: Mapped[str] = mapped_column(String(36), primary_key=True)
+    position: Mapped[int] = mapped_column(Integer, primary_key=True)
+    path: Mapped[str] = mapped_column(String(300))
+    file_id: Mapped[str | None] = mapped_column(String(200), nullable=True)
+
+
 class RecurringExpense(Base):
     __tablename__ = "recurring_expenses"
+    __table_args__ = (Index("uq_recurring_expenses_user_ref", "user_id", "ref", unique=True),)
 
     id: Mapped[str] = mapped_column(
-        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+        String(36), primary_key=True, default=new_id
     )
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    ref: Mapped[str | None] = mapped_column(String(12), nullable=True)
 
     # template
     item_name: Mapped[str] = mapped_column(String(200))
@@ -59,7 +130,7 @@ class Category(Base):
     __tablename__ = "categories"
     __table_args__ = (UniqueConstraint("slug", name="uq_categories_slug"),)
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=new_id)
     # Optional: per-user categories in future; keep column now (nullable) for flexibility
     user_id: Mapped[int | None] = mapped_column(BigInteger, index=True, nullable=True)
 
@@ -72,9 +143,11 @@ class Category(Base):
 
 class Budget(Base):
     __tablename__ = "budgets"
+    __table_args__ = (Index("uq_budgets_user_ref", "user_id", "ref", unique=True),)
 
-    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id: Mapped[str] = mapped_column(String(36), primary_key=True, default=new_id)
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    ref: Mapped[str | None] = mapped_column(String(12), nullable=True)
 
     scope_type: Mapped[str] = mapped_column(String(20))  # "overall" | "category"
     scope_value: Mapped[str | None] = mapped_column(String(50))  # e.g. "Food" if scope_type=category
@@ -88,13 +161,18 @@ class Budget(Base):
 
 class CategoryRule(Base):
     __tablename__ = "category_rules"
+    __table_args__ = (Index("uq_category_rules_user_ref", "user_id", "ref", unique=True),)
 
     id: Mapped[str] = mapped_column(
-        String(36), primary_key=True, default=lambda: str(uuid.uuid4())
+        String(36), primary_key=True, default=new_id
     )
     user_id: Mapped[int] = mapped_column(BigInteger, index=True)
+    ref: Mapped[str | None] = mapped_column(String(12), nullable=True)
     keyword: Mapped[str] = mapped_column(String(50), index=True)
     category: Mapped[str] = mapped_column(String(50))
     created_at_utc: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), default=lambda: datetime.now(timezone.utc)
-    )
\ No newline at end of file
+    )
+
+
+from app.db import receipt_blobs, refs, rollups, search, versions  # noqa: E402,F401  (register flush hooks and search DDL)
@@ -0,0 +1,30 @@
+from sqlalchemy import delete, event, select, update
+from sqlalchemy.orm import Session
+
+from app.db.models import Expense, ExpenseReceipt, ReceiptBlob
+
+
+def release_statement(path: str):
+    """
+    One reference less on the blob stored at `path`. Blobs that reach zero
+    keep their row and file until the receipt sweeper reclaims them.
+    """
+    return (
+        update(ReceiptBlob)
+        .where(ReceiptBlob.path == path, ReceiptBlob.ref_count > 0)
+        .values(ref_count=ReceiptBlob.ref_count - 1)
+    )
+
+
+@event.listens_for(Session, "before_flush")
+def _release_deleted_receipts(session: Session, flush_context, instances):
+    deleted = [obj for obj in session.deleted if isinstance(obj, Expense) and obj.receipt_path]
+    if not deleted:
+        return
+    conn = session.connection()
+    ids = [exp.id for exp in deleted]
+    paths = [exp.receipt_path for exp in deleted]
+    paths += conn.execute(select(ExpenseReceipt.path).where(ExpenseReceipt.expense_id.in_(ids))).scalars().all()
+    conn.execute(delete(ExpenseReceipt).where(ExpenseReceipt.expense_id.in_(ids)))
+    for path in paths:
+        conn.execute(release_statement(path))
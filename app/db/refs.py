@@ -0,0 +1,59 @@
+import secrets
+
+from sqlalchemy import event, select
+from sqlalchemy.orm import Session
+
+from app.db.models import Budget, CategoryRule, Expense, RecurringExpense
+
+REF_MODELS = (Expense, RecurringExpense, Budget, CategoryRule)
+REF_SIZE = 8
+
+
+def new_ref() -> str:
+    return secrets.token_hex(REF_SIZE // 2)
+
+
+def normalize_ref(value: str | None) -> str:
+    return (value or "").strip().lower()
+
+
+def owned_by_ref(model, user_id: int, value: str | None) -> tuple | None:
+    """
+    WHERE clauses matching one of the user's rows by short ref (or full id),
+    so ownership check and lookup fold into the statement itself.
+    """
+    ref = normalize_ref(value)
+    if not ref:
+        return None
+    key = model.id if len(ref) >= 36 else model.ref
+    return (model.user_id == user_id, key == ref)
+
+
+@event.listens_for(Session, "before_flush")
+def _assign_refs(session: Session, flush_context, instances):
+    """
+    Give every new row a short ref that is unique for its user, so lookups
+    can be a single equality match on the (user_id, ref) unique index.
+    Collisions are re-rolled here rather than discovered at lookup time.
+    """
+    pending: dict[tuple[type, int], list] = {}
+    for obj in session.new:
+        if isinstance(obj, REF_MODELS) and not obj.ref:
+            pending.setdefault((type(obj), obj.user_id), []).append(obj)
+    if not pending:
+        return
+
+    conn = session.connection()
+    for (model, user_id), objs in pending.items():
+        taken = {o.ref for o in session.new if isinstance(o, model) and o.user_id == user_id and o.ref}
+        while objs:
+            candidates = {new_ref() for _ in objs} - taken
+            res = conn.execute(
+                select(model.ref).where(model.user_id == user_id, model.ref.in_(candidates))
+            )
+            candidates -= set(res.scalars().all())
+            for ref in candidates:
+                if not objs:
+                    break
+                objs.pop().ref = ref
+                taken.add(ref)
@@ -0,0 +1,125 @@
+from collections import defaultdict
+from datetime import date
+
+from sqlalchemy import delete, event, func, inspect, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import Expense, ExpenseRollup
+
+RollupKey = tuple[int, date, str]
+
+
+def rollup_category(category: str | None) -> str:
+    return category or ""
+
+
+def _committed(exp: Expense, attr: str):
+    hist = inspect(exp).attrs[attr].history
+    if hist.deleted:
+        return hist.deleted[0]
+    return getattr(exp, attr)
+
+
+def _key(exp: Expense, committed: bool = False) -> RollupKey:
+    get = _committed if committed else (lambda e, a: getattr(e, a))
+    return get(exp, "user_id"), get(exp, "local_date"), rollup_category(get(exp, "category"))
+
+
+def collect_deltas(session: Session) -> dict[RollupKey, list[int]]:
+    """
+    Net (cents, count) change per rollup key implied by pending Expense writes.
+    """
+    deltas: dict[RollupKey, list[int]] = defaultdict(lambda: [0, 0])
+
+    def add(key: RollupKey, cents: int, count: int):
+        deltas[key][0] += cents or 0
+        deltas[key][1] += count
+
+    for obj in session.new:
+        if isinstance(obj, Expense):
+            add(_key(obj), obj.amount_cents, 1)
+    for obj in session.deleted:
+        if isinstance(obj, Expense):
+            add(_key(obj, committed=True), -_committed(obj, "amount_cents"), -1)
+    for obj in session.dirty:
+        if not isinstance(obj, Expense) or not session.is_modified(obj):
+            continue
+        old_key, new_key = _key(obj, committed=True), _key(obj)
+        old_cents, new_cents = _committed(obj, "amount_cents"), obj.amount_cents
+        if old_key == new_key and old_cents == new_cents:
+            continue
+        add(old_key, -old_cents, -1)
+        add(new_key, new_cents, 1)
+
+    return {k: v for k, v in deltas.items() if v != [0, 0]}
+
+
+def upsert_statements(dialect_name: str, deltas: dict[RollupKey, list[int]]):
+    """
+    INSERT ... ON CONFLICT DO UPDATE per key, then drop rows that reached zero.
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmts = []
+    emptied: list[RollupKey] = []
+    for (user_id, local_date, category), (cents, count) in deltas.items():
+        stmt = dialect_insert(ExpenseRollup).values(
+            user_id=user_id,
+            local_date=local_date,
+            category=category,
+            total_cents=cents,
+            expense_count=count,
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["user_id", "local_date", "category"],
+            set_={
+                "total_cents": ExpenseRollup.total_cents + stmt.excluded.total_cents,
+                "expense_count": ExpenseRollup.expense_count + stmt.excluded.expense_count,
+            },
+        )
+        stmts.append(stmt)
+        if count < 0:
+            emptied.append((user_id, local_date, category))
+
+    for user_id, local_date, category in emptied:
+        stmts.append(
+            delete(ExpenseRollup).where(
+                ExpenseRollup.user_id == user_id,
+                ExpenseRollup.local_date == local_date,
+                ExpenseRollup.category == category,
+                ExpenseRollup.expense_count <= 0,
+            )
+        )
+    return stmts
+
+
+def rebuild_statements(user_id: int | None = None):
+    """
+    Replace rollups (all users, or one) with fresh aggregates over expenses.
+    """
+    wipe = delete(ExpenseRollup)
+    source = select(
+        Expense.user_id,
+        Expense.local_date,
+        func.coalesce(Expense.category, ""),
+        func.sum(Expense.amount_cents),
+        func.count(Expense.id),
+    )
+    if user_id is not None:
+        wipe = wipe.where(ExpenseRollup.user_id == user_id)
+        source = source.where(Expense.user_id == user_id)
+    source = source.group_by(Expense.user_id, Expense.local_date, func.coalesce(Expense.category, ""))
+    fill = insert(ExpenseRollup).from_select(
+        ["user_id", "local_date", "category", "total_cents", "expense_count"], source
+    )
+    return [wipe, fill]
+
+
+@event.listens_for(Session, "before_flush")
+def _apply_rollup_deltas(session: Session, flush_context, instances):
+    deltas = collect_deltas(session)
+    if not deltas:
+        return
+    conn = session.connection()
+    for stmt in upsert_statements(conn.dialect.name, deltas):
+        conn.execute(stmt)
@@ -0,0 +1,120 @@
+import re
+
+from sqlalchemy import DDL, column, event, literal_column, select, table
+from sqlalchemy.engine import Connection
+
+from app.db.models import Expense
+
+# External-content FTS5 index over the searchable expense columns, keyed by
+# expenses.search_key and kept in sync by triggers, so ORM flushes and bulk
+# UPDATE ... RETURNING edits are both covered. The insert trigger gives each
+# new row the next search_key, so keys follow insertion order.
+FTS_TABLE = "expenses_fts"
+KEY_COLUMN = "search_key"
+# user_id is indexed as a token too, so a user's matches come straight out
+# of the index instead of being filtered after the fact.
+TEXT_COLUMNS = ("item_name", "category", "tags", "notes")
+FTS_COLUMNS = ("user_id", *TEXT_COLUMNS)
+
+_cols = ", ".join(FTS_COLUMNS)
+_new = ", ".join(f"new.{c}" for c in FTS_COLUMNS)
+_old = ", ".join(f"old.{c}" for c in FTS_COLUMNS)
+
+_next_key = f"(SELECT IFNULL(MAX({KEY_COLUMN}), 0) + 1 FROM expenses)"  # uq_expenses_search_key
+
+SEARCH_DDL = [
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    f"{_cols}, content='expenses', content_rowid='{KEY_COLUMN}', "
+    f"tokenize='unicode61 remove_diacritics 2', prefix='2 3')",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON expenses BEGIN "
+    f"UPDATE expenses SET {KEY_COLUMN} = {_next_key} WHERE rowid = new.rowid AND {KEY_COLUMN} IS NULL; "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_cols}) "
+    f"SELECT {KEY_COLUMN}, {_cols} FROM expenses WHERE rowid = new.rowid; END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON expenses BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_cols}) VALUES ('delete', old.{KEY_COLUMN}, {_old}); END",
+    f"CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF {_cols} ON expenses BEGIN "
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, {_cols}) VALUES ('delete', old.{KEY_COLUMN}, {_old}); "
+    f"INSERT INTO {FTS_TABLE}(rowid, {_cols}) VALUES (new.{KEY_COLUMN}, {_new}); END",
+]
+
+for _stmt in SEARCH_DDL:
+    event.listen(Expense.__table__, "after_create", DDL(_stmt).execute_if(dialect="sqlite"))
+
+
+def has_index(conn: Connection) -> bool:
+    """
+    True if the index exists and is keyed on search_key (older versions keyed
+    it on the implicit rowid).
+    """
+    res = conn.exec_driver_sql(
+        "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (FTS_TABLE,)
+    )
+    sql = res.scalar()
+    return sql is not None and f"content_rowid='{KEY_COLUMN}'" in sql
+
+
+def install(conn: Connection):
+    for stmt in SEARCH_DDL:
+        conn.exec_driver_sql(stmt)
+
+
+def uninstall(conn: Connection):
+    for name in ("ai", "ad", "au"):
+        conn.exec_driver_sql(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{name}")
+    conn.exec_driver_sql(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+def assign_keys(conn: Connection):
+    """
+    Give rows without a search_key one, after any existing key and in rowid
+    (insertion) order.
+    """
+    start = conn.exec_driver_sql(f"SELECT IFNULL(MAX({KEY_COLUMN}), 0) FROM expenses").scalar()
+    conn.exec_driver_sql(
+        f"UPDATE expenses SET {KEY_COLUMN} = rowid + ? WHERE {KEY_COLUMN} IS NULL", (start,)
+    )
+
+
+def rebuild_index(conn: Connection):
+    conn.exec_driver_sql(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def match_query(user_id: int, text: str) -> str | None:
+    """
+    Turn free text into an FTS5 query scoped to one user: every word must
+    match the start of a word in one of the text columns.
+    (1, "cof star") -> 'user_id : "1" AND {item_name ...} : ("cof"* "star"*)'
+    """
+    words = re.findall(r"\w+", (text or "").lower())
+    if not words:
+        return None
+    terms = " ".join(f'"{w}"*' for w in words)
+    return f'user_id : "{int(user_id)}" AND {{{" ".join(TEXT_COLUMNS)}}} : ({terms})'
+
+
+expenses_fts = table(FTS_TABLE, column("rowid"), column("rank"))
+
+
+def matching_rowids(user_id: int, text: str, limit: int, ranked: bool = False,
+                    below: int | None = None, above: int | None = None):
+    """
+    Subquery of (rowid, rank) for the user's best `limit` matches; the FTS
+    rowid is Expense.search_key. Without `ranked` the newest rows come first:
+    keys follow insertion order, and FTS5 can walk them backwards and stop
+    after `limit`. `below`/`above` are keyset bounds on the key for paging
+    (`above` walks forwards instead).
+    """
+    match = match_query(user_id, text)
+    if not match:
+        return None
+    fts = expenses_fts
+    q = select(fts.c.rowid, fts.c.rank).where(literal_column(FTS_TABLE).op("MATCH")(match))
+    if below is not None:
+        q = q.where(fts.c.rowid < below)
+    if above is not None:
+        q = q.where(fts.c.rowid > above)
+    if ranked:
+        order = fts.c.rank
+    else:
+        order = fts.c.rowid.asc() if above is not None else fts.c.rowid.desc()
+    return q.order_by(order).limit(limit).subquery()
@@ -1,5 +1,79 @@
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
 from app.core.config import settings
 
-engine = create_async_engine(settings.DATABASE_URL, echo=False, future=True)
+
+def sqlite_pragmas(profile: str | None = None, readonly: bool = False) -> dict[str, str | int]:
+    """
+    PRAGMAs for the configured SQLite profile (empty for "default").
+    Read-only connections skip the journal settings and refuse writes.
+    """
+    if readonly:
+        ro = {"query_only": 1}
+        if (profile or settings.SQLITE_PROFILE) == "production":
+            ro.update({
+                "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+                "cache_size": -settings.SQLITE_CACHE_SIZE_KB,
+                "mmap_size": settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+                "temp_store": settings.SQLITE_TEMP_STORE,
+            })
+        return ro
+    if (profile or settings.SQLITE_PROFILE) != "production":
+        return {}
+    return {
+        "journal_mode": settings.SQLITE_JOURNAL_MODE,
+        "synchronous": settings.SQLITE_SYNCHRONOUS,
+        "busy_timeout": settings.SQLITE_BUSY_TIMEOUT_MS,
+        "cache_size": -settings.SQLITE_CACHE_SIZE_KB,  # negative = KiB
+        "mmap_size": settings.SQLITE_MMAP_SIZE_MB * 1024 * 1024,
+        "temp_store": settings.SQLITE_TEMP_STORE,
+    }
+
+
+def make_engine(url: str, pragmas: dict[str, str | int] | None = None, **kwargs) -> AsyncEngine:
+    eng = create_async_engine(url, echo=False, future=True, **kwargs)
+    if eng.dialect.name == "sqlite" and pragmas:
+        @event.listens_for(eng.sync_engine, "connect")
+        def _apply_pragmas(dbapi_connection, connection_record):
+            cursor = dbapi_connection.cursor()
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name}={value}")
+            cursor.close()
+    return eng
+
+
+def make_read_engine(url: str, write_engine: AsyncEngine, pool_size: int | None = None) -> AsyncEngine:
+    """
+    Engine for report/export queries. For a SQLite file this opens the
+    database with mode=ro so readers never take the write lock; an in-memory
+    database cannot be shared, so it falls back to the write engine.
+    """
+    u = make_url(url)
+    size = pool_size or settings.DB_READ_POOL_SIZE
+    if u.get_backend_name() != "sqlite":
+        return make_engine(url, pool_size=size, max_overflow=0)
+    if not u.database or u.database == ":memory:" or u.query.get("mode") == "memory":
+        return write_engine
+    ro_url = u.set(database=f"file:{u.database}", query={**u.query, "mode": "ro", "uri": "true"})
+    return make_engine(
+        ro_url.render_as_string(hide_password=False),
+        sqlite_pragmas(readonly=True),
+        poolclass=AsyncAdaptedQueuePool,
+        pool_size=size,
+        max_overflow=0,
+    )
+
+
+engine = make_engine(settings.DATABASE_URL, sqlite_pragmas())
+read_engine = make_read_engine(settings.DATABASE_URL, engine)
 SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+ReadSessionLocal = async_sessionmaker(bind=read_engine, autoflush=False, expire_on_commit=False, class_=AsyncSession)
+
+
+def session_factory(mode: str | None = None) -> async_sessionmaker[AsyncSession]:
+    """
+    "read" selects the reader pool; anything else gets a write session.
+    """
+    return ReadSessionLocal if mode == "read" else SessionLocal
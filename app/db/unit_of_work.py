@@ -0,0 +1,20 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Session.info flag: set by whoever owns the transaction (the group-commit
+# writer, or a request-scoped unit of work). Services then only flush.
+UNIT_OF_WORK = "unit_of_work"
+
+
+def in_unit_of_work(db: AsyncSession) -> bool:
+    return bool(db.info.get(UNIT_OF_WORK))
+
+
+async def commit_or_flush(db: AsyncSession):
+    """
+    Commit the service's writes, or just flush them when the session is part
+    of a larger unit of work that commits once at the end.
+    """
+    if in_unit_of_work(db):
+        await db.flush()
+    else:
+        await db.commit()
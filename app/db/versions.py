@@ -0,0 +1,48 @@
+from sqlalchemy import event, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from app.db.models import DataVersion, Expense
+
+
+def bump_statement(dialect_name: str, user_ids):
+    """
+    INSERT ... ON CONFLICT DO UPDATE version = version + 1 for each user.
+    """
+    dialect_insert = postgresql.insert if dialect_name == "postgresql" else sqlite.insert
+    stmt = dialect_insert(DataVersion).values([{"user_id": uid, "version": 1} for uid in sorted(user_ids)])
+    return stmt.on_conflict_do_update(
+        index_elements=["user_id"],
+        set_={"version": DataVersion.version + 1},
+    )
+
+
+def changed_users(session: Session) -> set[int]:
+    users = {obj.user_id for obj in session.new if isinstance(obj, Expense)}
+    users |= {obj.user_id for obj in session.deleted if isinstance(obj, Expense)}
+    users |= {
+        obj.user_id for obj in session.dirty
+        if isinstance(obj, Expense) and session.is_modified(obj)
+    }
+    return users
+
+
+async def bump(db, user_id: int):
+    """
+    For writes that bypass the flush (bulk UPDATE ... RETURNING).
+    """
+    await db.execute(bump_statement(db.bind.dialect.name, [user_id]))
+
+
+async def current(db, user_id: int) -> int:
+    res = await db.execute(select(DataVersion.version).where(DataVersion.user_id == user_id))
+    return res.scalar_one_or_none() or 0
+
+
+@event.listens_for(Session, "before_flush")
+def _bump_data_versions(session: Session, flush_context, instances):
+    users = changed_users(session)
+    if not users:
+        return
+    conn = session.connection()
+    conn.execute(bump_statement(conn.dialect.name, users))
@@ -0,0 +1,140 @@
+import asyncio
+import contextlib
+from typing import Any, Awaitable, Callable, TypeVar
+
+from loguru import logger
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+
+from app.core.config import settings
+from app.db.session import engine
+from app.db.unit_of_work import UNIT_OF_WORK
+
+T = TypeVar("T")
+WriteJob = Callable[[AsyncSession], Awaitable[T]]
+
+
+class GroupCommitWriter:
+    """
+    Single-writer task for SQLite. Jobs submitted from any handler are queued;
+    the writer task drains the queue every `window_ms`, runs each job in its own
+    SAVEPOINT on one connection and commits the whole batch once. Callers await
+    their own job's result (or exception); a failing job only rolls back itself.
+
+    When the writer is not running (scripts, tests), submit() runs the job on a
+    fresh session and commits it directly.
+    """
+
+    def __init__(self, engine: AsyncEngine, window_ms: int = 5, max_batch: int = 64):
+        self.engine = engine
+        self.window = window_ms / 1000
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue[tuple[WriteJob, asyncio.Future]] | None = None
+        self._task: asyncio.Task | None = None
+        self.restart_delay = 1.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self):
+        if self.running:
+            return
+        self._queue = asyncio.Queue()
+        self._task = asyncio.create_task(self._run(), name="group-commit-writer")
+
+    async def stop(self):
+        if not self._task:
+            return
+        self._task.cancel()
+        with contextlib.suppress(asyncio.CancelledError):
+            await self._task
+        self._task = None
+        while self._queue and not self._queue.empty():
+            _, fut = self._queue.get_nowait()
+            if not fut.done():
+                fut.set_exception(RuntimeError("writer stopped"))
+
+    async def submit(self, job: WriteJob[T]) -> T:
+        if not self.running:
+            async with AsyncSession(self.engine, expire_on_commit=False, autoflush=False) as session:
+                result = await job(session)
+                await session.commit()
+                return result
+        fut: asyncio.Future = asyncio.get_running_loop().create_future()
+        await self._queue.put((job, fut))
+        return await fut
+
+    async def _next_batch(self) -> list[tuple[WriteJob, asyncio.Future]]:
+        batch = [await self._queue.get()]
+        await asyncio.sleep(self.window)
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def _run(self):
+        """
+        Connection-level failures (connect, close) fail the batch in hand and
+        everything queued, then the writer reconnects after `restart_delay`.
+        Callers never hang on a future the writer has dropped.
+        """
+        while True:
+            batch: list[tuple[WriteJob, asyncio.Future]] = []
+            try:
+                async with self.engine.connect() as conn:
+                    while True:
+                        batch = await self._next_batch()
+                        await self._commit_batch(conn, batch)
+                        batch = []
+            except asyncio.CancelledError:
+                self._fail(batch, RuntimeError("writer stopped"))
+                raise
+            except Exception as exc:
+                logger.exception("Group-commit writer failed; restarting")
+                self._fail(batch, exc)
+                while not self._queue.empty():
+                    self._fail([self._queue.get_nowait()], exc)
+            await asyncio.sleep(self.restart_delay)
+
+    @staticmethod
+    def _fail(batch: list[tuple[WriteJob, asyncio.Future]], exc: BaseException):
+        for _, fut in batch:
+            if not fut.done():
+                fut.set_exception(exc)
+
+    async def _commit_batch(self, conn, batch: list[tuple[WriteJob, asyncio.Future]]):
+        done: list[tuple[asyncio.Future, Any]] = []
+        session = AsyncSession(bind=conn, expire_on_commit=False, autoflush=False)
+        session.info[UNIT_OF_WORK] = True
+        try:
+            for job, fut in batch:
+                if fut.cancelled():
+                    continue
+                try:
+                    async with session.begin_nested():
+                        result = await job(session)
+                except Exception as exc:
+                    fut.set_exception(exc)
+                else:
+                    done.append((fut, result))
+            await session.commit()
+        except Exception as exc:
+            logger.exception("Group commit failed")
+            with contextlib.suppress(Exception):
+                await session.rollback()
+            for fut, _ in done:
+                if not fut.done():
+                    fut.set_exception(exc)
+            return
+        finally:
+            await session.close()
+
+        for fut, result in done:
+            if not fut.done():
+                fut.set_result(result)
+
+
+write_queue = GroupCommitWriter(
+    engine,
+    window_ms=settings.WRITER_WINDOW_MS,
+    max_batch=settings.WRITER_MAX_BATCH,
+)
@@ -1,40 +1,29 @@
-from sqlalchemy import select
+from sqlalchemy import and_, case, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-import uuid
 
-from app.db.models import Budget
+from app.db.models import Budget, ExpenseRollup
+from app.db.refs import owned_by_ref
+from app.db.unit_of_work import commit_or_flush
+from app.utils.ids import new_id
 from app.services.expense_service import ExpenseService
+from app.utils.dates import Period
 
 class BudgetService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def resolve_budget_id(self, user_id: int, budget_ref: str) -> str | None:
-        ref = (budget_ref or "").strip()
-        if not ref:
+        where = owned_by_ref(Budget, user_id, budget_ref)
+        if where is None:
             return None
-        if len(ref) >= 36:
-            q = select(Budget.id).where(Budget.id == ref, Budget.user_id == user_id)
-            res = await self.db.execute(q)
-            return res.scalar_one_or_none()
-
-        q = (
-            select(Budget.id)
-            .where(Budget.user_id == user_id, Budget.id.like(f"{ref}%"))
-            .order_by(Budget.created_at_utc.desc())
-            .limit(2)
-        )
-        res = await self.db.execute(q)
-        rows = res.scalars().all()
-        if len(rows) != 1:
-            return None
-        return rows[0]
+        res = await self.db.execute(select(Budget.id).where(*where))
+        return res.scalar_one_or_none()
 
     async def add_budget(self, user_id: int, scope_type: str, scope_value: str | None,
                          limit_cents: int, period: str) -> Budget:
         b = Budget(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             user_id=user_id,
             scope_type=scope_type,
             scope_value=scope_value,
@@ -43,8 +32,7 @@ class BudgetService:
             active=True,
         )
         self.db.add(b)
-        await self.db.commit()
-        await self.db.refresh(b)
+        await commit_or_flush(self.db)
         return b
 
     async def list_budgets(self, user_id: int):
@@ -53,30 +41,99 @@ class BudgetService:
         return list(res.scalars().all())
 
     async def delete_budget(self, budget_id: str, user_id: int):
-        resolved_id = await self.resolve_budget_id(user_id, budget_id)
-        if not resolved_id:
+        where = owned_by_ref(Budget, user_id, budget_id)
+        if where is None:
             return None
-        q = select(Budget).where(Budget.id == resolved_id, Budget.user_id == user_id)
+        q = update(Budget).where(*where).values(active=False).returning(Budget)
         res = await self.db.execute(q)
         b = res.scalar_one_or_none()
-        if not b:
-            return None
-        b.active = False
-        await self.db.commit()
+        if b:
+            await commit_or_flush(self.db)
         return b
 
-    async def check_alerts(self, user_id: int, expense_service: ExpenseService):
+    async def _spending_windows(self, user_id: int, year: int, month: int) -> dict[str, dict[str, int]]:
+        """
+        Per-category spend for this month, last month and this year,
+        from a single grouped query over expense_rollups.
+        """
+        this_month = Period.month(year, month)
+        prev_year, prev_month = (year - 1, 12) if month == 1 else (year, month - 1)
+        last_month = Period.month(prev_year, prev_month)
+        this_year = Period.year(year)
+
+        def window_sum(period: Period):
+            in_window = and_(ExpenseRollup.local_date >= period.start, ExpenseRollup.local_date < period.end)
+            return func.sum(case((in_window, ExpenseRollup.total_cents), else_=0))
+
+        q = (
+            select(
+                ExpenseRollup.category,
+                window_sum(this_month).label("month"),
+                window_sum(last_month).label("prev_month"),
+                window_sum(this_year).label("year"),
+            )
+            .where(
+                ExpenseRollup.user_id == user_id,
+                ExpenseRollup.local_date >= min(last_month.start, this_year.start),
+                ExpenseRollup.local_date < this_year.end,
+            )
+            .group_by(ExpenseRollup.category)
+        )
+        res = await self.db.execute(q)
+        windows: dict[str, dict[str, int]] = {"month": {}, "prev_month": {}, "year": {}}
+        for row in res.all():
+            cat = row.category or "Uncategorized"
+            for name in windows:
+                windows[name][cat] = getattr(row, name) or 0
+        return windows
+
+    @staticmethod
+    def _progress(budget: Budget, windows: dict[str, dict[str, int]]) -> dict:
+        def spent_in(window: str) -> int:
+            totals = windows[window]
+            if budget.scope_type == "overall":
+                return sum(totals.values())
+            return totals.get(budget.scope_value, 0) or 0
+
+        effective_limit = budget.limit_cents
+        if budget.period in ("month", "month_rollover"):
+            spent = spent_in("month")
+            if budget.period == "month_rollover":
+                effective_limit += max(0, budget.limit_cents - spent_in("prev_month"))
+        else:
+            spent = spent_in("year")
+
+        pct = (spent / effective_limit * 100) if effective_limit > 0 else 0.0
+        return {
+            "budget": budget,
+            "spent_cents": spent,
+            "effective_limit_cents": effective_limit,
+            "pct": pct,
+        }
+
+    async def evaluate_budgets(self, user_id: int, year: int, month: int,
+                               budgets: list[Budget] | None = None) -> list[dict]:
+        """
+        Spent + effective limit for all of a user's active budgets (or the given ones).
+        Spending is read once for every budget, whatever their scope and period.
+        """
+        if budgets is None:
+            budgets = await self.list_budgets(user_id)
+        if not budgets:
+            return []
+        windows = await self._spending_windows(user_id, year, month)
+        return [self._progress(b, windows) for b in budgets]
+
+    async def check_alerts(self, user_id: int, expense_service: ExpenseService | None = None):
         """
         Check if any budgets are exceeded or near threshold.
         Returns list of alert strings.
         """
         now = datetime.now()
-        year, month = now.year, now.month
         alerts = []
 
-        budgets = await self.list_budgets(user_id)
-        for b in budgets:
-            progress = await self.get_budget_progress(user_id, b, expense_service, year, month)
+        for progress in await self.evaluate_budgets(user_id, now.year, now.month):
+            b = progress["budget"]
             total = progress["spent_cents"]
             effective_limit = progress["effective_limit_cents"]
             pct = (total / effective_limit * 100) if effective_limit > 0 else None
@@ -87,26 +144,11 @@ class BudgetService:
 
         return alerts
 
-    async def get_budget_progress(self, user_id: int, budget: Budget, expense_service: ExpenseService, year: int, month: int):
-        if budget.period in ("month", "month_rollover"):
-            totals = await expense_service.monthly_summary(user_id, year, month)
-            spent = totals["total_cents"] if budget.scope_type == "overall" else (totals["breakdown"].get(budget.scope_value, 0) or 0)
-            effective_limit = budget.limit_cents
-
-            if budget.period == "month_rollover":
-                prev_year, prev_month = (year - 1, 12) if month == 1 else (year, month - 1)
-                prev_totals = await expense_service.monthly_summary(user_id, prev_year, prev_month)
-                prev_spent = prev_totals["total_cents"] if budget.scope_type == "overall" else (prev_totals["breakdown"].get(budget.scope_value, 0) or 0)
-                carry = max(0, budget.limit_cents - prev_spent)
-                effective_limit += carry
-        else:
-            totals = await expense_service.yearly_summary(user_id, year)
-            spent = totals["total_cents"] if budget.scope_type == "overall" else (totals["breakdown"].get(budget.scope_value, 0) or 0)
-            effective_limit = budget.limit_cents
-
-        pct = (spent / effective_limit * 100) if effective_limit > 0 else 0.0
+    async def get_budget_progress(self, user_id: int, budget: Budget, expense_service: ExpenseService | None,
+                                  year: int, month: int):
+        progress = (await self.evaluate_budgets(user_id, year, month, budgets=[budget]))[0]
         return {
-            "spent_cents": spent,
-            "effective_limit_cents": effective_limit,
-            "pct": pct,
+            "spent_cents": progress["spent_cents"],
+            "effective_limit_cents": progress["effective_limit_cents"],
+            "pct": progress["pct"],
         }
@@ -1,6 +1,7 @@
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import Category
+from app.db.unit_of_work import commit_or_flush
 from app.utils.text import slugify
 
 DEFAULT_GLOBAL_CATEGORIES = [
@@ -29,8 +30,7 @@ class CategoryService:
 
         cat = Category(name=name, slug=slug)
         self.db.add(cat)
-        await self.db.commit()
-        await self.db.refresh(cat)
+        await commit_or_flush(self.db)
         return cat
 
     async def list_all(self) -> list[Category]:
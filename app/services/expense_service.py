@@ -1,34 +1,78 @@
 from datetime import datetime, timezone
-from sqlalchemy import extract, func, select
+from typing import NamedTuple
+from sqlalchemy import extract, func, select, tuple_, update
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.db.models import Expense
-from app.utils.dates import local_date_for_now
-import pandas as pd
+from app.db.models import Expense, ExpenseRollup
+from app.db import search, versions
+from app.db.refs import owned_by_ref
+from app.db.unit_of_work import commit_or_flush
+from app.utils.dates import Period, local_date_for_now
+
+def in_period(period: Period):
+    """
+    Sargable local_date range predicate; lets SQLite use ix_expenses_user_local_date.
+    """
+    return (Expense.local_date >= period.start, Expense.local_date < period.end)
+
+
+def in_rollup_period(period: Period):
+    return (ExpenseRollup.local_date >= period.start, ExpenseRollup.local_date < period.end)
+
+
+class ExpensePage(NamedTuple):
+    """
+    One page of expenses, newest first. Cursors are the refs of the boundary
+    rows, set only when there is an older/newer page to go to.
+    """
+    items: list[Expense]
+    next_cursor: str | None  # older
+    prev_cursor: str | None  # newer
+
+
+def _page(rows: list[Expense], limit: int, cursor: str | None, older: bool) -> ExpensePage:
+    """
+    Build a page from up to limit + 1 rows fetched in walk order.
+    """
+    more = len(rows) > limit
+    rows = rows[:limit]
+    if not older:
+        rows.reverse()
+    has_older = more if older else cursor is not None
+    has_newer = cursor is not None if older else more
+    return ExpensePage(
+        items=rows,
+        next_cursor=rows[-1].ref if rows and has_older else None,
+        prev_cursor=rows[0].ref if rows and has_newer else None,
+    )
+
 
 class ExpenseService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def resolve_expense_id(self, user_id: int, expense_ref: str) -> str | None:
-        ref = (expense_ref or "").strip()
-        if not ref:
+        where = owned_by_ref(Expense, user_id, expense_ref)
+        if where is None:
             return None
-        if len(ref) >= 36:
-            q = select(Expense.id).where(Expense.user_id == user_id, Expense.id == ref)
-            res = await self.db.execute(q)
-            return res.scalar_one_or_none()
+        res = await self.db.execute(select(Expense.id).where(*where))
+        return res.scalar_one_or_none()
 
-        q = (
-            select(Expense.id)
-            .where(Expense.user_id == user_id, Expense.id.like(f"{ref}%"))
-            .order_by(Expense.created_at_utc.desc())
-            .limit(2)
-        )
-        res = await self.db.execute(q)
-        rows = res.scalars().all()
-        if len(rows) != 1:
+    async def _update_owned(self, user_id: int, expense_ref: str, **values) -> Expense | None:
+        """
+        Ownership-checked UPDATE ... RETURNING in a single statement.
+        Only for columns the rollup table does not depend on; amount and
+        category changes go through the ORM so the flush hook sees old values.
+        """
+        where = owned_by_ref(Expense, user_id, expense_ref)
+        if where is None:
             return None
-        return rows[0]
+        q = update(Expense).where(*where).values(**values).returning(Expense)
+        res = await self.db.execute(q)
+        exp = res.scalar_one_or_none()
+        if exp:
+            await versions.bump(self.db, user_id)
+            await commit_or_flush(self.db)
+        return exp
 
     async def add_expense_text(self, *, user_id: int, item_name: str, amount_cents: int,
                                currency: str = "CAD", category: str | None = None,
@@ -45,8 +89,7 @@ class ExpenseService:
             local_date=local_date_for_now(),
         )
         self.db.add(exp)
-        await self.db.commit()
-        await self.db.refresh(exp)
+        await commit_or_flush(self.db)
         return exp
 
     async def get_expense(self, expense_id: str) -> Expense | None:
@@ -55,18 +98,19 @@ class ExpenseService:
         return res.scalar_one_or_none()
 
     async def get_expense_by_ref(self, user_id: int, expense_ref: str) -> Expense | None:
-        expense_id = await self.resolve_expense_id(user_id, expense_ref)
-        if not expense_id:
+        where = owned_by_ref(Expense, user_id, expense_ref)
+        if where is None:
             return None
-        q = select(Expense).where(Expense.id == expense_id, Expense.user_id == user_id)
-        res = await self.db.execute(q)
+        res = await self.db.execute(select(Expense).where(*where))
         return res.scalar_one_or_none()
 
     async def get_last_expense(self, user_id: int) -> Expense | None:
+        # Time first: rows from before UUIDv7 ids keep random uuid4 ids unless
+        # scripts/migrate_ids.py was run. Served by ix_expenses_user_created_id.
         q = (
             select(Expense)
             .where(Expense.user_id == user_id)
-            .order_by(Expense.created_at_utc.desc())
+            .order_by(Expense.created_at_utc.desc(), Expense.id.desc())
             .limit(1)
         )
         res = await self.db.execute(q)
@@ -77,48 +121,41 @@ class ExpenseService:
         if not exp:
             return None
         await self.db.delete(exp)
-        await self.db.commit()
+        await commit_or_flush(self.db)
         return exp
 
     async def update_category(self, *, expense_id: str, user_id: int, category_name: str | None):
-        resolved_id = await self.resolve_expense_id(user_id, expense_id)
-        if not resolved_id:
-            return None
-        # Ensure ownership
-        q = select(Expense).where(Expense.id == resolved_id, Expense.user_id == user_id)
-        res = await self.db.execute(q)
-        exp = res.scalar_one_or_none()
+        exp = await self.get_expense_by_ref(user_id, expense_id)
         if not exp:
             return None
-
         exp.category = category_name
-        await self.db.commit()
-        await self.db.refresh(exp)
+        await commit_or_flush(self.db)
         return exp
 
-    async def monthly_summary(self, user_id: int, year: int, month: int):
+    async def _category_totals(self, user_id: int, period: Period):
         """
-        Returns total + breakdown by category for given user, year, month.
+        Total + per-category breakdown for a period, read from expense_rollups.
         """
         q = (
             select(
-                func.sum(Expense.amount_cents).label("total_cents"),
-                Expense.category,
-                func.sum(Expense.amount_cents).label("cat_total_cents"),
+                ExpenseRollup.category,
+                func.sum(ExpenseRollup.total_cents).label("cat_total_cents"),
             )
-            .where(
-                Expense.user_id == user_id,
-                extract("year", Expense.local_date) == year,
-                extract("month", Expense.local_date) == month,
-            )
-            .group_by(Expense.category)
+            .where(ExpenseRollup.user_id == user_id, *in_rollup_period(period))
+            .group_by(ExpenseRollup.category)
         )
         res = await self.db.execute(q)
         rows = res.all()
 
         total = sum([row.cat_total_cents or 0 for row in rows]) if rows else 0
         breakdown = {row.category or "Uncategorized": row.cat_total_cents for row in rows}
+        return total, breakdown
 
+    async def monthly_summary(self, user_id: int, year: int, month: int):
+        """
+        Returns total + breakdown by category for given user, year, month.
+        """
+        total, breakdown = await self._category_totals(user_id, Period.month(year, month))
         return {
             "year": year,
             "month": month,
@@ -130,30 +167,16 @@ class ExpenseService:
         """
         Returns yearly total + breakdown by category + per-month totals.
         """
-        # Category breakdown
-        q_cat = (
-            select(
-                Expense.category,
-                func.sum(Expense.amount_cents).label("cat_total_cents"),
-            )
-            .where(extract("year", Expense.local_date) == year,
-                   Expense.user_id == user_id)
-            .group_by(Expense.category)
-        )
-        res_cat = await self.db.execute(q_cat)
-        cat_rows = res_cat.all()
-
-        breakdown = {row.category or "Uncategorized": row.cat_total_cents for row in cat_rows}
-        total = sum([row.cat_total_cents or 0 for row in cat_rows])
+        period = Period.year(year)
+        total, breakdown = await self._category_totals(user_id, period)
 
         # Per-month totals
         q_months = (
             select(
-                extract("month", Expense.local_date).label("month"),
-                func.sum(Expense.amount_cents).label("month_total_cents"),
+                extract("month", ExpenseRollup.local_date).label("month"),
+                func.sum(ExpenseRollup.total_cents).label("month_total_cents"),
             )
-            .where(extract("year", Expense.local_date) == year,
-                   Expense.user_id == user_id)
+            .where(ExpenseRollup.user_id == user_id, *in_rollup_period(period))
             .group_by("month")
             .order_by("month")
         )
@@ -167,197 +190,202 @@ class ExpenseService:
             "breakdown": breakdown,
             "per_month": per_month,
         }
+
+    async def _details(self, user_id: int, period: Period, group_by: str):
+        if group_by == "item":
+            q = (
+                select(Expense.item_name.label("key"), func.sum(Expense.amount_cents).label("total_cents"))
+                .where(Expense.user_id == user_id, *in_period(period))
+                .group_by(Expense.item_name)
+                .order_by(func.sum(Expense.amount_cents).desc())
+            )
+        else:
+            q = (
+                select(
+                    func.nullif(ExpenseRollup.category, "").label("key"),
+                    func.sum(ExpenseRollup.total_cents).label("total_cents"),
+                )
+                .where(ExpenseRollup.user_id == user_id, *in_rollup_period(period))
+                .group_by(ExpenseRollup.category)
+                .order_by(func.sum(ExpenseRollup.total_cents).desc())
+            )
+        res = await self.db.execute(q)
+        return res.all()
     
     async def monthly_details(self, user_id: int, year: int, month: int, group_by: str = "item"):
         """
         Return detailed breakdown for a month.
         group_by = "item" → group by item_name
-        group_by = "category" → group by category
+        group_by = "category" → group by category (served from rollups)
         """
-        col = Expense.item_name if group_by == "item" else Expense.category
-        q = (
-            select(col.label("key"), func.sum(Expense.amount_cents).label("total_cents"))
-            .where(
-                extract("year", Expense.local_date) == year,
-                extract("month", Expense.local_date) == month,
-                Expense.user_id == user_id,
-            )
-            .group_by(col)
-            .order_by(func.sum(Expense.amount_cents).desc())
-        )
-        res = await self.db.execute(q)
-        rows = res.all()
-        return rows
+        return await self._details(user_id, Period.month(year, month), group_by)
 
     async def yearly_details(self, user_id: int, year: int, group_by: str = "item"):
-        col = Expense.item_name if group_by == "item" else Expense.category
+        return await self._details(user_id, Period.year(year), group_by)
+    
+    async def search_expenses(self, user_id: int, query: str, limit: int = 10, ranked: bool = False):
+        """
+        Keyword search across item_name, category, tags, and notes.
+        Every word must match the start of a word in one of those columns.
+        Returns up to `limit` results, most recent first, or best match first
+        when `ranked` (bm25). Served by the expenses_fts index on SQLite.
+        """
+        if self.db.bind.dialect.name != "sqlite":
+            return await self._search_like(user_id, query, limit)
+        hits = search.matching_rowids(user_id, query, limit, ranked)
+        if hits is None:
+            return []
         q = (
-            select(col.label("key"), func.sum(Expense.amount_cents).label("total_cents"))
-            .where(
-                extract("year", Expense.local_date) == year,
-                Expense.user_id == user_id,
-            )
-            .group_by(col)
-            .order_by(func.sum(Expense.amount_cents).desc())
+            select(Expense)
+            .join(hits, hits.c.rowid == Expense.search_key)
+            .where(Expense.user_id == user_id)
+            .order_by(hits.c.rank if ranked else hits.c.rowid.desc())
         )
         res = await self.db.execute(q)
-        rows = res.all()
-        return rows
-    
-    async def search_expenses(self, user_id: int, query: str, limit: int = 10):
+        return list(res.scalars().all())
+
+    async def _cursor_keys(self, user_id: int, cursor: str | None):
+        if not cursor:
+            return None
+        where = owned_by_ref(Expense, user_id, cursor)
+        q = select(Expense.created_at_utc, Expense.id, Expense.search_key).where(*where)
+        res = await self.db.execute(q)
+        return res.one_or_none()
+
+    async def history_page(self, user_id: int, cursor: str | None = None, older: bool = True,
+                           limit: int = 10) -> ExpensePage:
         """
-        Simple keyword search across item_name, category, tags, and notes.
-        Returns up to `limit` results sorted by most recent.
+        Browse a user's expenses newest first, keyset-paginated on
+        (created_at_utc, id): `cursor` is the ref of the row to continue from,
+        `older` picks the direction. Every page is one index range scan on
+        ix_expenses_user_created_id, however deep.
         """
-        pattern = f"%{query.lower()}%"
+        q = select(Expense).where(Expense.user_id == user_id)
+        return await self._keyset_page(q, user_id, cursor, older, limit)
+
+    async def _keyset_page(self, q, user_id: int, cursor: str | None, older: bool, limit: int) -> ExpensePage:
+        keys = (Expense.created_at_utc, Expense.id)
+        bound = await self._cursor_keys(user_id, cursor)
+        if cursor and bound is None:
+            return ExpensePage([], None, None)
+        if bound is not None:
+            at = tuple_(bound.created_at_utc, bound.id)
+            q = q.where(tuple_(*keys) < at if older else tuple_(*keys) > at)
+        order = [k.desc() if older else k.asc() for k in keys]
+        res = await self.db.execute(q.order_by(*order).limit(limit + 1))
+        return _page(list(res.scalars().all()), limit, cursor, older)
+
+    async def search_page(self, user_id: int, query: str, cursor: str | None = None, older: bool = True,
+                          limit: int = 10) -> ExpensePage:
+        """
+        Paginated search_expenses, newest first. On SQLite the keyset bound is
+        search_key (insertion order), applied inside the index scan so deep
+        pages cost the same as the first; elsewhere (created_at_utc, id).
+        """
+        if self.db.bind.dialect.name != "sqlite":
+            return await self._keyset_page(self._like_query(user_id, query), user_id, cursor, older, limit)
+        bound = await self._cursor_keys(user_id, cursor)
+        if cursor and bound is None:
+            return ExpensePage([], None, None)
+        key = bound.search_key if bound is not None else None
+        hits = search.matching_rowids(
+            user_id, query, limit + 1,
+            below=key if older else None,
+            above=None if older else key,
+        )
+        if hits is None:
+            return ExpensePage([], None, None)
         q = (
             select(Expense)
-            .where(
-                Expense.user_id == user_id,
-                (
-                    func.lower(Expense.item_name).like(pattern) |
-                    func.lower(Expense.category).like(pattern) |
-                    func.lower(Expense.tags).like(pattern) |
-                    func.lower(Expense.notes).like(pattern)
-                )
+            .join(hits, hits.c.rowid == Expense.search_key)
+            .where(Expense.user_id == user_id)
+            .order_by(hits.c.rowid.desc() if older else hits.c.rowid.asc())
+        )
+        res = await self.db.execute(q)
+        return _page(list(res.scalars().all()), limit, cursor, older)
+
+    def _like_query(self, user_id: int, query: str):
+        pattern = f"%{query.lower()}%"
+        return select(Expense).where(
+            Expense.user_id == user_id,
+            (
+                func.lower(Expense.item_name).like(pattern) |
+                func.lower(Expense.category).like(pattern) |
+                func.lower(Expense.tags).like(pattern) |
+                func.lower(Expense.notes).like(pattern)
             )
-            .order_by(Expense.created_at_utc.desc())
-            .limit(limit)
         )
+
+    async def _search_like(self, user_id: int, query: str, limit: int):
+        q = self._like_query(user_id, query).order_by(Expense.created_at_utc.desc(), Expense.id.desc()).limit(limit)
         res = await self.db.execute(q)
         return list(res.scalars().all())
     
-    async def attach_receipt(self, expense_id: str, user_id: int, file_path: str):
+    async def attach_receipt(self, expense_id: str, user_id: int, file_path: str, file_id: str | None = None):
         """
-        Attach a receipt (file path) to an existing expense.
+        Attach a receipt (file path, and the Telegram file_id of the photo
+        if known) to an existing expense.
         """
-        resolved_id = await self.resolve_expense_id(user_id, expense_id)
-        if not resolved_id:
-            return None
+        return await self._update_owned(user_id, expense_id, receipt_path=file_path, receipt_file_id=file_id)
 
-        q = select(Expense).where(Expense.id == resolved_id, Expense.user_id == user_id)
-        res = await self.db.execute(q)
-        exp = res.scalar_one_or_none()
-        if not exp:
-            return None
+    async def set_receipt_file_id(self, expense_id: str, file_id: str | None):
+        """
+        Remember (or forget, with None) the Telegram file_id of an expense's
+        receipt. Only a delivery shortcut, so the data version is left alone.
+        """
+        await self.db.execute(update(Expense).where(Expense.id == expense_id).values(receipt_file_id=file_id))
+        await commit_or_flush(self.db)
 
-        exp.receipt_path = file_path
-        await self.db.commit()
-        await self.db.refresh(exp)
-        return exp
-    
     async def update_tags(self, *, expense_id: str, user_id: int, tags: str):
-        resolved_id = await self.resolve_expense_id(user_id, expense_id)
-        if not resolved_id:
-            return None
-        q = select(Expense).where(Expense.id == resolved_id, Expense.user_id == user_id)
-        res = await self.db.execute(q)
-        exp = res.scalar_one_or_none()
-        if not exp:
-            return None
-        exp.tags = tags
-        await self.db.commit()
-        await self.db.refresh(exp)
-        return exp
+        return await self._update_owned(user_id, expense_id, tags=tags)
 
     async def update_note(self, *, expense_id: str, user_id: int, note: str):
-        resolved_id = await self.resolve_expense_id(user_id, expense_id)
-        if not resolved_id:
-            return None
-        q = select(Expense).where(Expense.id == resolved_id, Expense.user_id == user_id)
-        res = await self.db.execute(q)
-        exp = res.scalar_one_or_none()
-        if not exp:
-            return None
-        exp.notes = note
-        await self.db.commit()
-        await self.db.refresh(exp)
-        return exp
+        return await self._update_owned(user_id, expense_id, notes=note)
 
     async def update_item(self, *, expense_id: str, user_id: int, item_name: str):
-        resolved_id = await self.resolve_expense_id(user_id, expense_id)
-        if not resolved_id:
-            return None
-        q = select(Expense).where(Expense.id == resolved_id, Expense.user_id == user_id)
-        res = await self.db.execute(q)
-        exp = res.scalar_one_or_none()
-        if not exp:
-            return None
-        exp.item_name = item_name[:200]
-        await self.db.commit()
-        await self.db.refresh(exp)
-        return exp
+        return await self._update_owned(user_id, expense_id, item_name=item_name[:200])
 
     async def update_amount(self, *, expense_id: str, user_id: int, amount_cents: int):
-        resolved_id = await self.resolve_expense_id(user_id, expense_id)
-        if not resolved_id:
-            return None
-        q = select(Expense).where(Expense.id == resolved_id, Expense.user_id == user_id)
-        res = await self.db.execute(q)
-        exp = res.scalar_one_or_none()
+        exp = await self.get_expense_by_ref(user_id, expense_id)
         if not exp:
             return None
         exp.amount_cents = amount_cents
-        await self.db.commit()
-        await self.db.refresh(exp)
+        await commit_or_flush(self.db)
         return exp
     
-    async def export_expenses(self, user_id: int, year: int | None = None, month: int | None = None):
-        """
-        Return a Pandas DataFrame of expenses for export.
-        """
-        q = select(Expense).where(Expense.user_id == user_id)
-        if year:
-            q = q.where(extract("year", Expense.local_date) == year)
-        if month:
-            q = q.where(extract("month", Expense.local_date) == month)
+    @staticmethod
+    def _export_filter(user_id: int, year: int | None, month: int | None) -> list:
+        where = [Expense.user_id == user_id]
+        period = Period.for_export(year, month)
+        if period:
+            where.extend(in_period(period))
+        return where
 
-        q = q.order_by(Expense.local_date.asc())
-        res = await self.db.execute(q)
-        rows = res.scalars().all()
+    async def count_export_rows(self, user_id: int, year: int | None = None, month: int | None = None) -> int:
+        q = select(func.count()).select_from(Expense).where(*self._export_filter(user_id, year, month))
+        return (await self.db.execute(q)).scalar_one()
 
-        if not rows:
-            return None
+    async def iter_export_rows(self, user_id: int, year: int | None = None, month: int | None = None,
+                               chunk_size: int = 1000):
+        """
+        Yield the export rows (plain column tuples, no ORM objects) in chunks
+        of `chunk_size` from a server-side cursor, oldest first.
+        """
+        q = select(
+            Expense.id, Expense.local_date, Expense.item_name, Expense.amount_cents, Expense.currency,
+            Expense.category, Expense.tags, Expense.notes, Expense.receipt_path,
+        ).where(*self._export_filter(user_id, year, month))
+        q = q.order_by(Expense.local_date.asc()).execution_options(yield_per=chunk_size)
+        result = await self.db.stream(q)
+        async for chunk in result.partitions():
+            yield chunk
 
-        data = []
-        for e in rows:
-            data.append({
-                "ID": e.id,
-                "Date": e.local_date.isoformat(),
-                "Item": e.item_name,
-                "Amount": f"{e.amount_cents/100:.2f} {e.currency}",
-                "Category": e.category or "",
-                "Tags": e.tags or "",
-                "Notes": e.notes or "",
-                "Receipt": e.receipt_path or "",
-            })
-        df = pd.DataFrame(data)
-        return df
-    
     async def totals_for_period(self, user_id: int, year: int, month: int | None = None):
         """
         Return total + breakdown for a given period (month OR year).
         """
-        q = select(
-            func.sum(Expense.amount_cents).label("total_cents"),
-            Expense.category,
-            func.sum(Expense.amount_cents).label("cat_total_cents"),
-        ).where(Expense.user_id == user_id)
-
-        if month:
-            q = q.where(
-                extract("year", Expense.local_date) == year,
-                extract("month", Expense.local_date) == month
-            )
-        else:
-            q = q.where(extract("year", Expense.local_date) == year)
-
-        q = q.group_by(Expense.category)
-        res = await self.db.execute(q)
-        rows = res.all()
-
-        total = sum([r.cat_total_cents or 0 for r in rows]) if rows else 0
-        breakdown = {r.category or "Uncategorized": r.cat_total_cents for r in rows}
+        period = Period.month(year, month) if month else Period.year(year)
+        total, breakdown = await self._category_totals(user_id, period)
         return {"total": total, "breakdown": breakdown}
     
     def compare_periods(self, current: dict, previous: dict):
@@ -394,17 +422,5 @@ class ExpenseService:
         """
         Returns total + breakdown for a given ISO week.
         """
-        q = select(
-            func.sum(Expense.amount_cents).label("total_cents"),
-            Expense.category,
-            func.sum(Expense.amount_cents).label("cat_total_cents"),
-        ).where(Expense.user_id == user_id,
-                extract("year", Expense.local_date) == year,
-                extract("week", Expense.local_date) == week
-        ).group_by(Expense.category)
-
-        res = await self.db.execute(q)
-        rows = res.all()
-        total = sum([r.cat_total_cents or 0 for r in rows]) if rows else 0
-        breakdown = {r.category or "Uncategorized": r.cat_total_cents for r in rows}
+        total, breakdown = await self._category_totals(user_id, Period.iso_week(year, week))
         return {"year": year, "week": week, "total_cents": total, "breakdown": breakdown}
@@ -1,8 +1,7 @@
-import numpy as np
 from sqlalchemy import func, select, extract
 from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
-from app.db.models import Expense
+from app.db.models import ExpenseRollup
 
 class ForecastService:
     def __init__(self, db: AsyncSession):
@@ -11,16 +10,16 @@ class ForecastService:
     async def get_monthly_totals(self, user_id: int, category: str | None = None):
         q = (
             select(
-                extract("year", Expense.local_date).label("year"),
-                extract("month", Expense.local_date).label("month"),
-                func.sum(Expense.amount_cents).label("total_cents")
+                extract("year", ExpenseRollup.local_date).label("year"),
+                extract("month", ExpenseRollup.local_date).label("month"),
+                func.sum(ExpenseRollup.total_cents).label("total_cents")
             )
-            .where(Expense.user_id == user_id)
+            .where(ExpenseRollup.user_id == user_id)
             .group_by("year", "month")
             .order_by("year", "month")
         )
         if category:
-            q = q.where(Expense.category == category)
+            q = q.where(ExpenseRollup.category == category)
 
         res = await self.db.execute(q)
         rows = res.all()
@@ -31,6 +30,8 @@ class ForecastService:
         if len(history) < 3:
             return None  # not enough data
 
+        import numpy as np
+
         # x = month index, y = totals
         y = np.array([v for (_, _, v) in history], dtype=float)
         x = np.arange(len(y))
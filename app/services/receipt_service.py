@@ -0,0 +1,109 @@
+import os
+from typing import NamedTuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Expense, ExpenseReceipt, ReceiptBlob
+from app.db.receipt_blobs import release_statement
+from app.services.expense_service import ExpenseService
+
+
+class StoredReceipt(NamedTuple):
+    sha256: str
+    path: str
+    size_bytes: int
+    file_unique_id: str | None = None
+    file_id: str | None = None
+
+
+class ReceiptService:
+    """
+    Deduplicated receipt storage. A photo Telegram has sent before (same
+    file_unique_id) or with identical bytes (same SHA-256) maps to one
+    ReceiptBlob and one file on disk; each expense using it holds a
+    reference. Deleting an expense releases its reference (see
+    app/db/receipt_blobs.py).
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def find_by_unique_id(self, file_unique_id: str) -> ReceiptBlob | None:
+        q = select(ReceiptBlob).where(ReceiptBlob.file_unique_id == file_unique_id).limit(1)
+        return (await self.db.execute(q)).scalar_one_or_none()
+
+    async def acquire(self, sha256: str, path: str, size_bytes: int,
+                      file_unique_id: str | None = None) -> ReceiptBlob:
+        """
+        Take a reference on the blob for `sha256`, creating it if new.
+        """
+        res = await self.db.execute(
+            update(ReceiptBlob)
+            .where(ReceiptBlob.sha256 == sha256)
+            .values(ref_count=ReceiptBlob.ref_count + 1)
+            .returning(ReceiptBlob)
+        )
+        blob = res.scalar_one_or_none()
+        if blob:
+            if file_unique_id and not blob.file_unique_id:
+                blob.file_unique_id = file_unique_id
+        else:
+            blob = ReceiptBlob(sha256=sha256, path=path, size_bytes=size_bytes,
+                               file_unique_id=file_unique_id, ref_count=1)
+            self.db.add(blob)
+        await self.db.flush()
+        return blob
+
+    async def release(self, path: str):
+        await self.db.execute(release_statement(path))
+
+    async def attach(self, expense_id: str, user_id: int, receipts: list[StoredReceipt]):
+        """
+        Attach one or more stored receipts to the expense, taking a reference
+        on each blob. The first becomes the expense's receipt_path; the rest
+        are linked in expense_receipts. None (and no reference taken) if the
+        expense is gone. FileNotFoundError if a receipt's file was swept since
+        it was stored; the caller stores that photo again.
+        """
+        missing = next((r.path for r in receipts if not os.path.exists(r.path)), None)
+        if missing:
+            raise FileNotFoundError(missing)
+        first = receipts[0]
+        exp = await ExpenseService(self.db).attach_receipt(expense_id, user_id, first.path, first.file_id)
+        if not exp:
+            return None
+        for position, receipt in enumerate(receipts):
+            await self.acquire(receipt.sha256, receipt.path, receipt.size_bytes, receipt.file_unique_id)
+            if position:
+                self.db.add(ExpenseReceipt(
+                    expense_id=expense_id, position=position, path=receipt.path, file_id=receipt.file_id,
+                ))
+        await self.db.flush()
+        return exp
+
+    async def set_file_ids(self, expense_id: str, file_ids: list[str | None]):
+        """
+        Remember the Telegram file_ids of an expense's receipts, given in
+        list_for_expense() order (attach() numbers extra receipts 1, 2, ...).
+        Like set_receipt_file_id, this leaves the data version alone.
+        """
+        await ExpenseService(self.db).set_receipt_file_id(expense_id, file_ids[0])
+        for position, file_id in enumerate(file_ids[1:], start=1):
+            await self.db.execute(
+                update(ExpenseReceipt)
+                .where(ExpenseReceipt.expense_id == expense_id, ExpenseReceipt.position == position)
+                .values(file_id=file_id)
+            )
+
+    async def list_for_expense(self, exp: Expense) -> list[tuple[str, str | None]]:
+        """
+        (path, file_id) for every receipt of the expense, first one first.
+        """
+        if not exp.receipt_path:
+            return []
+        q = select(ExpenseReceipt.path, ExpenseReceipt.file_id).where(
+            ExpenseReceipt.expense_id == exp.id
+        ).order_by(ExpenseReceipt.position)
+        extra = (await self.db.execute(q)).all()
+        return [(exp.receipt_path, exp.receipt_file_id), *((r.path, r.file_id) for r in extra)]
@@ -0,0 +1,223 @@
+import asyncio
+import itertools
+import os
+import shutil
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from loguru import logger
+from sqlalchemy import delete, select, union
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.core import storage
+from app.core.config import settings
+from app.db.models import Expense, ExpenseReceipt, ReceiptBlob
+from app.db.session import ReadSessionLocal
+from app.db.writer import GroupCommitWriter, write_queue
+
+QUARANTINE_DIR = ".quarantine"
+
+
+@dataclass
+class SweepStats:
+    scanned: int = 0
+    quarantined: int = 0
+    quarantined_bytes: int = 0
+    deleted: int = 0
+    reclaimed_bytes: int = 0  # freed on disk: deleted orphans, stale .tmp, expired quarantine
+
+
+def _norm(path: str | Path) -> str:
+    return os.path.normpath(path)
+
+
+def _live_paths_query(paths: list[str] | None = None):
+    """
+    Every receipt path something still points at; only among `paths` if given.
+    """
+    sources = [
+        (Expense.receipt_path, [Expense.receipt_path.is_not(None)]),
+        (ExpenseReceipt.path, []),
+        (ReceiptBlob.path, [ReceiptBlob.ref_count > 0]),
+    ]
+    parts = []
+    for col, where in sources:
+        if paths is not None:
+            where = [*where, col.in_(paths)]
+        parts.append(select(col.label("path")).where(*where))
+    return union(*parts)
+
+
+class ReceiptSweeper:
+    """
+    Reclaims receipt files nothing points at any more: receipts of deleted
+    expenses, blobs whose reference count reached zero and .tmp files left
+    by interrupted saves. Storage is walked incrementally, `batch_size`
+    files per tick(), with the filesystem work in a thread; a full walk is
+    checked against an index of live paths loaded at its start.
+
+    Files younger than `grace` are never touched (they may be a receipt
+    being attached right now). Candidates are re-checked (database and
+    mtime) and moved inside one writer job, so no attach can slip in between
+    the check and the move. Orphans go to data/receipts/.quarantine and are deleted
+    `quarantine_days` later (at once if 0).
+    """
+
+    def __init__(self, read_factory: async_sessionmaker[AsyncSession] = ReadSessionLocal,
+                 writer: GroupCommitWriter = write_queue, batch_size: int = 500,
+                 grace_s: float = 3600, quarantine_days: float = 7):
+        self.read_factory = read_factory
+        self.writer = writer
+        self.batch_size = batch_size
+        self.grace_s = grace_s
+        self.quarantine_s = quarantine_days * 86400
+        self._files: Iterator[tuple[str, int, float]] | None = None
+        self._live: set[str] = set()
+
+    @property
+    def base_dir(self) -> Path:
+        return storage.BASE_DIR
+
+    def _walk(self, root: Path) -> Iterator[tuple[str, int, float]]:
+        stack = [root]
+        while stack:
+            try:
+                entries = list(os.scandir(stack.pop()))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if entry.name != QUARANTINE_DIR:
+                        stack.append(Path(entry.path))
+                elif entry.is_file(follow_symlinks=False):
+                    st = entry.stat(follow_symlinks=False)
+                    yield _norm(entry.path), st.st_size, st.st_mtime
+
+    def _next_batch(self) -> list[tuple[str, int, float]]:
+        batch = list(itertools.islice(self._files, self.batch_size))
+        if len(batch) < self.batch_size:
+            self._files = None  # walk finished; the next tick starts over
+        return batch
+
+    async def _load_live(self):
+        async with self.read_factory() as db:
+            res = await db.stream_scalars(_live_paths_query())
+            self._live = {_norm(p) async for p in res}
+
+    async def tick(self) -> SweepStats:
+        stats = SweepStats()
+        if self._files is None:
+            await self._load_live()
+            self._files = self._walk(self.base_dir)
+            _, stats.reclaimed_bytes = await asyncio.to_thread(self._expire_quarantine)
+
+        batch = await asyncio.to_thread(self._next_batch)
+        stats.scanned = len(batch)
+        cutoff = time.time() - self.grace_s
+        doomed = [(p, size) for p, size, mtime in batch if p.endswith(".tmp") and mtime < cutoff]
+        candidates = [
+            p for p, _, mtime in batch
+            if mtime < cutoff and not p.endswith(".tmp") and p not in self._live
+        ]
+        if candidates:
+            files, size = await self._reclaim_orphans(candidates, cutoff)
+            if self.quarantine_s:
+                stats.quarantined, stats.quarantined_bytes = files, size
+            else:
+                stats.deleted += files
+                stats.reclaimed_bytes += size
+        if doomed:
+            deleted, freed = await asyncio.to_thread(self._unlink_all, doomed)
+            stats.deleted += deleted
+            stats.reclaimed_bytes += freed
+
+        if stats.quarantined or stats.deleted or stats.reclaimed_bytes:
+            logger.info(
+                f"Receipt sweep: scanned {stats.scanned}, quarantined {stats.quarantined} "
+                f"({stats.quarantined_bytes / 1024:.0f} KiB), deleted {stats.deleted}, "
+                f"reclaimed {stats.reclaimed_bytes / 1024:.0f} KiB"
+            )
+        return stats
+
+    async def _reclaim_orphans(self, candidates: list[str], cutoff: float) -> tuple[int, int]:
+        """
+        One writer job, serialized with every attach: drop candidates that
+        became live since the index was loaded or were touched since the
+        walk (a re-sent photo reusing its blob), delete the zero-reference
+        blob rows of the rest and quarantine (or delete) their files.
+        Returns (files, bytes) reclaimed.
+        """
+        async def reclaim(session: AsyncSession):
+            live = {_norm(p) for p in (await session.execute(_live_paths_query(candidates))).scalars()}
+            unreferenced = [p for p in candidates if p not in live]
+            orphans = await asyncio.to_thread(self._still_stale, unreferenced, cutoff)
+            if not orphans:
+                return 0, 0
+            await session.execute(
+                delete(ReceiptBlob).where(ReceiptBlob.path.in_(list(orphans)), ReceiptBlob.ref_count <= 0)
+            )
+            dispose = self._quarantine if self.quarantine_s else self._unlink_all
+            return await asyncio.to_thread(dispose, orphans.items())
+
+        return await self.writer.submit(reclaim)
+
+    @staticmethod
+    def _still_stale(paths: list[str], cutoff: float) -> dict[str, int]:
+        stale = {}
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except FileNotFoundError:
+                continue
+            if st.st_mtime < cutoff:
+                stale[path] = st.st_size
+        return stale
+
+    def _quarantine(self, files) -> tuple[int, int]:
+        """
+        Move (path, size) pairs under .quarantine, keeping their relative
+        path. Returns (files, bytes) moved.
+        """
+        moved = moved_bytes = 0
+        quarantine = self.base_dir / QUARANTINE_DIR
+        for path, size in files:
+            target = quarantine / Path(path).relative_to(_norm(self.base_dir))
+            target.parent.mkdir(parents=True, exist_ok=True)
+            try:
+                shutil.move(path, target)
+            except FileNotFoundError:
+                continue
+            os.utime(target)  # quarantine age counts from now
+            moved += 1
+            moved_bytes += size
+        return moved, moved_bytes
+
+    def _expire_quarantine(self) -> tuple[int, int]:
+        cutoff = time.time() - self.quarantine_s
+        root = self.base_dir / QUARANTINE_DIR
+        expired = [(str(p), p.stat().st_size) for p in root.rglob("*") if p.is_file() and p.stat().st_mtime < cutoff]
+        return self._unlink_all(expired)
+
+    @staticmethod
+    def _unlink_all(files) -> tuple[int, int]:
+        """
+        Delete (path, size) pairs; returns (files, bytes) actually removed.
+        """
+        count = freed = 0
+        for path, size in files:
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                continue
+            count += 1
+            freed += size
+        return count, freed
+
+
+receipt_sweeper = ReceiptSweeper(
+    batch_size=settings.RECEIPT_SWEEP_BATCH,
+    grace_s=settings.RECEIPT_SWEEP_GRACE_MINUTES * 60,
+    quarantine_days=settings.RECEIPT_QUARANTINE_DAYS,
+)
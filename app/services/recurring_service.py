@@ -1,34 +1,22 @@
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import RecurringExpense, Expense
+from app.db.refs import owned_by_ref
+from app.db.unit_of_work import commit_or_flush
+from app.utils.ids import new_id
 from app.utils.dates import local_date_for_now
 from datetime import datetime, timezone, date
-import uuid
 
 class RecurringService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def resolve_recurring_id(self, user_id: int, recurring_ref: str) -> str | None:
-        ref = (recurring_ref or "").strip()
-        if not ref:
+        where = owned_by_ref(RecurringExpense, user_id, recurring_ref)
+        if where is None:
             return None
-        if len(ref) >= 36:
-            q = select(RecurringExpense.id).where(RecurringExpense.id == ref, RecurringExpense.user_id == user_id)
-            res = await self.db.execute(q)
-            return res.scalar_one_or_none()
-
-        q = (
-            select(RecurringExpense.id)
-            .where(RecurringExpense.user_id == user_id, RecurringExpense.id.like(f"{ref}%"))
-            .order_by(RecurringExpense.created_at_utc.desc())
-            .limit(2)
-        )
-        res = await self.db.execute(q)
-        rows = res.scalars().all()
-        if len(rows) != 1:
-            return None
-        return rows[0]
+        res = await self.db.execute(select(RecurringExpense.id).where(*where))
+        return res.scalar_one_or_none()
 
     async def create(self, user_id: int, item_name: str, amount_cents: int, *,
                      currency="CAD", category=None, tags=None, notes=None,
@@ -41,7 +29,7 @@ class RecurringService:
             day_of_week = today.weekday()
 
         rec = RecurringExpense(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             user_id=user_id,
             item_name=item_name,
             amount_cents=amount_cents,
@@ -58,8 +46,7 @@ class RecurringService:
             paused=False,
         )
         self.db.add(rec)
-        await self.db.commit()
-        await self.db.refresh(rec)
+        await commit_or_flush(self.db)
         return rec
 
     def _is_due_today(self, rec: RecurringExpense, today: date) -> bool:
@@ -78,28 +65,27 @@ class RecurringService:
     async def list_all(self, user_id: int):
         q = select(RecurringExpense).where(
             RecurringExpense.user_id == user_id
-        ).order_by(RecurringExpense.created_at_utc.desc())
+        ).order_by(RecurringExpense.created_at_utc.desc(), RecurringExpense.id.desc())
         res = await self.db.execute(q)
         return list(res.scalars().all())
 
     async def update_state(self, recurring_id: str, user_id: int, *, active=None, paused=None):
-        resolved_id = await self.resolve_recurring_id(user_id, recurring_id)
-        if not resolved_id:
-            return None
-        q = select(RecurringExpense).where(
-            RecurringExpense.id == resolved_id,
-            RecurringExpense.user_id == user_id
-        )
-        res = await self.db.execute(q)
-        rec = res.scalar_one_or_none()
-        if not rec:
+        where = owned_by_ref(RecurringExpense, user_id, recurring_id)
+        if where is None:
             return None
+        values = {}
         if active is not None:
-            rec.active = active
+            values["active"] = active
         if paused is not None:
-            rec.paused = paused
-        await self.db.commit()
-        await self.db.refresh(rec)
+            values["paused"] = paused
+        if not values:
+            res = await self.db.execute(select(RecurringExpense).where(*where))
+            return res.scalar_one_or_none()
+        q = update(RecurringExpense).where(*where).values(**values).returning(RecurringExpense)
+        res = await self.db.execute(q)
+        rec = res.scalar_one_or_none()
+        if rec:
+            await commit_or_flush(self.db)
         return rec
 
     async def generate_expense(self, rec: RecurringExpense) -> Expense:
@@ -122,8 +108,7 @@ class RecurringService:
             if rec.remaining == 0:
                 rec.active = False
 
-        await self.db.commit()
-        await self.db.refresh(exp)
+        await commit_or_flush(self.db)
         return exp
 
     async def generate_due_today(self) -> list[Expense]:
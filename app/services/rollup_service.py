@@ -0,0 +1,54 @@
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.models import Expense, ExpenseRollup
+from app.db.rollups import rebuild_statements
+
+class RollupService:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    async def rebuild(self, user_id: int | None = None):
+        """
+        Recompute expense_rollups from the expenses ledger (all users or one).
+        """
+        for stmt in rebuild_statements(user_id):
+            await self.db.execute(stmt)
+        await self.db.commit()
+
+    async def check_consistency(self, user_id: int | None = None) -> list[dict]:
+        """
+        Diff rollups against SUM()/COUNT() over expenses.
+        Returns one entry per (user_id, local_date, category) that disagrees.
+        """
+        category = func.coalesce(Expense.category, "")
+        q_ledger = select(
+            Expense.user_id, Expense.local_date, category.label("category"),
+            func.sum(Expense.amount_cents).label("total_cents"),
+            func.count(Expense.id).label("expense_count"),
+        ).group_by(Expense.user_id, Expense.local_date, category)
+        q_rollup = select(
+            ExpenseRollup.user_id, ExpenseRollup.local_date, ExpenseRollup.category,
+            ExpenseRollup.total_cents, ExpenseRollup.expense_count,
+        )
+        if user_id is not None:
+            q_ledger = q_ledger.where(Expense.user_id == user_id)
+            q_rollup = q_rollup.where(ExpenseRollup.user_id == user_id)
+
+        ledger = {(r.user_id, r.local_date, r.category): (r.total_cents, r.expense_count)
+                  for r in (await self.db.execute(q_ledger)).all()}
+        rollups = {(r.user_id, r.local_date, r.category): (r.total_cents, r.expense_count)
+                   for r in (await self.db.execute(q_rollup)).all()}
+
+        mismatches = []
+        for key in sorted(set(ledger) | set(rollups), key=lambda k: (k[0], k[1], k[2])):
+            expected = ledger.get(key, (0, 0))
+            actual = rollups.get(key, (0, 0))
+            if expected != actual:
+                mismatches.append({
+                    "user_id": key[0],
+                    "local_date": key[1],
+                    "category": key[2] or None,
+                    "expected": expected,
+                    "actual": actual,
+                })
+        return mismatches
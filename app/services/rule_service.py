@@ -1,62 +1,46 @@
-from sqlalchemy import select
+from sqlalchemy import delete, select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.db.models import CategoryRule
+from app.db.refs import owned_by_ref
+from app.db.unit_of_work import commit_or_flush
+from app.utils.ids import new_id
 from app.services.global_rules import GLOBAL_RULES
-import uuid
 
 class RuleService:
     def __init__(self, db: AsyncSession):
         self.db = db
 
     async def resolve_rule_id(self, user_id: int, rule_ref: str) -> str | None:
-        ref = (rule_ref or "").strip()
-        if not ref:
+        where = owned_by_ref(CategoryRule, user_id, rule_ref)
+        if where is None:
             return None
-        if len(ref) >= 36:
-            q = select(CategoryRule.id).where(CategoryRule.id == ref, CategoryRule.user_id == user_id)
-            res = await self.db.execute(q)
-            return res.scalar_one_or_none()
-
-        q = (
-            select(CategoryRule.id)
-            .where(CategoryRule.user_id == user_id, CategoryRule.id.like(f"{ref}%"))
-            .order_by(CategoryRule.created_at_utc.desc())
-            .limit(2)
-        )
-        res = await self.db.execute(q)
-        rows = res.scalars().all()
-        if len(rows) != 1:
-            return None
-        return rows[0]
+        res = await self.db.execute(select(CategoryRule.id).where(*where))
+        return res.scalar_one_or_none()
 
     async def list_rules(self, user_id: int):
-        q = select(CategoryRule).where(CategoryRule.user_id == user_id).order_by(CategoryRule.created_at_utc)
+        q = select(CategoryRule).where(CategoryRule.user_id == user_id).order_by(CategoryRule.created_at_utc, CategoryRule.id)
         res = await self.db.execute(q)
         return list(res.scalars().all())
 
     async def add_rule(self, user_id: int, keyword: str, category: str) -> CategoryRule:
         r = CategoryRule(
-            id=str(uuid.uuid4()),
+            id=new_id(),
             user_id=user_id,
             keyword=keyword.lower(),
             category=category,
         )
         self.db.add(r)
-        await self.db.commit()
-        await self.db.refresh(r)
+        await commit_or_flush(self.db)
         return r
 
     async def delete_rule(self, user_id: int, rule_id: str):
-        resolved_id = await self.resolve_rule_id(user_id, rule_id)
-        if not resolved_id:
+        where = owned_by_ref(CategoryRule, user_id, rule_id)
+        if where is None:
             return None
-        q = select(CategoryRule).where(CategoryRule.id == resolved_id, CategoryRule.user_id == user_id)
-        res = await self.db.execute(q)
+        res = await self.db.execute(delete(CategoryRule).where(*where).returning(CategoryRule))
         r = res.scalar_one_or_none()
-        if not r:
-            return None
-        await self.db.delete(r)
-        await self.db.commit()
+        if r:
+            await commit_or_flush(self.db)
         return r
 
     async def suggest_category(self, user_id: int, text: str) -> str | None:
@@ -1,4 +1,5 @@
-from datetime import datetime
+from datetime import date, datetime, timedelta
+from typing import NamedTuple
 import zoneinfo
 from app.core.config import settings
 
@@ -9,3 +10,31 @@ def to_local_date_YYYY_MM_DD(dt_utc: datetime) -> str:
 def local_date_for_now():
     tz = zoneinfo.ZoneInfo(settings.LOCAL_TIMEZONE)
     return datetime.now(tz).date()
+
+
+class Period(NamedTuple):
+    """
+    Half-open local-date range: start <= local_date < end.
+    """
+    start: date
+    end: date
+
+    @classmethod
+    def month(cls, year: int, month: int) -> "Period":
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return cls(date(year, month, 1), end)
+
+    @classmethod
+    def year(cls, year: int) -> "Period":
+        return cls(date(year, 1, 1), date(year + 1, 1, 1))
+
+    @classmethod
+    def iso_week(cls, year: int, week: int) -> "Period":
+        start = date.fromisocalendar(year, week, 1)
+        return cls(start, start + timedelta(days=7))
+
+    @classmethod
+    def for_export(cls, year: int | None = None, month: int | None = None) -> "Period | None":
+        if not year:
+            return None
+        return cls.month(year, month) if month else cls.year(year)
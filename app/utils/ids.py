@@ -0,0 +1,52 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+_lock = threading.Lock()
+_last_ms = 0
+_seq = 0
+
+
+def uuid7(ms: int | None = None) -> uuid.UUID:
+    """
+    RFC 9562 UUIDv7: 48-bit Unix millisecond timestamp, version, 12-bit
+    sequence, variant, 62 random bits. Ids generated by this process are
+    strictly increasing, also within the same millisecond.
+    Pass `ms` to build an id for a past timestamp (used by migrations).
+    """
+    global _last_ms, _seq
+    if ms is None:
+        with _lock:
+            now = time.time_ns() // 1_000_000
+            if now > _last_ms:
+                _last_ms, _seq = now, int.from_bytes(os.urandom(2), "big") & 0x3FF
+            else:
+                _seq += 1
+                if _seq > 0xFFF:  # sequence exhausted: borrow the next millisecond
+                    _last_ms, _seq = _last_ms + 1, 0
+            ms, seq = _last_ms, _seq
+    else:
+        seq = int.from_bytes(os.urandom(2), "big") & 0xFFF
+
+    rand_b = int.from_bytes(os.urandom(8), "big") & ((1 << 62) - 1)
+    value = (ms & ((1 << 48) - 1)) << 80 | 0x7 << 76 | seq << 64 | 0b10 << 62 | rand_b
+    return uuid.UUID(int=value)
+
+
+def new_id() -> str:
+    return str(uuid7())
+
+
+def id_for_timestamp(dt: datetime) -> str:
+    if dt.tzinfo is None:  # SQLite hands back naive UTC datetimes
+        dt = dt.replace(tzinfo=timezone.utc)
+    return str(uuid7(ms=int(dt.timestamp() * 1000)))
+
+
+def is_time_ordered(value: str) -> bool:
+    try:
+        return uuid.UUID(value).version == 7
+    except ValueError:
+        return False
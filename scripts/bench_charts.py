@@ -0,0 +1,71 @@
+"""
+Compare the chart backends (CHART_BACKEND) on the standard report charts.
+
+    python scripts/bench_charts.py [--repeat 50]
+
+Each backend runs in a fresh interpreter so import cost and memory are
+its own: "import ms" is the first chart including imports, "render ms"
+the median of `--repeat` later ones, "rss MiB" the process's peak
+resident memory and "png KiB" the output size.
+"""
+import argparse
+import json
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+BREAKDOWN = {
+    "Food": 48250, "Transport": 12000, "Bills": 95000, "Health": 8000,
+    "Entertainment": 15500, "Shopping": 30100, "": 4200,
+}
+PER_MONTH = {m: 150000 + 20000 * (m % 4) for m in range(1, 13)}
+CHARTS = [
+    ("pie", BREAKDOWN, "2026-03 Expenses by Category"),
+    ("bar", PER_MONTH, "2026 Monthly Spending Trend"),
+]
+
+
+def measure(backend: str, repeat: int) -> dict:
+    from app.core.charts import render_png
+
+    t0 = time.perf_counter()
+    render_png("pie", BREAKDOWN, "warm-up", backend)
+    results = {"import_ms": (time.perf_counter() - t0) * 1000}
+    for kind, data, title in CHARTS:
+        samples = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            png = render_png(kind, data, title, backend)
+            samples.append((time.perf_counter() - t0) * 1000)
+        results[kind] = {"ms": statistics.median(samples), "bytes": len(png)}
+    results["rss_mib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return results
+
+
+def main(repeat: int):
+    print(f"{'backend':<12}{'chart':<6}{'import ms':>10}{'render ms':>10}{'rss MiB':>9}{'png KiB':>9}")
+    for backend in ("matplotlib", "pillow"):
+        proc = subprocess.run(
+            [sys.executable, __file__, "--worker", backend, "--repeat", str(repeat)],
+            cwd=ROOT, env={"PYTHONPATH": str(ROOT), "TELEGRAM_BOT_TOKEN": "0:bench"},
+            capture_output=True, text=True, check=True,
+        )
+        r = json.loads(proc.stdout)
+        for kind, _, _ in CHARTS:
+            print(f"{backend:<12}{kind:<6}{r['import_ms']:>10.0f}{r[kind]['ms']:>10.1f}"
+                  f"{r['rss_mib']:>9.0f}{r[kind]['bytes'] / 1024:>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=50)
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        print(json.dumps(measure(args.worker, args.repeat)))
+    else:
+        main(args.repeat)
@@ -0,0 +1,133 @@
+"""
+Compare the streaming CSV/XLSX/Parquet exports against the old pandas path.
+
+    python scripts/bench_export.py [--rows 50000]
+
+The pandas path is reproduced here as it was: load ORM rows, build a list
+of dicts, a DataFrame, then to_csv()/to_excel() into memory. The streaming
+path is what /export runs now. Time comes from an untraced run; peak memory
+is traced Python allocations (tracemalloc) from a second run. "read s" is
+how long the file takes to load back into a DataFrame.
+"""
+import argparse
+import asyncio
+import random
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone
+from io import BytesIO
+from pathlib import Path
+
+from sqlalchemy import insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core import exports
+from app.db.base import Base
+from app.db.models import Expense
+from app.db.session import make_engine, sqlite_pragmas
+from app.services.expense_service import ExpenseService
+from app.utils.ids import new_id
+
+
+async def _fill(eng, rows: int):
+    start = date.today() - timedelta(days=3 * 365)
+    async with eng.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        for offset in range(0, rows, 5000):
+            batch = []
+            for _ in range(min(5000, rows - offset)):
+                day = start + timedelta(days=random.randrange(3 * 365))
+                batch.append({
+                    "id": new_id(), "user_id": 1, "item_name": f"Item {random.randrange(500)}",
+                    "amount_cents": random.randrange(100, 50000), "currency": "CAD",
+                    "category": random.choice(["Food", "Transport", "Bills", None]),
+                    "tags": random.choice(["work", "family", None]),
+                    "notes": f"merchant:shop{random.randrange(2000)}",
+                    "created_at_utc": datetime.combine(day, datetime.min.time(), timezone.utc),
+                    "local_date": day,
+                })
+            await conn.execute(insert(Expense), batch)
+
+
+async def _pandas_export(session: AsyncSession, file_format: str) -> int:
+    import pandas as pd
+
+    res = await session.execute(select(Expense).where(Expense.user_id == 1).order_by(Expense.local_date.asc()))
+    data = [{
+        "ID": e.id,
+        "Date": e.local_date.isoformat(),
+        "Item": e.item_name,
+        "Amount": f"{e.amount_cents/100:.2f} {e.currency}",
+        "Category": e.category or "",
+        "Tags": e.tags or "",
+        "Notes": e.notes or "",
+        "Receipt": e.receipt_path or "",
+    } for e in res.scalars().all()]
+    df = pd.DataFrame(data)
+    if file_format == "xlsx":
+        buffer = BytesIO()
+        df.to_excel(buffer, index=False)
+        return len(buffer.getvalue())
+    return len(df.to_csv(index=False).encode("utf-8"))
+
+
+async def _streaming_export(session: AsyncSession, file_format: str) -> int:
+    with exports.spooled_file() as out:
+        await exports.WRITERS[file_format](ExpenseService(session).iter_export_rows(1), out)
+        return out.tell()
+
+
+async def _read_back(eng, file_format: str) -> float | None:
+    import pandas as pd
+
+    readers = {"csv": pd.read_csv, "parquet": pd.read_parquet}
+    if file_format not in readers:
+        return None
+    async with AsyncSession(eng) as session:
+        with exports.spooled_file() as out:
+            await exports.WRITERS[file_format](ExpenseService(session).iter_export_rows(1), out)
+            out.seek(0)
+            data = BytesIO(out.read())
+    t0 = time.perf_counter()
+    readers[file_format](data)
+    return time.perf_counter() - t0
+
+
+async def _measure(eng, export, file_format: str) -> tuple[float, float, int]:
+    # Timed and traced separately: tracemalloc slows both paths several-fold.
+    async with AsyncSession(eng) as session:
+        t0 = time.perf_counter()
+        size = await export(session, file_format)
+        elapsed = time.perf_counter() - t0
+    async with AsyncSession(eng) as session:
+        tracemalloc.start()
+        await export(session, file_format)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return elapsed, peak / 1024 / 1024, size
+
+
+async def main(rows: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        eng = make_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}", sqlite_pragmas())
+        await _fill(eng, rows)
+        print(f"{rows} expenses")
+        print(f"{'path':<20}{'seconds':>10}{'peak MiB':>10}{'file KiB':>10}{'read s':>8}")
+        for file_format in ("csv", "xlsx", "parquet"):
+            paths = [("streaming", _streaming_export)]
+            if file_format != "parquet":
+                paths.insert(0, ("pandas", _pandas_export))
+            for name, export in paths:
+                elapsed, peak, size = await _measure(eng, export, file_format)
+                read = await _read_back(eng, file_format) if name == "streaming" else None
+                read_col = f"{read:>8.2f}" if read is not None else f"{'-':>8}"
+                print(f"{name + ' ' + file_format:<20}{elapsed:>10.2f}{peak:>10.1f}{size / 1024:>10.0f}{read_col}")
+        await eng.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=50_000)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows))
@@ -0,0 +1,102 @@
+"""
+Compare expense search through the FTS5 index against the old LIKE scan.
+
+    python scripts/bench_search.py [--rows 100000] [--repeat 20]
+
+Fills a fresh database file with `--rows` expenses for one user (plus a
+tenth of that spread over other users), then times search_expenses for a
+few keywords both ways: common words, a long-tail merchant, a prefix and
+a word that never matches. Latencies are medians in milliseconds.
+"""
+import argparse
+import asyncio
+import random
+import statistics
+import tempfile
+import time
+from datetime import date, datetime, timedelta, timezone
+from pathlib import Path
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.base import Base
+from app.db.models import Expense
+from app.db.session import make_engine, sqlite_pragmas
+from app.services.expense_service import ExpenseService
+from app.utils.ids import new_id
+
+ITEMS = ["Coffee", "Groceries", "Uber ride", "Pizza", "Netflix", "Gas", "Pharmacy", "Books", "Lunch", "Parking"]
+CATEGORIES = ["Food", "Transport", "Bills", "Health", "Entertainment", "Shopping", None]
+TAGS = ["work", "family", "travel", "weekly", None]
+MERCHANTS = ["starbucks", "costco", "shell", "amazon", "walmart", "tims", "loblaws"]
+SHOPS = [f"shop{i:04d}" for i in range(5000)]  # long tail: each one is rare
+KEYWORDS = ["coffee", "starb", "travel", "shop0042", "shop00", "zzz"]
+
+
+def _rows(user_id: int, count: int):
+    start = date.today() - timedelta(days=730)
+    for _ in range(count):
+        day = start + timedelta(days=random.randrange(730))
+        yield {
+            "id": new_id(),
+            "user_id": user_id,
+            "item_name": random.choice(ITEMS),
+            "amount_cents": random.randrange(100, 20000),
+            "currency": "CAD",
+            "category": random.choice(CATEGORIES),
+            "tags": random.choice(TAGS),
+            "notes": f"merchant:{random.choice(MERCHANTS if random.random() < 0.5 else SHOPS)}",
+            "created_at_utc": datetime.combine(day, datetime.min.time(), timezone.utc),
+            "local_date": day,
+        }
+
+
+async def _fill(eng, rows: int):
+    async with eng.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        batch: list[dict] = []
+        others = [(uid, rows // 10 // 9 or 1) for uid in range(2, 11)]
+        for user_id, count in [(1, rows), *others]:
+            for row in _rows(user_id, count):
+                batch.append(row)
+                if len(batch) == 5000:
+                    await conn.execute(insert(Expense), batch)
+                    batch.clear()
+        if batch:
+            await conn.execute(insert(Expense), batch)
+
+
+async def _time(svc: ExpenseService, search, keyword: str, repeat: int) -> tuple[float, int]:
+    samples, found = [], 0
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        found = len(await search(keyword))
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples), found
+
+
+async def main(rows: int, repeat: int):
+    with tempfile.TemporaryDirectory() as tmp:
+        eng = make_engine(f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}", sqlite_pragmas())
+        t0 = time.perf_counter()
+        await _fill(eng, rows)
+        print(f"filled {rows} rows for user 1 in {time.perf_counter() - t0:.1f}s")
+
+        async with AsyncSession(eng) as session:
+            svc = ExpenseService(session)
+            print(f"{'keyword':<10} {'like ms':>9} {'fts ms':>9} {'ranked ms':>10} {'hits':>5}")
+            for kw in KEYWORDS:
+                like_ms, _ = await _time(svc, lambda k: svc._search_like(1, k, 10), kw, repeat)
+                fts_ms, hits = await _time(svc, lambda k: svc.search_expenses(1, k), kw, repeat)
+                ranked_ms, _ = await _time(svc, lambda k: svc.search_expenses(1, k, ranked=True), kw, repeat)
+                print(f"{kw:<10} {like_ms:>9.2f} {fts_ms:>9.2f} {ranked_ms:>10.2f} {hits:>5}")
+        await eng.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    asyncio.run(main(args.rows, args.repeat))
@@ -0,0 +1,109 @@
+"""
+Compare write throughput and latency of the SQLite connection profiles.
+
+    python scripts/bench_sqlite_profile.py [--writers 8] [--inserts 200] [--readers 2]
+
+Each writer inserts expenses through ExpenseService on its own session
+(one commit per expense) while readers keep running monthly summaries,
+against a fresh database file per profile. The last row routes the same
+inserts through the group-commit writer instead.
+"""
+import argparse
+import asyncio
+import statistics
+import tempfile
+import time
+from pathlib import Path
+
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.ext.asyncio import async_sessionmaker, AsyncSession
+
+from app.db.base import Base
+from app.db.session import make_engine, sqlite_pragmas
+from app.db.writer import GroupCommitWriter
+from app.services.expense_service import ExpenseService
+from app.utils.dates import local_date_for_now
+
+
+async def _bench(profile: str, writers: int, inserts: int, readers: int, group_commit: bool = False) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite+aiosqlite:///{Path(tmp) / 'bench.db'}"
+        eng = make_engine(url, sqlite_pragmas(profile))
+        async with eng.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        factory = async_sessionmaker(bind=eng, expire_on_commit=False, class_=AsyncSession)
+        queue = GroupCommitWriter(eng)
+        if group_commit:
+            await queue.start()
+
+        latencies: list[float] = []
+        errors = 0
+        done = asyncio.Event()
+
+        async def queued_writer(user_id: int):
+            async def one(i: int):
+                t0 = time.perf_counter()
+                await queue.submit(lambda session: ExpenseService(session).add_expense_text(
+                    user_id=user_id, item_name=f"Item {i}", amount_cents=100 + i))
+                latencies.append(time.perf_counter() - t0)
+            for i in range(0, inserts, 10):  # each writer keeps a few requests in flight
+                await asyncio.gather(*(one(j) for j in range(i, min(i + 10, inserts))))
+
+        async def writer(user_id: int):
+            nonlocal errors
+            async with factory() as session:
+                svc = ExpenseService(session)
+                for i in range(inserts):
+                    t0 = time.perf_counter()
+                    try:
+                        await svc.add_expense_text(user_id=user_id, item_name=f"Item {i}", amount_cents=100 + i)
+                    except OperationalError:
+                        errors += 1
+                        await session.rollback()
+                        continue
+                    latencies.append(time.perf_counter() - t0)
+
+        async def reader(user_id: int):
+            today = local_date_for_now()
+            async with factory() as session:
+                svc = ExpenseService(session)
+                while not done.is_set():
+                    await svc.monthly_summary(user_id, today.year, today.month)
+                    await session.rollback()
+                    await asyncio.sleep(0)
+
+        reader_tasks = [asyncio.create_task(reader(u)) for u in range(1, readers + 1)]
+        t0 = time.perf_counter()
+        write = queued_writer if group_commit else writer
+        await asyncio.gather(*(write(u) for u in range(1, writers + 1)))
+        elapsed = time.perf_counter() - t0
+        done.set()
+        await asyncio.gather(*reader_tasks)
+        await queue.stop()
+        await eng.dispose()
+
+    latencies.sort()
+    return {
+        "profile": profile + ("+group" if group_commit else ""),
+        "inserts_per_s": len(latencies) / elapsed,
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "errors": errors,
+    }
+
+
+async def run(writers: int, inserts: int, readers: int):
+    results = [await _bench(p, writers, inserts, readers) for p in ("default", "production")]
+    results.append(await _bench("production", writers, inserts, readers, group_commit=True))
+    print(f"{writers} writers × {inserts} inserts, {readers} readers")
+    print(f"{'profile':<18}{'inserts/s':>12}{'p50 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for r in results:
+        print(f"{r['profile']:<18}{r['inserts_per_s']:>12.0f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['errors']:>8}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=8)
+    parser.add_argument("--inserts", type=int, default=200)
+    parser.add_argument("--readers", type=int, default=2)
+    args = parser.parse_args()
+    asyncio.run(run(args.writers, args.inserts, args.readers))
@@ -0,0 +1,73 @@
+"""
+Measure how long `import app.bot.main` takes and which modules it pulls in.
+
+    python scripts/bench_startup.py [--budget-ms 4000] [--top 15]
+
+Runs the import in a fresh interpreter with `-X importtime` (best of
+`--repeat` runs) and prints the slowest top-level imports by cumulative
+time. Exits non-zero when the total is over `--budget-ms` or when one of
+the HEAVY libraries, which should only load on first use of charts,
+exports, forecasts or receipts, is imported at startup.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+HEAVY = ("pandas", "matplotlib", "numpy", "PIL", "openpyxl", "pyarrow")
+
+
+def import_times(module: str = "app.bot.main") -> dict[str, int]:
+    """
+    {module: cumulative microseconds} for one cold import of `module`.
+    """
+    env = {**os.environ, "TELEGRAM_BOT_TOKEN": os.environ.get("TELEGRAM_BOT_TOKEN", "0:bench")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            times[name.strip()] = int(cumulative)
+    return times
+
+
+def heavy_modules(times: dict[str, int]) -> list[str]:
+    return sorted({name for name in times if name.split(".")[0] in HEAVY})
+
+
+def main(budget_ms: int, top: int, repeat: int) -> int:
+    runs = [import_times() for _ in range(repeat)]
+    best = min(runs, key=lambda t: t["app.bot.main"])
+    total_ms = best["app.bot.main"] / 1000
+
+    print(f"{'module':<50}{'cumulative ms':>15}")
+    # Third-party packages by their top-level name, plus the app's own modules.
+    roots = [name for name in best if "." not in name or name.startswith("app.")]
+    for name in sorted(roots, key=best.get, reverse=True)[:top]:
+        print(f"{name:<50}{best[name] / 1000:>15.1f}")
+    print(f"\nimport app.bot.main: {total_ms:.0f} ms (budget {budget_ms} ms)")
+
+    heavy = heavy_modules(best)
+    if heavy:
+        print(f"FAIL: heavy modules imported at startup: {', '.join(heavy[:10])}")
+        return 1
+    if total_ms > budget_ms:
+        print("FAIL: over budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--budget-ms", type=int, default=4000)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    sys.exit(main(args.budget_ms, args.top, args.repeat))
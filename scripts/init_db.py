@@ -1,10 +1,12 @@
 import asyncio
 from app.db.session import engine
 from app.db.base import Base
+from app.db.migrations import run_migrations
 
 async def run():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
     print("✅ DB initialized")
 
 if __name__ == "__main__":
@@ -0,0 +1,15 @@
+import asyncio
+from app.db.session import engine
+from app.db.base import Base
+from app.db.migrations import rekey_time_ordered_ids, run_migrations
+
+async def run():
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+        counts = await conn.run_sync(rekey_time_ordered_ids)
+    for table, n in counts.items():
+        print(f"✅ {table}: {n} ids re-keyed to UUIDv7")
+
+if __name__ == "__main__":
+    asyncio.run(run())
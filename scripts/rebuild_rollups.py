@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+from app.db.session import engine, SessionLocal
+from app.db.base import Base
+from app.db.migrations import run_migrations
+from app.services.rollup_service import RollupService
+
+async def run(check_only: bool, user_id: int | None):
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
+
+    async with SessionLocal() as session:
+        svc = RollupService(session)
+        if not check_only:
+            await svc.rebuild(user_id)
+            print("✅ Rollups rebuilt" + (f" for user {user_id}" if user_id else ""))
+
+        mismatches = await svc.check_consistency(user_id)
+        if not mismatches:
+            print("✅ Rollups consistent with expenses")
+            return 0
+        for m in mismatches:
+            print(
+                f"❌ user={m['user_id']} date={m['local_date']} category={m['category'] or '-'} "
+                f"expected={m['expected']} actual={m['actual']}"
+            )
+        print(f"{len(mismatches)} mismatched rollup rows (run without --check to rebuild)")
+        return 1
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild or verify expense_rollups")
+    parser.add_argument("--check", action="store_true", help="only diff rollups against expenses")
+    parser.add_argument("--user", type=int, default=None, help="limit to one user id")
+    args = parser.parse_args()
+    raise SystemExit(asyncio.run(run(args.check, args.user)))
@@ -1,11 +1,13 @@
 import asyncio
 from app.db.session import engine, SessionLocal
 from app.db.base import Base
+from app.db.migrations import run_migrations
 from app.services.category_service import CategoryService
 
 async def run():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(run_migrations)
 
     async with SessionLocal() as session:
         cs = CategoryService(session)
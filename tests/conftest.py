@@ -0,0 +1,30 @@
+import pytest_asyncio
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+from app.db.base import Base
+
+
+@pytest_asyncio.fixture
+async def engine(tmp_path):
+    """
+    A file-backed SQLite database with the full schema, for tests that need
+    several connections (the group-commit writer, read pools, background jobs).
+    """
+    eng = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+    async with eng.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    yield eng
+    await eng.dispose()
+
+
+@pytest_asyncio.fixture
+async def db_session() -> AsyncSession:
+    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
+    async with session_factory() as session:
+        yield session
+
+    await engine.dispose()
@@ -0,0 +1,24 @@
+from datetime import date
+
+from app.db.models import Expense
+from app.services.expense_service import ExpenseService
+
+
+def expense_row(user_id: int, amount_cents: int, local_date: date, category: str | None = "Food") -> Expense:
+    return Expense(
+        user_id=user_id,
+        item_name="Spend",
+        amount_cents=amount_cents,
+        currency="CAD",
+        category=category,
+        local_date=local_date,
+    )
+
+
+def add_coffee(user_id: int, cents: int):
+    """
+    A writer job that adds a "Coffee" expense.
+    """
+    return lambda session: ExpenseService(session).add_expense_text(
+        user_id=user_id, item_name="Coffee", amount_cents=cents
+    )
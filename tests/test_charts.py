@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+from app.core.chart_cache import ChartCache
+from app.core.chart_renderer import ChartRenderer
+
+PNG_MAGIC = b"\x89PNG\r\n\x1a\n"
+
+
+@pytest.mark.asyncio
+async def test_renderer_draws_in_worker_processes():
+    renderer = ChartRenderer(workers=2)
+    await renderer.start()
+    try:
+        pie, bar = await asyncio.gather(
+            renderer.render("pie", {"Food": 1250, "Bills": 4000}, "March"),
+            renderer.render("bar", {1: 1000, 2: 2500, 3: 500}, "Trend"),
+        )
+    finally:
+        await renderer.stop()
+
+    assert pie.startswith(PNG_MAGIC) and bar.startswith(PNG_MAGIC)
+    assert not renderer.running
+
+
+@pytest.mark.asyncio
+async def test_renderer_draws_inline_when_not_started():
+    png = await ChartRenderer().render("pie", {"Food": 100}, "Inline")
+    assert png.startswith(PNG_MAGIC)
+
+
+def test_chart_cache_keys_on_content_and_evicts_oldest():
+    cache = ChartCache(max_entries=2)
+    march = cache.key("pie", {"Food": 100, "Bills": 200}, "March")
+
+    assert march == cache.key("pie", {"Bills": 200, "Food": 100}, "March")
+    assert march != cache.key("pie", {"Food": 100, "Bills": 201}, "March")
+    assert march != cache.key("bar", {"Food": 100, "Bills": 200}, "March")
+
+    cache.put(march, b"a")
+    cache.put("april", b"b")
+    cache.get(march)
+    cache.put("may", b"c")
+    assert cache.get("april") is None
+    assert cache.get(march).png == b"a"
+
+
+@pytest.mark.parametrize("kind, data", [("pie", {"Food": 1250, "": 300}), ("bar", {1: 1000, 12: 2500}), ("pie", {})])
+def test_pillow_backend_draws_same_sized_pngs(kind, data):
+    from io import BytesIO
+    from PIL import Image
+    from app.core.charts import render_png
+
+    png = render_png(kind, data, "Title", backend="pillow")
+
+    assert png.startswith(PNG_MAGIC)
+    assert Image.open(BytesIO(png)).size == ((600, 600) if kind == "pie" else (800, 500))
+
+
+def test_renderer_rejects_unknown_backend():
+    with pytest.raises(ValueError):
+        ChartRenderer(backend="svg")
@@ -0,0 +1,133 @@
+import asyncio
+from datetime import date
+from io import BytesIO
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.bot.export_jobs import ExportJob, ExportQueue
+from app.core import exports
+from app.core.exports import SpooledInputFile
+from app.db.writer import GroupCommitWriter
+from app.services.expense_service import ExpenseService
+from helpers import add_coffee, expense_row
+
+
+@pytest.mark.asyncio
+async def test_streaming_csv_export(db_session: AsyncSession):
+
+    svc = ExpenseService(db_session)
+    february = [expense_row(1, 1000 + i, date(2026, 2, 1 + i % 28)) for i in range(25)]
+    db_session.add_all([*february, expense_row(1, 999, date(2025, 12, 31))])
+    await db_session.commit()
+    last = await svc.update_note(expense_id=february[-1].ref, user_id=1, note='said "hi", left')
+
+    chunks = []
+
+    async def recorded():
+        async for chunk in svc.iter_export_rows(1, year=2026, month=2, chunk_size=10):
+            chunks.append(len(chunk))
+            yield chunk
+
+    with exports.spooled_file() as out:
+        count = await exports.write_csv(recorded(), out)
+        upload = b"".join([c async for c in exports.SpooledInputFile(out, "x.csv", chunk_size=64).read(None)])
+
+    assert count == 25
+    assert chunks == [10, 10, 5]
+    lines = upload.decode("utf-8").splitlines()
+    assert lines[0] == "ID,Date,Item,Amount,Category,Tags,Notes,Receipt"
+    assert len(lines) == 26
+    assert f'{last.id},{last.local_date.isoformat()},Spend,{last.amount_cents/100:.2f} CAD,Food,,"said ""hi"", left",' in lines
+
+
+@pytest.mark.asyncio
+async def test_write_only_xlsx_export_has_numeric_amounts(db_session: AsyncSession):
+    from openpyxl import load_workbook
+
+    svc = ExpenseService(db_session)
+    db_session.add_all([expense_row(1, 1234, date(2026, 3, 2)), expense_row(1, 50, date(2026, 3, 1), category=None)])
+    await db_session.commit()
+
+    out = BytesIO()
+    count = await exports.write_xlsx(svc.iter_export_rows(1, year=2026), out)
+    rows = list(load_workbook(out).active.iter_rows(values_only=True))
+
+    assert count == 2
+    assert rows[0] == tuple(exports.XLSX_HEADER)
+    assert [(r[1].date(), r[3], r[4], r[5]) for r in rows[1:]] == [
+        (date(2026, 3, 1), 0.5, "CAD", None),
+        (date(2026, 3, 2), 12.34, "CAD", "Food"),
+    ]
+
+
+@pytest.mark.asyncio
+async def test_parquet_export_has_typed_columns(db_session: AsyncSession, monkeypatch):
+    pq = pytest.importorskip("pyarrow.parquet")
+
+    monkeypatch.setattr(exports, "PARQUET_ROW_GROUP_ROWS", 2)
+    svc = ExpenseService(db_session)
+    db_session.add_all([expense_row(1, 100 * i, date(2026, 4, i), category=None if i == 3 else "Food") for i in range(1, 6)])
+    await db_session.commit()
+
+    out = BytesIO()
+    count = await exports.write_parquet(svc.iter_export_rows(1, year=2026, chunk_size=2), out)
+    out.seek(0)
+    parquet = pq.ParquetFile(out)
+    table = parquet.read()
+
+    assert count == 5
+    assert parquet.metadata.num_row_groups == 3
+    assert str(table.schema.field("date").type) == "date32[day]"
+    assert str(table.schema.field("amount_cents").type) == "int64"
+    assert str(table.schema.field("category").type).startswith("dictionary")
+    assert table.column("amount_cents").to_pylist() == [100, 200, 300, 400, 500]
+    assert table.column("category").to_pylist() == ["Food", "Food", None, "Food", "Food"]
+    assert table.column("date").to_pylist()[0] == date(2026, 4, 1)
+
+
+class ExportTarget:
+    def __init__(self):
+        self.documents = []
+        self.texts = []
+
+    async def answer(self, text, **kwargs):
+        self.texts.append(text)
+        return SimpleNamespace(edit_text=_noop, delete=_noop)
+
+    async def answer_document(self, document, **kwargs):
+        self.documents.append(document)
+        return SimpleNamespace(document=SimpleNamespace(file_id=f"file-{len(self.documents)}"))
+
+
+async def _noop(*args, **kwargs):
+    pass
+
+
+@pytest.mark.asyncio
+async def test_export_queue_reuses_file_until_data_changes(engine):
+    factory = async_sessionmaker(bind=engine, expire_on_commit=False)
+    await GroupCommitWriter(engine).submit(add_coffee(1, 450))
+    queue = ExportQueue(session_factory=factory, workers=1)
+    target = ExportTarget()
+
+    async def export():
+        async with factory() as db:
+            await queue.submit(target, db, ExportJob(1, "csv", None, None, "all"))
+
+    await queue.start()
+    try:
+        await export()
+        await asyncio.sleep(0.2)
+        await export()
+        await GroupCommitWriter(engine).submit(add_coffee(1, 900))
+        await export()
+        await asyncio.sleep(0.2)
+    finally:
+        await queue.stop()
+
+    built, reused, rebuilt = target.documents
+    assert isinstance(built, SpooledInputFile) and isinstance(rebuilt, SpooledInputFile)
+    assert reused == "file-1"
+    assert target.texts == ["⏳ Building your export…"] * 2
@@ -2,6 +2,7 @@ from types import SimpleNamespace
 
 import pytest
 
+from app.bot.handlers import expenses as expenses_handler
 from app.bot.handlers import recurring as recurring_handler
 from app.bot.handlers import reports as reports_handler
 
@@ -29,6 +30,11 @@ class DummyCallback:
         self.answer_calls.append({"text": text, "kwargs": kwargs})
 
 
+class InlineWriter:
+    async def submit(self, job):
+        return await job(None)
+
+
 @pytest.mark.asyncio
 async def test_recurring_quick_action_pause_success(monkeypatch):
     class FakeRecurringService:
@@ -42,9 +48,10 @@ async def test_recurring_quick_action_pause_success(monkeypatch):
             return object()
 
     monkeypatch.setattr(recurring_handler, "RecurringService", FakeRecurringService)
+    monkeypatch.setattr(recurring_handler, "write_queue", InlineWriter())
 
     callback = DummyCallback("recurring:pause:abc12345")
-    await recurring_handler.recurring_quick_action(callback, db=object())
+    await recurring_handler.recurring_quick_action(callback)
 
     assert len(callback.message.edit_reply_markup_calls) == 1
     assert callback.answer_calls[0]["text"] == "⏸ Paused"
@@ -63,14 +70,57 @@ async def test_recurring_quick_action_cancel_not_found(monkeypatch):
             return None
 
     monkeypatch.setattr(recurring_handler, "RecurringService", FakeRecurringService)
+    monkeypatch.setattr(recurring_handler, "write_queue", InlineWriter())
 
     callback = DummyCallback("recurring:cancel:missing99")
-    await recurring_handler.recurring_quick_action(callback, db=object())
+    await recurring_handler.recurring_quick_action(callback)
 
     assert callback.answer_calls[0]["text"] == "Not found"
     assert callback.answer_calls[0]["kwargs"]["show_alert"] is True
 
 
+@pytest.mark.asyncio
+async def test_edit_last_writes_through_writer_before_replying(monkeypatch):
+    events = []
+
+    class FakeExpenseService:
+        def __init__(self, db):
+            self.db = db
+
+        async def update_amount(self, expense_id, user_id, amount_cents):
+            events.append(("update", self.db, expense_id, amount_cents))
+            return SimpleNamespace(ref="abc12345")
+
+    class RecordingWriter:
+        async def submit(self, job):
+            result = await job("writer-session")
+            events.append("committed")
+            return result
+
+    class State:
+        async def get_data(self):
+            return {"expense_id": "e1", "field": "amount"}
+
+        async def clear(self):
+            pass
+
+    monkeypatch.setattr(expenses_handler, "ExpenseService", FakeExpenseService)
+    monkeypatch.setattr(expenses_handler, "write_queue", RecordingWriter())
+    message = DummyMessage()
+    message.text = "12.50"
+    message.from_user = SimpleNamespace(id=1)
+    original_answer = message.answer
+
+    async def answer(text, **kwargs):
+        events.append("reply")
+        await original_answer(text, **kwargs)
+
+    message.answer = answer
+    await expenses_handler.edit_last_apply(message, State())
+
+    assert events == [("update", "writer-session", "e1", 1250), "committed", "reply"]
+
+
 @pytest.mark.asyncio
 async def test_reports_nav_to_menu_uses_main_keyboard():
     callback = DummyCallback("nav:menu")
@@ -138,3 +188,173 @@ async def test_reports_report_period_quick_month_last(monkeypatch):
     assert captured["year"] == 2025
     assert captured["month"] == 12
     assert callback.answer_calls[0]["text"] is None
+
+
+@pytest.mark.asyncio
+async def test_reports_search_page_nav_routes_cursor(monkeypatch):
+    captured = {}
+
+    async def fake_send_search_results(target, db, user_id, keyword, **kwargs):
+        captured.update(keyword=keyword, **kwargs)
+
+    monkeypatch.setattr(reports_handler, "_send_search_results", fake_send_search_results)
+
+    callback = DummyCallback("sp:n:0a1b2c3d:uber eats:late", user_id=5)
+    await reports_handler.search_page_nav(callback, db=object())
+
+    assert captured == {"keyword": "uber eats:late", "cursor": "0a1b2c3d", "older": True, "edit": True}
+    assert callback.answer_calls[0]["text"] is None
+
+
+def test_page_kb_drops_buttons_over_callback_limit():
+    from app.services.expense_service import ExpensePage
+
+    page = ExpensePage(items=[], next_cursor="0a1b2c3d", prev_cursor="9f8e7d6c")
+    kb = reports_handler._page_kb(page, "sp", ":coffee")
+    assert [b.callback_data for b in kb.inline_keyboard[0]] == ["sp:p:9f8e7d6c:coffee", "sp:n:0a1b2c3d:coffee"]
+
+    long_kb = reports_handler._page_kb(page, "sp", ":" + "x" * 60)
+    assert [b.callback_data for row in long_kb.inline_keyboard for b in row] == ["nav:menu"]
+
+
+@pytest.mark.asyncio
+async def test_reports_chart_quick_renders_once_then_sends_file_id(monkeypatch):
+    from app.core.chart_cache import ChartCache
+
+    class FakeExpenseService:
+        def __init__(self, db):
+            self.db = db
+
+        async def yearly_summary(self, user_id, year):
+            return {"total_cents": 500, "breakdown": {"Food": 500}, "per_month": {3: 500}}
+
+    renders = []
+
+    class FakeRenderer:
+        async def render(self, kind, data, title):
+            renders.append((kind, data))
+            return b"png-bytes"
+
+    photos = []
+
+    async def answer_photo(photo, **kwargs):
+        photos.append(photo)
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="small"), SimpleNamespace(file_id="large")])
+
+    monkeypatch.setattr(reports_handler, "ExpenseService", FakeExpenseService)
+    monkeypatch.setattr(reports_handler, "chart_renderer", FakeRenderer())
+    monkeypatch.setattr(reports_handler, "chart_cache", ChartCache())
+    for _ in range(2):
+        callback = DummyCallback("chart:yeartrend")
+        callback.message.answer_photo = answer_photo
+        await reports_handler.chart_quick(callback, db=object())
+        assert callback.answer_calls
+
+    assert renders == [("bar", {3: 500})]
+    assert photos[0].data == b"png-bytes"
+    assert photos[0].filename == "chart_yeartrend.png"
+    assert photos[1] == "large"
+
+
+@pytest.mark.asyncio
+async def test_receipt_resends_by_file_id_and_falls_back_to_disk(monkeypatch, tmp_path):
+    from aiogram.exceptions import TelegramBadRequest
+
+    receipt = tmp_path / "r.jpg"
+    receipt.write_bytes(b"jpeg")
+    exp = SimpleNamespace(id="e1", user_id=1, item_name="Pizza", amount_cents=1250,
+                          receipt_path=str(receipt), receipt_file_id="cached")
+
+    class FakeExpenseService:
+        def __init__(self, db):
+            self.db = db
+
+        async def get_expense(self, expense_id):
+            return exp
+
+        async def set_receipt_file_id(self, expense_id, file_id):
+            exp.receipt_file_id = file_id
+
+    sent = []
+
+    async def answer_photo(photo, **kwargs):
+        sent.append(photo)
+        if photo == "stale":
+            raise TelegramBadRequest(method=None, message="wrong file identifier")
+        return SimpleNamespace(photo=[SimpleNamespace(file_id="fresh")])
+
+    class FakeReceiptService:
+        def __init__(self, db):
+            self.db = db
+
+        async def list_for_expense(self, expense):
+            return [(expense.receipt_path, expense.receipt_file_id)]
+
+    monkeypatch.setattr(reports_handler, "ExpenseService", FakeExpenseService)
+    monkeypatch.setattr(reports_handler, "ReceiptService", FakeReceiptService)
+    monkeypatch.setattr(reports_handler, "write_queue", InlineWriter())
+    message = DummyMessage()
+    message.text = "/receipt e1"
+    message.from_user = SimpleNamespace(id=1)
+    message.answer_photo = answer_photo
+
+    await reports_handler.get_receipt(message, db=object())
+    assert sent == ["cached"]
+
+    exp.receipt_file_id = "stale"
+    await reports_handler.get_receipt(message, db=object())
+    assert sent[1] == "stale"
+    assert sent[2].path == str(receipt)
+    assert exp.receipt_file_id == "fresh"
+
+
+@pytest.mark.asyncio
+async def test_receipt_album_falls_back_to_disk_when_a_cached_id_is_stale(monkeypatch, tmp_path):
+    from aiogram.exceptions import TelegramBadRequest
+
+    paths = [tmp_path / "a.jpg", tmp_path / "b.jpg"]
+    for path in paths:
+        path.write_bytes(b"jpeg")
+    exp = SimpleNamespace(id="e1", user_id=1, item_name="Pizza", amount_cents=1250,
+                          receipt_path=str(paths[0]), receipt_file_id="cached")
+    stored = {}
+
+    class FakeExpenseService:
+        def __init__(self, db):
+            self.db = db
+
+        async def get_expense(self, expense_id):
+            return exp
+
+    class FakeReceiptService:
+        def __init__(self, db):
+            self.db = db
+
+        async def list_for_expense(self, expense):
+            return [(str(paths[0]), "cached"), (str(paths[1]), "stale")]
+
+        async def set_file_ids(self, expense_id, file_ids):
+            stored[expense_id] = file_ids
+
+    albums = []
+
+    async def answer_media_group(media, **kwargs):
+        albums.append([m.media for m in media])
+        if "stale" in albums[-1]:
+            raise TelegramBadRequest(method=None, message="wrong file identifier")
+        return [SimpleNamespace(photo=[SimpleNamespace(file_id=f"fresh-{i}")]) for i in range(len(media))]
+
+    monkeypatch.setattr(reports_handler, "ExpenseService", FakeExpenseService)
+    monkeypatch.setattr(reports_handler, "ReceiptService", FakeReceiptService)
+    monkeypatch.setattr(reports_handler, "write_queue", InlineWriter())
+    message = DummyMessage()
+    message.text = "/receipt e1"
+    message.from_user = SimpleNamespace(id=1)
+    message.answer_media_group = answer_media_group
+
+    await reports_handler.get_receipt(message, db=object())
+
+    assert albums[0] == ["cached", "stale"]
+    assert [m.path for m in albums[1]] == [str(p) for p in paths]
+    assert stored == {"e1": ["fresh-0", "fresh-1"]}
+    assert message.answer_calls == []
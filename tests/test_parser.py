@@ -1,6 +1,10 @@
+import uuid
+from datetime import datetime, timezone
+
 from app.utils.parser import parse_item_and_amount, extract_hashtags, parse_recurring_from_tags
 from app.utils.text import normalize_merchant, progress_bar
 from app.utils.text import short_ref
+from app.utils.ids import id_for_timestamp, is_time_ordered, new_id
 from app.bot.handlers.expenses import _extract_payment_method
 from app.bot.keyboards import main_menu_kb
 
@@ -53,3 +57,17 @@ def test_main_menu_keyboard_contains_core_commands():
     assert "/budget" in all_labels
     assert "/rules" in all_labels
     assert "/menu" in all_labels
+
+
+def test_uuid7_ids_are_time_ordered():
+    ids = [new_id() for _ in range(2000)]
+    assert ids == sorted(ids)
+    assert len(set(ids)) == len(ids)
+    assert all(is_time_ordered(i) for i in ids)
+    assert not is_time_ordered(str(uuid.uuid4()))
+
+
+def test_id_for_timestamp_sorts_by_time():
+    older = id_for_timestamp(datetime(2025, 1, 1, 12, 0))
+    newer = id_for_timestamp(datetime(2025, 1, 1, 12, 0, 1, tzinfo=timezone.utc))
+    assert older < newer
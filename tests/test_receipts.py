@@ -0,0 +1,368 @@
+import asyncio
+import os
+import time
+from io import BytesIO
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+from PIL import Image
+from sqlalchemy import event, select
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.bot.media_groups import MediaGroupCollector
+from app.bot.receipt_pipeline import ReceiptJob, ReceiptPipeline
+from app.core import storage
+from app.db.models import Expense, ReceiptBlob
+from app.db.writer import GroupCommitWriter
+from app.services.expense_service import ExpenseService
+from app.services.receipt_service import ReceiptService
+from app.services.receipt_sweeper import ReceiptSweeper
+
+
+@pytest.fixture(autouse=True)
+def receipts_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(storage, "BASE_DIR", tmp_path / "receipts")
+
+
+def _jpeg(width: int = 2000, height: int = 1000, color: str = "white") -> bytes:
+    buf = BytesIO()
+    Image.new("RGB", (width, height), color).save(buf, "JPEG")
+    return buf.getvalue()
+
+
+class PhotoMessage:
+    def __init__(self, photos: dict[str, bytes]):
+        self.photos = photos
+        self.downloads = []
+        self.answers = []
+        self.bot = SimpleNamespace(download=self._download)
+
+    async def _download(self, file_id, destination=None):
+        self.downloads.append(file_id)
+        return BytesIO(self.photos[file_id])
+
+    async def answer(self, text, **kwargs):
+        self.answers.append(text)
+
+
+def _pipeline(engine, writer: GroupCommitWriter, **kwargs) -> ReceiptPipeline:
+    return ReceiptPipeline(read_factory=async_sessionmaker(bind=engine), writer=writer, **kwargs)
+
+
+async def _expense(writer: GroupCommitWriter, user_id: int = 1) -> Expense:
+    return await writer.submit(lambda s: ExpenseService(s).add_expense_text(
+        user_id=user_id, item_name="Pizza", amount_cents=1250
+    ))
+
+
+@pytest.mark.asyncio
+async def test_pipeline_resizes_and_attaches_in_background(engine):
+    writer = GroupCommitWriter(engine)
+    pipeline = _pipeline(engine, writer, workers=1)
+    exp = await _expense(writer)
+    message = PhotoMessage({"photo-1": _jpeg()})
+
+    await pipeline.start()
+    try:
+        await pipeline.submit(ReceiptJob(message, 1, exp.id, exp.ref, "photo-1", "unique-1"))
+        assert message.answers == []  # still running
+    finally:
+        await pipeline.stop()
+
+    async with AsyncSession(engine) as session:
+        saved = await ExpenseService(session).get_expense_by_ref(1, exp.ref)
+    assert Image.open(saved.receipt_path).size == (1280, 640)
+    assert saved.receipt_file_id == "photo-1"
+    assert message.answers == [f"📎 Receipt saved for `{exp.ref}`"]
+
+
+@pytest.mark.asyncio
+async def test_pipeline_reports_undecodable_photo(engine, tmp_path):
+    writer = GroupCommitWriter(engine)
+    exp = await _expense(writer)
+    message = PhotoMessage({"photo-1": b"not an image"})
+
+    await _pipeline(engine, writer).submit(ReceiptJob(message, 1, exp.id, exp.ref, "photo-1", "unique-1"))
+
+    async with AsyncSession(engine) as session:
+        saved = await ExpenseService(session).get_expense_by_ref(1, exp.ref)
+    assert saved.receipt_path is None
+    assert message.answers[0].startswith("⚠️")
+    assert [p for p in (tmp_path / "receipts").rglob("*") if p.is_file()] == []
+
+
+@pytest.mark.asyncio
+async def test_repeated_photos_share_one_blob(engine, tmp_path):
+    writer = GroupCommitWriter(engine)
+    pipeline = _pipeline(engine, writer)
+    photo = _jpeg(color="red")
+    message = PhotoMessage({"photo-1": photo, "forwarded": photo, "other": _jpeg(color="blue")})
+    expenses = [await _expense(writer) for _ in range(4)]
+
+    for exp, (file_id, unique_id) in zip(expenses, [
+        ("photo-1", "unique-1"),
+        ("photo-1", "unique-1"),   # re-sent: known file_unique_id
+        ("forwarded", "unique-2"),  # same bytes, new file_unique_id
+        ("other", "unique-3"),
+    ]):
+        await pipeline.submit(ReceiptJob(message, 1, exp.id, exp.ref, file_id, unique_id))
+
+    assert message.downloads == ["photo-1", "forwarded", "other"]
+    async with AsyncSession(engine) as session:
+        paths = [(await ExpenseService(session).get_expense_by_ref(1, e.ref)).receipt_path for e in expenses]
+        assert paths[0] == paths[1] == paths[2] != paths[3]
+        assert len({p for p in (tmp_path / "receipts").rglob("*.jpg")}) == 2
+
+        await ExpenseService(session).delete_expense_by_ref(1, expenses[0].ref)
+        blobs = {b.path: b for b in (await session.execute(select(ReceiptBlob))).scalars()}
+    assert blobs[paths[0]].ref_count == 2
+    assert blobs[paths[0]].file_unique_id == "unique-1"
+    assert blobs[paths[3]].ref_count == 1
+
+
+@pytest.mark.asyncio
+async def test_media_group_collector_hands_album_to_first_message():
+    collector = MediaGroupCollector(window_ms=20)
+
+    def msg(message_id):
+        return SimpleNamespace(chat=SimpleNamespace(id=1), media_group_id="g1", message_id=message_id)
+
+    async def late(message_id):
+        await asyncio.sleep(0.01)
+        return await collector.collect(msg(message_id))
+
+    first, second, third = await asyncio.gather(collector.collect(msg(10)), late(12), late(11))
+
+    assert [m.message_id for m in first] == [10, 11, 12]
+    assert second is None and third is None
+
+
+@pytest.mark.asyncio
+async def test_album_creates_expenses_with_receipts_in_one_commit(engine, monkeypatch):
+    from app.bot.handlers import receipts as receipts_handler
+
+    class NoAlerts:
+        def __init__(self, db):
+            pass
+
+        async def check_alerts(self, user_id):
+            return []
+
+    writer = GroupCommitWriter(engine, window_ms=20)
+    monkeypatch.setattr(receipts_handler, "write_queue", writer)
+    monkeypatch.setattr(receipts_handler, "receipt_pipeline", _pipeline(engine, writer))
+    monkeypatch.setattr(receipts_handler, "media_groups", MediaGroupCollector(window_ms=20))
+    monkeypatch.setattr(receipts_handler, "BudgetService", NoAlerts)
+    # Expense inserts per commit.
+    commits, inserts = [], []
+    event.listen(engine.sync_engine, "before_cursor_execute",
+                 lambda conn, cursor, stmt, *args: inserts.append(1) if stmt.startswith("INSERT INTO expenses ") else None)
+    event.listen(engine.sync_engine, "commit", lambda conn: (commits.append(len(inserts)), inserts.clear()))
+
+    photos = {f"p{i}": _jpeg(color=color) for i, color in enumerate(["red", "green", "blue"])}
+    album = []
+    for i, caption in enumerate(["Groceries 42.10 #food", None, "Taxi 18 #transport"]):
+        m = PhotoMessage(photos)
+        m.message_id = 100 + i
+        m.caption = caption
+        m.media_group_id = "album"
+        m.chat = SimpleNamespace(id=1)
+        m.from_user = SimpleNamespace(id=1)
+        m.photo = [SimpleNamespace(file_id=f"p{i}", file_unique_id=f"u{i}")]
+        m.bot = album[0].bot if album else m.bot
+        album.append(m)
+
+    await writer.start()
+    try:
+        await asyncio.gather(*(receipts_handler.add_expenses_from_album(m, db=None) for m in album))
+    finally:
+        await writer.stop()
+
+    assert sorted(album[0].downloads) == ["p0", "p1", "p2"]
+    assert [n for n in commits if n] == [2]
+    async with AsyncSession(engine) as session:
+        expenses = (await session.execute(select(Expense).order_by(Expense.item_name))).scalars().all()
+        assert [(e.item_name, e.amount_cents) for e in expenses] == [("Groceries", 4210), ("Taxi", 1800)]
+        groceries = await ReceiptService(session).list_for_expense(expenses[0])
+        taxi = await ReceiptService(session).list_for_expense(expenses[1])
+    assert [file_id for _, file_id in groceries] == ["p0", "p1"]
+    assert [file_id for _, file_id in taxi] == ["p2"]
+    assert album[0].answers[-1].startswith("✅ Added 2 expenses:")
+
+    await writer.submit(lambda s: ReceiptService(s).set_file_ids(expenses[0].id, ["n0", "n1"]))
+    async with AsyncSession(engine) as session:
+        exp = await session.get(Expense, expenses[0].id)
+        assert [file_id for _, file_id in await ReceiptService(session).list_for_expense(exp)] == ["n0", "n1"]
+
+
+async def _sweep(engine, writer: GroupCommitWriter, **kwargs):
+    sweeper = ReceiptSweeper(read_factory=async_sessionmaker(bind=engine), writer=writer,
+                             batch_size=2, grace_s=60, **kwargs)
+    stats = [await sweeper.tick()]
+    while sweeper._files is not None:
+        stats.append(await sweeper.tick())
+    return stats
+
+
+def _age(*paths: Path, seconds: float = 3600):
+    old = time.time() - seconds
+    for path in paths:
+        os.utime(path, (old, old))
+
+
+@pytest.mark.asyncio
+async def test_sweeper_quarantines_orphans_in_batches(engine, tmp_path):
+    writer = GroupCommitWriter(engine)
+    pipeline = _pipeline(engine, writer)
+    message = PhotoMessage({"kept": _jpeg(color="red"), "dropped": _jpeg(color="blue")})
+    kept, dropped = await _expense(writer), await _expense(writer)
+    await pipeline.submit(ReceiptJob(message, 1, kept.id, kept.ref, "kept", "unique-1"))
+    await pipeline.submit(ReceiptJob(message, 1, dropped.id, dropped.ref, "dropped", "unique-2"))
+    await writer.submit(lambda s: ExpenseService(s).delete_expense_by_ref(1, dropped.ref))
+
+    root = tmp_path / "receipts"
+    stray = root / "stray.jpg"
+    stray.write_bytes(b"x" * 2048)
+    tmp = root / "half-written.jpg.1234abcd.tmp"
+    tmp.write_bytes(b"x" * 1024)
+    fresh = root / "just-saved.jpg"
+    fresh.write_bytes(b"x")
+    blobs = {p.name: p for p in root.rglob("*.jpg") if p.parent != root}
+    _age(stray, tmp, *blobs.values())
+
+    stats = await _sweep(engine, writer)
+
+    assert sum(s.scanned for s in stats) == 5
+    assert len(stats) == 3  # bounded batches of 2
+    async with AsyncSession(engine) as session:
+        live = (await ExpenseService(session).get_expense_by_ref(1, kept.ref)).receipt_path
+        rows = [b.path for b in (await session.execute(select(ReceiptBlob))).scalars()]
+    assert rows == [live]
+    assert Path(live).exists() and fresh.exists()
+    assert not stray.exists() and not tmp.exists()
+    quarantined = {p.name for p in (root / ".quarantine").rglob("*") if p.is_file()}
+    assert quarantined == {"stray.jpg"} | (set(blobs) - {Path(live).name})
+    assert sum(s.quarantined for s in stats) == 2
+    assert sum(s.reclaimed_bytes for s in stats) == 1024
+
+
+@pytest.mark.asyncio
+async def test_sweeper_expires_quarantine_and_can_delete_directly(engine, tmp_path):
+    writer = GroupCommitWriter(engine)
+    root = tmp_path / "receipts"
+    root.mkdir()
+    old = root / ".quarantine" / "old.jpg"
+    old.parent.mkdir()
+    old.write_bytes(b"x" * 100)
+    _age(old, seconds=8 * 86400)
+    stray = root / "stray.jpg"
+    stray.write_bytes(b"x" * 300)
+    _age(stray)
+
+    stats = await _sweep(engine, writer, quarantine_days=0)
+
+    assert not old.exists() and not stray.exists()
+    assert sum(s.deleted for s in stats) == 1  # quarantine expiry is counted in bytes only
+    assert sum(s.reclaimed_bytes for s in stats) == 400
+
+
+class SweepFirst:
+    """
+    A writer that runs `before` ahead of the first job submitted to it.
+    """
+
+    def __init__(self, writer: GroupCommitWriter, before):
+        self.writer = writer
+        self.before = before
+
+    async def submit(self, job):
+        if self.before:
+            before, self.before = self.before, None
+            await before()
+        return await self.writer.submit(job)
+
+
+async def _orphaned_blob(engine, writer: GroupCommitWriter, message: PhotoMessage) -> Path:
+    """
+    Store photo-1 for an expense, delete the expense and backdate the
+    blob, so the next sweep would reclaim it.
+    """
+    exp = await _expense(writer)
+    await _pipeline(engine, writer).submit(ReceiptJob(message, 1, exp.id, exp.ref, "photo-1", "unique-1"))
+    async with AsyncSession(engine) as session:
+        path = Path((await ExpenseService(session).get_expense_by_ref(1, exp.ref)).receipt_path)
+    await writer.submit(lambda s: ExpenseService(s).delete_expense_by_ref(1, exp.ref))
+    _age(path)
+    return path
+
+
+@pytest.mark.asyncio
+async def test_resend_during_sweep_keeps_the_reused_blob(engine):
+    writer = GroupCommitWriter(engine)
+    message = PhotoMessage({"photo-1": _jpeg(color="red")})
+    path = await _orphaned_blob(engine, writer, message)
+    exp = await _expense(writer)
+    pipeline = _pipeline(engine, writer)
+    stored = []
+
+    async def resend():
+        stored.append(await pipeline.store(message.bot, "photo-1", "unique-1"))
+
+    # The sweep has walked the old blob; a re-send reuses it (not attached yet)
+    # before the sweep's writer job runs.
+    sweeper = ReceiptSweeper(read_factory=async_sessionmaker(bind=engine), grace_s=60,
+                             writer=SweepFirst(writer, resend))
+    stats = await sweeper.tick()
+    await writer.submit(lambda s: ReceiptService(s).attach(exp.id, 1, stored))
+
+    assert stats.quarantined == 0
+    assert message.downloads == ["photo-1"]  # the re-send needed no download
+    async with AsyncSession(engine) as session:
+        saved = await ExpenseService(session).get_expense_by_ref(1, exp.ref)
+        blob = (await session.execute(select(ReceiptBlob))).scalar_one()
+    assert saved.receipt_path == str(path) and path.exists()
+    assert blob.ref_count == 1
+
+
+@pytest.mark.asyncio
+async def test_resend_stores_again_when_its_blob_is_swept_before_attach(engine):
+    writer = GroupCommitWriter(engine)
+    message = PhotoMessage({"photo-1": _jpeg(color="red")})
+    path = await _orphaned_blob(engine, writer, message)
+    exp = await _expense(writer)
+
+    async def sweep():
+        _age(path)  # undo the re-send's touch, as if the sweep had re-stat'ed first
+        await _sweep(engine, writer)
+
+    # The re-send finds the blob, then a sweep reclaims it before the attach runs.
+    pipeline = _pipeline(engine, SweepFirst(writer, None))
+    store = pipeline.store
+    stores = []
+
+    async def store_then_sweep(*args, **kwargs):
+        receipt = await store(*args, **kwargs)
+        stores.append(kwargs)
+        if len(stores) == 1:
+            pipeline.writer.before = sweep
+        return receipt
+
+    pipeline.store = store_then_sweep
+    await pipeline.submit(ReceiptJob(message, 1, exp.id, exp.ref, "photo-1", "unique-1"))
+
+    assert stores == [{}, {"reuse": False}]
+    assert message.downloads == ["photo-1", "photo-1"]
+    assert message.answers[-1] == f"📎 Receipt saved for `{exp.ref}`"
+    async with AsyncSession(engine) as session:
+        saved = await ExpenseService(session).get_expense_by_ref(1, exp.ref)
+    assert saved.receipt_path == str(path) and path.exists()
+
+
+def test_save_blob_refreshes_a_reused_file():
+    photo = _jpeg(color="red")
+    _, path = storage.save_blob(photo)
+    _age(path)
+
+    assert storage.save_blob(photo)[1] == path
+    assert path.stat().st_mtime > time.time() - 60  # inside the sweeper's grace period again
@@ -1,23 +1,10 @@
 import pytest
-import pytest_asyncio
 from datetime import date
-from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.base import Base
+from app.services.expense_service import ExpenseService
 from app.services.recurring_service import RecurringService
-
-
-@pytest_asyncio.fixture
-async def db_session() -> AsyncSession:
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
-    async with session_factory() as session:
-        yield session
-
-    await engine.dispose()
+from app.services.rollup_service import RollupService
 
 
 @pytest.mark.asyncio
@@ -55,6 +42,21 @@ async def test_update_state_works_with_short_ref(db_session: AsyncSession):
     svc = RecurringService(db_session)
     rec = await svc.create(user_id=1, item_name="Netflix", amount_cents=1599, frequency="monthly")
 
-    updated = await svc.update_state(rec.id[:8], 1, paused=True)
+    updated = await svc.update_state(rec.ref, 1, paused=True)
     assert updated is not None
     assert updated.paused is True
+
+
+@pytest.mark.asyncio
+async def test_generated_expenses_update_rollups(monkeypatch, db_session: AsyncSession):
+    import app.services.recurring_service as recurring_module
+
+    monkeypatch.setattr(recurring_module, "local_date_for_now", lambda: date(2026, 2, 27))
+
+    svc = RecurringService(db_session)
+    await svc.create(user_id=1, item_name="Gym", amount_cents=3000, category="Health", frequency="daily")
+    await svc.generate_due_today()
+
+    assert await RollupService(db_session).check_consistency() == []
+    totals = await ExpenseService(db_session).monthly_summary(1, 2026, 2)
+    assert totals["breakdown"] == {"Health": 3000}
@@ -1,32 +1,28 @@
+import uuid
+from types import SimpleNamespace
+
 import pytest
-import pytest_asyncio
-from datetime import date
+from datetime import date, datetime, timezone
+from sqlalchemy import event, text
 from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 
 from app.db.base import Base
-from app.db.models import Expense
+from app.db.migrations import rekey_time_ordered_ids
+from app.db.models import Expense, RecurringExpense
+from app.db.session import make_engine, make_read_engine, sqlite_pragmas
 from app.services.expense_service import ExpenseService
 from app.services.budget_service import BudgetService
-
-
-@pytest_asyncio.fixture
-async def db_session() -> AsyncSession:
-    engine = create_async_engine("sqlite+aiosqlite:///:memory:")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-
-    session_factory = async_sessionmaker(bind=engine, expire_on_commit=False, class_=AsyncSession)
-    async with session_factory() as session:
-        yield session
-
-    await engine.dispose()
+from app.services.rollup_service import RollupService
+from app.utils.dates import local_date_for_now
+from app.utils.ids import is_time_ordered
+from helpers import expense_row
 
 
 @pytest.mark.asyncio
 async def test_expense_short_ref_resolution(db_session: AsyncSession):
     svc = ExpenseService(db_session)
     exp = await svc.add_expense_text(user_id=1, item_name="Coffee", amount_cents=450)
-    short = exp.id[:8]
+    short = exp.ref
 
     found = await svc.get_expense_by_ref(1, short)
     assert found is not None
@@ -38,7 +34,7 @@ async def test_undo_delete_by_ref(db_session: AsyncSession):
     svc = ExpenseService(db_session)
     exp = await svc.add_expense_text(user_id=1, item_name="Lunch", amount_cents=1200)
 
-    removed = await svc.delete_expense_by_ref(1, exp.id[:8])
+    removed = await svc.delete_expense_by_ref(1, exp.ref)
     assert removed is not None
 
     should_be_none = await svc.get_expense(exp.id)
@@ -136,3 +132,399 @@ async def test_budget_alerts_threshold_and_exceeded(db_session: AsyncSession):
 
     assert any("Food budget at" in a for a in alerts)
     assert any("Overall budget exceeded" in a for a in alerts)
+
+
+@pytest.mark.asyncio
+async def test_period_summaries_use_half_open_ranges(db_session: AsyncSession):
+    for day, cents in [(date(2026, 1, 31), 100), (date(2026, 2, 1), 200), (date(2026, 2, 28), 300), (date(2026, 3, 1), 400)]:
+        db_session.add(expense_row(1, cents, day))
+    db_session.add(expense_row(2, 999, date(2026, 2, 10)))
+    await db_session.commit()
+
+    svc = ExpenseService(db_session)
+    month = await svc.monthly_summary(1, 2026, 2)
+    year = await svc.yearly_summary(1, 2026)
+    details = await svc.monthly_details(1, 2026, 2, "category")
+
+    assert month["total_cents"] == 500
+    assert year["per_month"] == {1: 100, 2: 500, 3: 400}
+    assert [tuple(r) for r in details] == [("Food", 500)]
+
+
+@pytest.mark.asyncio
+async def test_week_summary_uses_iso_weeks(db_session: AsyncSession):
+    # ISO week 1 of 2026 runs Mon 2025-12-29 .. Sun 2026-01-04
+    db_session.add(expense_row(1, 100, date(2025, 12, 28)))
+    db_session.add(expense_row(1, 200, date(2025, 12, 29)))
+    db_session.add(expense_row(1, 300, date(2026, 1, 4)))
+    db_session.add(expense_row(1, 400, date(2026, 1, 5)))
+    await db_session.commit()
+
+    summary = await ExpenseService(db_session).week_summary(1, 2026, 1)
+    assert summary["total_cents"] == 500
+
+
+@pytest.mark.asyncio
+async def test_period_queries_use_user_date_index(db_session: AsyncSession):
+    res = await db_session.execute(
+        text(
+            "EXPLAIN QUERY PLAN SELECT sum(amount_cents) FROM expenses "
+            "WHERE user_id = 1 AND local_date >= '2026-02-01' AND local_date < '2026-03-01'"
+        )
+    )
+    plan = " ".join(str(row[-1]) for row in res.all())
+    assert "ix_expenses_user_local_date" in plan
+
+
+@pytest.mark.asyncio
+async def test_rollups_follow_every_expense_write(db_session: AsyncSession):
+    svc = ExpenseService(db_session)
+    rollups = RollupService(db_session)
+
+    coffee = await svc.add_expense_text(user_id=1, item_name="Coffee", amount_cents=450, category="Food")
+    lunch = await svc.add_expense_text(user_id=1, item_name="Lunch", amount_cents=1200)
+    await svc.update_amount(expense_id=coffee.id, user_id=1, amount_cents=500)
+    await svc.update_category(expense_id=lunch.id, user_id=1, category_name="Food")
+    await svc.delete_expense_by_ref(1, coffee.id)
+
+    assert await rollups.check_consistency() == []
+    summary = await svc.monthly_summary(1, lunch.local_date.year, lunch.local_date.month)
+    assert summary["breakdown"] == {"Food": 1200}
+
+
+@pytest.mark.asyncio
+async def test_rollup_rebuild_repairs_drift(db_session: AsyncSession):
+    db_session.add(expense_row(1, 700, date(2026, 2, 3)))
+    await db_session.commit()
+    await db_session.execute(text("UPDATE expense_rollups SET total_cents = 1"))
+    await db_session.commit()
+
+    rollups = RollupService(db_session)
+    drift = await rollups.check_consistency(user_id=1)
+    assert drift and drift[0]["expected"] == (700, 1)
+
+    await rollups.rebuild(user_id=1)
+    assert await rollups.check_consistency(user_id=1) == []
+
+
+@pytest.mark.asyncio
+async def test_evaluate_budgets_reads_spending_once(db_session: AsyncSession):
+    db_session.add(expense_row(1, 4000, date(2026, 1, 20), "Food"))
+    db_session.add(expense_row(1, 3000, date(2026, 2, 10), "Food"))
+    db_session.add(expense_row(1, 5000, date(2026, 2, 11), "Bills"))
+    await db_session.commit()
+
+    bsvc = BudgetService(db_session)
+    await bsvc.add_budget(1, "category", "Food", 5000, "month_rollover")
+    await bsvc.add_budget(1, "category", "Bills", 4000, "month")
+    await bsvc.add_budget(1, "overall", None, 50000, "year")
+    for i in range(5):
+        await bsvc.add_budget(1, "category", f"Other{i}", 1000, "month")
+
+    statements: list[str] = []
+    sync_engine = db_session.bind.sync_engine
+    listener = lambda conn, cursor, stmt, params, ctx, many: statements.append(stmt)
+    event.listen(sync_engine, "before_cursor_execute", listener)
+    try:
+        results = await bsvc.evaluate_budgets(1, 2026, 2)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", listener)
+
+    assert len(statements) == 2  # active budgets + one grouped spending query
+    by_scope = {r["budget"].scope_value or "Overall": r for r in results}
+    assert by_scope["Food"]["spent_cents"] == 3000
+    assert by_scope["Food"]["effective_limit_cents"] == 6000
+    assert by_scope["Bills"]["pct"] == 125.0
+    assert by_scope["Overall"]["spent_cents"] == 12000
+
+
+@pytest.mark.asyncio
+async def test_short_ref_collisions_are_rerolled_at_insert(monkeypatch, db_session: AsyncSession):
+    import app.db.refs as refs_module
+
+    rolls = iter(["aaaa1111", "aaaa1111", "bbbb2222"])
+    monkeypatch.setattr(refs_module, "new_ref", lambda: next(rolls))
+
+    svc = ExpenseService(db_session)
+    first = await svc.add_expense_text(user_id=1, item_name="Coffee", amount_cents=450)
+    second = await svc.add_expense_text(user_id=1, item_name="Tea", amount_cents=300)
+
+    assert (first.ref, second.ref) == ("aaaa1111", "bbbb2222")
+    assert await svc.resolve_expense_id(1, "AAAA1111") == first.id
+    assert await svc.resolve_expense_id(2, "aaaa1111") is None
+    assert await svc.resolve_expense_id(1, "aaaa") is None
+
+
+@pytest.mark.asyncio
+async def test_last_expense_is_the_newest_even_next_to_legacy_ids(db_session: AsyncSession, monkeypatch):
+    from app.bot.handlers import expenses as expenses_handler
+
+    # A row from before UUIDv7 ids (never re-keyed): its uuid4 sorts above every new id.
+    db_session.add(Expense(id="f" + str(uuid.uuid4())[1:], ref="oldrent1", user_id=1, item_name="Old rent",
+                           amount_cents=90000, local_date=date(2024, 5, 1),
+                           created_at_utc=datetime(2024, 5, 1, tzinfo=timezone.utc)))
+    await db_session.commit()
+    svc = ExpenseService(db_session)
+    for i in range(3):
+        last = await svc.add_expense_text(user_id=1, item_name=f"Coffee {i}", amount_cents=100 + i)
+
+    assert (await svc.get_last_expense(1)).id == last.id
+    assert [e.item_name for e in await svc._search_like(1, "o", 10)][::3] == ["Coffee 2", "Old rent"]
+
+    class Writer:
+        async def submit(self, job):
+            result = await job(db_session)
+            await db_session.commit()
+            return result
+
+    answers = []
+
+    async def answer(text, **kwargs):
+        answers.append(text)
+
+    monkeypatch.setattr(expenses_handler, "write_queue", Writer())
+    await expenses_handler.undo_last(SimpleNamespace(from_user=SimpleNamespace(id=1), answer=answer), db_session)
+    assert "Coffee 2" in answers[0]
+    assert (await svc.get_last_expense(1)).item_name == "Coffee 1"
+
+    res = await db_session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM expenses WHERE user_id = 1 "
+        "ORDER BY created_at_utc DESC, id DESC LIMIT 1"
+    ))
+    plan = " ".join(str(row[-1]) for row in res.all())
+    assert "ix_expenses_user_created_id" in plan and "TEMP B-TREE" not in plan
+
+
+@pytest.mark.asyncio
+async def test_rekey_time_ordered_ids_keeps_recurring_links(db_session: AsyncSession):
+    legacy_rec = str(uuid.uuid4())
+    db_session.add(RecurringExpense(id=legacy_rec, user_id=1, item_name="Rent", amount_cents=1000,
+                                    frequency="monthly", created_at_utc=datetime(2024, 5, 1, tzinfo=timezone.utc)))
+    db_session.add(Expense(id=str(uuid.uuid4()), user_id=1, item_name="Rent", amount_cents=1000,
+                           local_date=date(2024, 5, 1), recurring_id=legacy_rec,
+                           created_at_utc=datetime(2024, 5, 1, tzinfo=timezone.utc)))
+    await db_session.commit()
+
+    conn = await db_session.connection()
+    counts = await conn.run_sync(rekey_time_ordered_ids)
+    await db_session.commit()
+
+    assert counts["expenses"] == 1 and counts["recurring_expenses"] == 1
+    res = await db_session.execute(
+        text("SELECT e.id, r.id FROM expenses e JOIN recurring_expenses r ON r.id = e.recurring_id")
+    )
+    exp_id, rec_id = res.one()
+    assert is_time_ordered(exp_id) and is_time_ordered(rec_id)
+
+
+@pytest.mark.asyncio
+async def test_production_sqlite_profile_applies_pragmas(tmp_path):
+    eng = make_engine(f"sqlite+aiosqlite:///{tmp_path / 'profile.db'}", sqlite_pragmas("production"))
+    try:
+        async with eng.connect() as conn:
+            journal = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+            synchronous = (await conn.exec_driver_sql("PRAGMA synchronous")).scalar()
+            busy = (await conn.exec_driver_sql("PRAGMA busy_timeout")).scalar()
+            temp_store = (await conn.exec_driver_sql("PRAGMA temp_store")).scalar()
+    finally:
+        await eng.dispose()
+
+    assert journal == "wal"
+    assert synchronous == 1  # NORMAL
+    assert busy == 5000
+    assert temp_store == 2  # MEMORY
+    assert sqlite_pragmas("default") == {}
+
+
+@pytest.mark.asyncio
+async def test_read_engine_is_read_only_and_sees_committed_writes(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'reads.db'}"
+    writer = make_engine(url, sqlite_pragmas("production"))
+    reader = make_read_engine(url, writer, pool_size=2)
+    try:
+        async with writer.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        async with async_sessionmaker(bind=writer, expire_on_commit=False, class_=AsyncSession)() as session:
+            await ExpenseService(session).add_expense_text(user_id=1, item_name="Tea", amount_cents=300)
+
+        assert reader is not writer
+        today = local_date_for_now()
+        async with async_sessionmaker(bind=reader, class_=AsyncSession)() as session:
+            summary = await ExpenseService(session).monthly_summary(1, today.year, today.month)
+            assert summary["total_cents"] == 300
+            with pytest.raises(Exception, match="readonly"):
+                await session.execute(text("DELETE FROM expenses"))
+    finally:
+        await reader.dispose()
+        await writer.dispose()
+
+    memory = make_engine("sqlite+aiosqlite:///:memory:")
+    assert make_read_engine("sqlite+aiosqlite:///:memory:", memory) is memory
+    await memory.dispose()
+
+
+
+@pytest.mark.asyncio
+async def test_edits_are_single_update_returning_statements(db_session: AsyncSession):
+    svc = ExpenseService(db_session)
+    exp = await svc.add_expense_text(user_id=1, item_name="Coffee", amount_cents=450)
+    bsvc = BudgetService(db_session)
+    budget = await bsvc.add_budget(1, "category", "Food", 5000, "month")
+
+    statements: list[str] = []
+    sync_engine = db_session.bind.sync_engine
+    listener = lambda conn, cursor, stmt, params, ctx, many: statements.append(stmt)
+    event.listen(sync_engine, "before_cursor_execute", listener)
+    try:
+        tagged = await svc.update_tags(expense_id=exp.ref, user_id=1, tags="work")
+        noted = await svc.update_note(expense_id=exp.ref.upper(), user_id=1, note="latte")
+        stranger = await svc.update_item(expense_id=exp.ref, user_id=2, item_name="Stolen")
+        deleted = await bsvc.delete_budget(budget.ref, 1)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", listener)
+
+    # Successful expense edits also bump the user's data version.
+    bumps = [s for s in statements if "data_versions" in s]
+    statements = [s for s in statements if "data_versions" not in s]
+    assert len(bumps) == 2
+    assert len(statements) == 4
+    assert all(s.lstrip().upper().startswith("UPDATE") and "RETURNING" in s.upper() for s in statements)
+    assert tagged.tags == "work"
+    assert noted.notes == "latte" and noted.id == exp.id
+    assert stranger is None
+    assert deleted.active is False
+
+    reloaded = await svc.get_expense_by_ref(1, exp.ref)
+    assert reloaded.item_name == "Coffee"
+
+
+@pytest.mark.asyncio
+async def test_search_uses_fts_index_and_stays_in_sync(db_session: AsyncSession):
+    svc = ExpenseService(db_session)
+    latte = await svc.add_expense_text(user_id=1, item_name="Starbucks latte", amount_cents=550, notes="merchant:starbucks")
+    beans = await svc.add_expense_text(user_id=1, item_name="Coffee beans", amount_cents=1800, tags="home,coffee")
+    await svc.add_expense_text(user_id=2, item_name="Coffee", amount_cents=300)
+
+    assert [e.id for e in await svc.search_expenses(1, "coff")] == [beans.id]
+    assert [e.id for e in await svc.search_expenses(1, "STAR latte")] == [latte.id]
+    assert await svc.search_expenses(1, "1") == []  # user_id is not searchable text
+    assert await svc.search_expenses(1, '"*') == []
+
+    await svc.update_note(expense_id=latte.ref, user_id=1, note="coffee run")
+    assert [e.id for e in await svc.search_expenses(1, "coffee")] == [beans.id, latte.id]
+    ranked = await svc.search_expenses(1, "coffee", ranked=True)
+    assert ranked[0].id == beans.id  # matches in item and tags
+
+    await svc.delete_expense_by_ref(1, beans.ref)
+    assert [e.id for e in await svc.search_expenses(1, "coffee")] == [latte.id]
+
+    plan = await db_session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH 'coffee'"
+    ))
+    assert any("VIRTUAL TABLE INDEX" in row[-1] for row in plan)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("legacy_index", [False, True])
+async def test_migration_indexes_existing_expenses_for_search(tmp_path, legacy_index):
+    from app.db import search
+    from app.db.migrations import run_migrations
+
+    eng = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'old.db'}")
+    try:
+        async with eng.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(search.uninstall)
+        async with AsyncSession(eng, expire_on_commit=False) as session:
+            for item in ("Taxi home", "Taxi to work"):
+                await ExpenseService(session).add_expense_text(user_id=1, item_name=item, amount_cents=2400)
+        if legacy_index:  # as created by versions that keyed the index on the implicit rowid
+            async with eng.begin() as conn:
+                await conn.exec_driver_sql(
+                    "CREATE VIRTUAL TABLE expenses_fts USING fts5(user_id, item_name, category, tags, notes, "
+                    "content='expenses', content_rowid='rowid')"
+                )
+                assert not await conn.run_sync(search.has_index)
+
+        async with eng.begin() as conn:
+            await conn.run_sync(run_migrations)
+            assert await conn.run_sync(search.has_index)
+        async with AsyncSession(eng) as session:
+            svc = ExpenseService(session)
+            found = await svc.search_expenses(1, "tax")
+            assert [e.item_name for e in found] == ["Taxi to work", "Taxi home"]
+            assert sorted(e.search_key for e in found) == [1, 2]
+            added = await svc.add_expense_text(user_id=1, item_name="Taxi back", amount_cents=900)
+            found = await svc.search_expenses(1, "tax")
+        assert found[0].id == added.id and found[0].search_key == 3
+    finally:
+        await eng.dispose()
+
+
+@pytest.mark.asyncio
+async def test_search_never_returns_other_users_rows_when_index_drifts(db_session: AsyncSession):
+    svc = ExpenseService(db_session)
+    await svc.add_expense_text(user_id=1, item_name="Coffee", amount_cents=300)
+    await svc.add_expense_text(user_id=2, item_name="Tea", amount_cents=300)
+    await db_session.commit()
+
+    # Swap the keys behind the index's back: user 1's index entry now points at user 2's row.
+    await db_session.execute(text("UPDATE expenses SET search_key = -search_key"))
+    await db_session.execute(text("UPDATE expenses SET search_key = CASE search_key "
+                                  "WHEN -1 THEN 2 WHEN -2 THEN 1 END"))
+    await db_session.commit()
+
+    assert (await svc.search_expenses(1, "coffee")) == []
+    assert (await svc.search_page(1, "coffee")).items == []
+
+
+@pytest.mark.asyncio
+async def test_history_and_search_keyset_pages(db_session: AsyncSession):
+    svc = ExpenseService(db_session)
+    for i in range(12):
+        await svc.add_expense_text(user_id=1, item_name=f"Coffee {i}", amount_cents=100 + i)
+    await svc.add_expense_text(user_id=2, item_name="Coffee", amount_cents=100)
+
+    first = await svc.history_page(1, limit=5)
+    assert [e.item_name for e in first.items] == [f"Coffee {i}" for i in range(11, 6, -1)]
+    assert first.prev_cursor is None and first.next_cursor == first.items[-1].ref
+
+    second = await svc.history_page(1, first.next_cursor, limit=5)
+    last = await svc.history_page(1, second.next_cursor, limit=5)
+    assert [e.item_name for e in last.items] == ["Coffee 1", "Coffee 0"]
+    assert last.next_cursor is None
+    back = await svc.history_page(1, last.prev_cursor, older=False, limit=5)
+    assert [e.id for e in back.items] == [e.id for e in second.items]
+
+    pages, cursor = [], None
+    while True:
+        page = await svc.search_page(1, "cof", cursor, limit=5)
+        pages.append([e.item_name for e in page.items])
+        if not page.next_cursor:
+            break
+        cursor = page.next_cursor
+    assert sum(pages, []) == [f"Coffee {i}" for i in range(11, -1, -1)]
+    assert (await svc.search_page(2, "cof", cursor)).items == []  # other users' refs don't resolve
+
+    plan = await db_session.execute(text(
+        "EXPLAIN QUERY PLAN SELECT id FROM expenses WHERE user_id = 1 "
+        "AND (created_at_utc, id) < ('2026-01-01', 'x') ORDER BY created_at_utc DESC, id DESC LIMIT 6"
+    ))
+    assert any("ix_expenses_user_created_id" in row[-1] for row in plan)
+
+
+@pytest.mark.asyncio
+async def test_data_version_bumps_on_every_expense_change(db_session: AsyncSession):
+    from app.db import versions
+
+    svc = ExpenseService(db_session)
+    assert await versions.current(db_session, 1) == 0
+    exp = await svc.add_expense_text(user_id=1, item_name="Coffee", amount_cents=450)
+    assert await versions.current(db_session, 1) == 1
+    await svc.update_amount(expense_id=exp.ref, user_id=1, amount_cents=500)
+    await svc.update_note(expense_id=exp.ref, user_id=1, note="oat")
+    await svc.update_note(expense_id=exp.ref, user_id=2, note="not mine")
+    assert await versions.current(db_session, 1) == 3
+    await svc.delete_expense_by_ref(1, exp.ref)
+    assert await versions.current(db_session, 1) == 4
+    assert await versions.current(db_session, 2) == 0
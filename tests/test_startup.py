@@ -0,0 +1,17 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+HEAVY = ("pandas", "matplotlib", "numpy", "PIL", "openpyxl", "pyarrow")
+
+
+def test_bot_startup_does_not_import_heavy_libraries():
+    env = {**os.environ, "TELEGRAM_BOT_TOKEN": os.environ.get("TELEGRAM_BOT_TOKEN", "0:test")}
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app.bot.main"],
+        cwd=Path(__file__).resolve().parent.parent, env=env, capture_output=True, text=True, check=True,
+    )
+    imported = {line.split("|")[-1].strip() for line in proc.stderr.splitlines() if "|" in line}
+
+    assert sorted(m for m in imported if m.split(".")[0] in HEAVY) == []
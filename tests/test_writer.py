@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+from sqlalchemy import event, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.db.models import Expense
+from app.db.writer import GroupCommitWriter
+from app.services.expense_service import ExpenseService
+from helpers import add_coffee
+
+
+async def _count(engine) -> int:
+    async with AsyncSession(engine) as session:
+        return (await session.execute(select(func.count(Expense.id)))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_writes_share_one_commit(engine):
+    commits: list[int] = []
+    event.listen(engine.sync_engine, "commit", lambda conn: commits.append(1))
+
+    writer = GroupCommitWriter(engine, window_ms=20, max_batch=64)
+    await writer.start()
+    try:
+        results = await asyncio.gather(*(writer.submit(add_coffee(user_id, 100)) for user_id in range(1, 21)))
+    finally:
+        await writer.stop()
+
+    assert sorted(e.user_id for e in results) == list(range(1, 21))
+    assert all(e.ref for e in results)
+    assert len(commits) == 1
+    assert await _count(engine) == 20
+
+
+@pytest.mark.asyncio
+async def test_failing_job_only_rolls_back_itself(engine):
+    async def broken(session):
+        await ExpenseService(session).add_expense_text(user_id=1, item_name="Lost", amount_cents=1)
+        raise ValueError("boom")
+
+    writer = GroupCommitWriter(engine, window_ms=20)
+    await writer.start()
+    try:
+        ok, failed = await asyncio.gather(writer.submit(add_coffee(1, 100)), writer.submit(broken), return_exceptions=True)
+    finally:
+        await writer.stop()
+
+    assert isinstance(failed, ValueError)
+    assert ok.amount_cents == 100
+    assert await _count(engine) == 1
+
+
+@pytest.mark.asyncio
+async def test_submit_runs_inline_when_writer_not_started(engine):
+    writer = GroupCommitWriter(engine)
+    exp = await writer.submit(add_coffee(1, 250))
+
+    assert exp.amount_cents == 250
+    assert await _count(engine) == 1
+
+
+@pytest.mark.asyncio
+async def test_writer_fails_pending_jobs_and_restarts_after_connection_error(engine, monkeypatch):
+    from app.db import writer as writer_module
+
+    closes: list[int] = []
+
+    class FlakySession(AsyncSession):
+        async def close(self):
+            await super().close()
+            closes.append(1)
+            if len(closes) == 1:
+                raise OSError("connection lost")
+
+    monkeypatch.setattr(writer_module, "AsyncSession", FlakySession)
+    writer = GroupCommitWriter(engine, window_ms=20)
+    writer.restart_delay = 0
+    await writer.start()
+    try:
+        with pytest.raises(OSError):
+            await asyncio.wait_for(writer.submit(add_coffee(1, 100)), timeout=2)
+        assert writer.running
+        exp = await asyncio.wait_for(writer.submit(add_coffee(1, 200)), timeout=2)
+    finally:
+        await writer.stop()
+
+    assert exp.amount_cents == 200
+
+
+@pytest.mark.asyncio
+async def test_middleware_commits_each_update_once(monkeypatch, engine):
+    from app.bot import main
+    from app.services.budget_service import BudgetService
+    from app.services.category_service import CategoryService
+
+    monkeypatch.setattr(
+        main, "session_factory",
+        lambda mode=None: lambda: AsyncSession(engine, expire_on_commit=False, autoflush=False),
+    )
+    commits: list[int] = []
+    event.listen(engine.sync_engine, "commit", lambda conn: commits.append(1))
+
+    async def handler(event_, data):
+        db = data["db"]
+        await CategoryService(db).get_or_create("Food")
+        exp = await ExpenseService(db).add_expense_text(user_id=1, item_name="Soup", amount_cents=800, category="Food")
+        await BudgetService(db).add_budget(1, "category", "Food", 5000, "month")
+        await ExpenseService(db).update_note(expense_id=exp.ref, user_id=1, note="hot")
+        return exp
+
+    exp = await main.db_session_middleware(handler, object(), {})
+    assert exp.notes == "hot"
+    assert len(commits) == 1
+    assert await _count(engine) == 1
+
+    async def failing(event_, data):
+        await ExpenseService(data["db"]).add_expense_text(user_id=1, item_name="Tea", amount_cents=300)
+        raise RuntimeError("boom")
+
+    with pytest.raises(RuntimeError):
+        await main.db_session_middleware(failing, object(), {})
+    assert len(commits) == 1
+    assert await _count(engine) == 1